@@ -0,0 +1,276 @@
+# analytics.py
+"""
+Колоночная выгрузка отзывов для аналитики и статистика по ней (pandas/NumPy).
+
+Экспорт читает reviews.db порциями по EXPORT_CHUNK строк в порядке id (тексты
+распаковываются функцией review_text) и записывает их в файлы Parquet или Feather,
+разбитые по категории и дню сбора:
+    <каталог>/category=<категория>/day=<YYYY-MM-DD>/part-<первый id порции>.parquet
+
+К столбцам базы добавляются вычисленные: day (день сбора), token_count (количество
+слов через пробел). Номер последнего выгруженного отзыва хранится в <каталог>/_export.json, и
+следующий запуск дописывает только новые отзывы. Имена файлов определяются первым
+id порции, поэтому прерванная выгрузка при повторе перезаписывает те же файлы.
+Изменения старых строк (например, пересчёт has_mat в reclassify.py) попадают в
+выгрузку только при полном экспорте (--full).
+
+Функции статистики повторяют счётчики statistics.py, но считаются векторно по
+файлам выгрузки: гистограмма длин, распределения по категориям, счётчики по дням.
+
+Для записи и чтения файлов нужен пакет pyarrow (необязательная зависимость).
+
+Запуск:
+    python analytics.py export [--format feather] [--full] [--no-text]
+    python analytics.py stats [--category byitovaya-tehnika]
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from logs import SUCCESS, setup_logging
+from text_codec import create_text_storage, register
+
+try:
+    import pyarrow
+except ImportError:  # Необязательная зависимость: без неё выгрузка недоступна.
+    pyarrow = None
+
+# region Константы
+DB_FILE = 'reviews.db'  # База с отзывами.
+EXPORT_DIR = 'analytics'  # Каталог выгрузки.
+EXPORT_FORMAT = 'parquet'  # Формат файлов: 'parquet' или 'feather'.
+EXPORT_COMPRESSION = 'zstd'  # Сжатие столбцов внутри файлов.
+EXPORT_CHUNK = 20000  # Отзывов в одной порции чтения из базы.
+MANIFEST_FILE = '_export.json'  # Состояние выгрузки: формат и id последнего выгруженного отзыва.
+NULL_PARTITION = '__null__'  # Имя раздела для отзывов без категории или даты.
+LENGTH_BINS = (0, 100, 250, 500, 1000, 2000, 5000, np.inf)  # Границы корзин гистограммы длин (символов).
+
+FORMATS = {  # Расширение файла, запись и чтение DataFrame.
+    'parquet': ('.parquet', lambda df, path: df.to_parquet(path, index=False, compression=EXPORT_COMPRESSION),
+                pd.read_parquet),
+    'feather': ('.feather', lambda df, path: df.to_feather(path, compression=EXPORT_COMPRESSION),
+                pd.read_feather),
+}
+
+EXPORT_SQL = '''
+    SELECT id, category, object_url, review_url, {text} AS text, length, has_mat, date_scraped
+    FROM reviews
+    WHERE id > ?
+    ORDER BY id
+'''
+# endregion
+
+log = logging.getLogger(__name__)
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("Для файлов Parquet и Feather нужен пакет pyarrow (pip install pyarrow)")
+
+
+# region Экспорт
+def read_manifest(export_dir=EXPORT_DIR):
+    """Состояние выгрузки (словарь) или None, если выгрузки ещё не было."""
+    try:
+        with open(os.path.join(export_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(export_dir, manifest):
+    path = os.path.join(export_dir, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)  # Атомарно: прерванный запуск оставляет прежнее состояние.
+
+
+def _partition_name(value):
+    return quote(value, safe='') if value else NULL_PARTITION
+
+
+def prepare_chunk(chunk):
+    """Приводит типы порции и добавляет вычисленные столбцы (day, token_count)."""
+    chunk['category'] = chunk['category'].fillna('')
+    chunk['date_scraped'] = pd.to_datetime(chunk['date_scraped'], format='ISO8601', errors='coerce')
+    chunk['day'] = chunk['date_scraped'].dt.strftime('%Y-%m-%d').fillna('')
+    chunk['length'] = chunk['length'].fillna(0).astype('int32')
+    chunk['has_mat'] = chunk['has_mat'].fillna(0).astype(bool)
+    if 'text' in chunk:
+        chunk['token_count'] = chunk['text'].fillna('').str.count(r'\S+').astype('int32')
+    return chunk
+
+
+def export_reviews(db_file=DB_FILE, export_dir=EXPORT_DIR, fmt=EXPORT_FORMAT, with_text=True, full=False,
+                   chunk_rows=EXPORT_CHUNK):
+    """
+    Выгружает новые отзывы (id больше последнего выгруженного) в файлы, разбитые по категории и дню.
+
+    Args:
+        fmt: Формат файлов ('parquet' или 'feather').
+        with_text: Сохранять тексты отзывов (token_count считается в любом случае).
+        full: Удалить прежнюю выгрузку и выгрузить все отзывы заново.
+
+    Returns:
+        Количество выгруженных отзывов.
+    """
+    _require_pyarrow()
+    extension, write, _ = FORMATS[fmt]
+    manifest = None if full else read_manifest(export_dir)
+    if manifest is not None and (manifest['format'], manifest['with_text']) != (fmt, with_text):
+        raise ValueError(f"Выгрузка в {export_dir} сделана с другими параметрами ({manifest['format']}, "
+                         f"тексты: {manifest['with_text']}); используйте --full")
+    if full and os.path.isdir(export_dir):
+        for path in glob.glob(os.path.join(export_dir, 'category=*')):
+            shutil.rmtree(path)
+        if os.path.exists(os.path.join(export_dir, MANIFEST_FILE)):
+            os.remove(os.path.join(export_dir, MANIFEST_FILE))
+    if manifest is None:
+        manifest = {'format': fmt, 'with_text': with_text, 'last_id': 0, 'rows': 0}
+    os.makedirs(export_dir, exist_ok=True)
+
+    exported = 0
+    with sqlite3.connect(db_file) as conn:
+        create_text_storage(conn)  # Старые базы: столбец text_z для review_text().
+        register(conn)
+        sql = EXPORT_SQL.format(text='review_text(text, text_z)')
+        for chunk in pd.read_sql_query(sql, conn, params=(manifest['last_id'],), chunksize=chunk_rows):
+            if chunk.empty:  # Новых отзывов нет: pandas возвращает одну пустую порцию.
+                continue
+            chunk = prepare_chunk(chunk)
+            if not with_text:
+                chunk = chunk.drop(columns='text')
+            part = f"part-{int(chunk['id'].iloc[0]):012d}{extension}"
+            for (category, day), group in chunk.groupby(['category', 'day'], sort=False):
+                directory = os.path.join(export_dir, f'category={_partition_name(category)}',
+                                         f'day={_partition_name(day)}')
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, part)
+                write(group.reset_index(drop=True), path + '.tmp')
+                os.replace(path + '.tmp', path)
+            manifest['last_id'] = int(chunk['id'].iloc[-1])
+            manifest['rows'] += len(chunk)
+            _write_manifest(export_dir, manifest)
+            exported += len(chunk)
+            log.info("Выгружено отзывов: %d (последний id %d)", exported, manifest['last_id'])
+    return exported
+# endregion
+
+
+# region Статистика по выгрузке
+def load_export(export_dir=EXPORT_DIR, columns=None, categories=None, start_day=None, end_day=None):
+    """
+    Читает выгрузку в один DataFrame.
+
+    Разделы отбираются по именам каталогов, поэтому фильтры по категории и дням не
+    читают лишние файлы; columns ограничивает читаемые столбцы.
+    """
+    _require_pyarrow()
+    manifest = read_manifest(export_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"В {export_dir} нет выгрузки: запустите python analytics.py export")
+    extension, _, read = FORMATS[manifest['format']]
+    wanted = None if categories is None else {_partition_name(category) for category in categories}
+    frames = []
+    for path in sorted(glob.glob(os.path.join(export_dir, 'category=*', 'day=*', f'*{extension}'))):
+        category_dir, day_dir = path.split(os.sep)[-3:-1]
+        day = unquote(day_dir[len('day='):])
+        if wanted is not None and category_dir[len('category='):] not in wanted:
+            continue
+        if (start_day is not None and day < start_day) or (end_day is not None and day > end_day):
+            continue
+        frames.append(read(path, columns=columns))
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+    return pd.concat(frames, ignore_index=True)
+
+
+def summary(df):
+    """Общие счётчики: количество отзывов, с матом, длина (среднее и медиана)."""
+    lengths = df['length'].to_numpy()
+    with_mat = int(np.count_nonzero(df['has_mat'].to_numpy()))
+    return {'total': len(df), 'with_mat': with_mat, 'mat_share': with_mat / len(df) if len(df) else 0.0,
+            'mean_length': float(lengths.mean()) if len(df) else 0.0,
+            'median_length': float(np.median(lengths)) if len(df) else 0.0}
+
+
+def count_by_length(df, min_length, max_length=None):
+    """Количество отзывов с длиной в диапазоне (аналог statistics.get_reviews_count_by_length)."""
+    lengths = df['length'].to_numpy()
+    mask = lengths >= min_length
+    if max_length is not None:
+        mask &= lengths <= max_length
+    return int(np.count_nonzero(mask))
+
+
+def length_histogram(df, bins=LENGTH_BINS):
+    """Гистограмма длин: DataFrame с границами корзин и количеством отзывов (всего и с матом)."""
+    lengths = df['length'].to_numpy()
+    counts, edges = np.histogram(lengths, bins=bins)
+    mat_counts, _ = np.histogram(lengths[df['has_mat'].to_numpy(dtype=bool)], bins=bins)
+    return pd.DataFrame({'from': edges[:-1], 'to': edges[1:], 'count': counts, 'with_mat': mat_counts})
+
+
+def category_distribution(df):
+    """Распределения по категориям: количество, доля с матом, длина (среднее, медиана, 90-й перцентиль), слова."""
+    if df.empty:
+        return pd.DataFrame(columns=['count', 'mat_share', 'mean_length', 'median_length', 'p90_length'])
+    grouped = df.groupby('category', sort=False)
+    result = grouped.agg(count=('length', 'size'), mat_share=('has_mat', 'mean'), mean_length=('length', 'mean'),
+                         median_length=('length', 'median'))
+    result['p90_length'] = grouped['length'].quantile(0.9)
+    if 'token_count' in df:
+        result['mean_tokens'] = grouped['token_count'].mean()
+    return result.sort_values('count', ascending=False)
+
+
+def daily_counts(df):
+    """Количество отзывов по дням сбора (аналог statistics.get_reviews_count_by_date по дням)."""
+    return df.groupby('day').size().rename('count')
+# endregion
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Колоночная выгрузка отзывов и статистика по ней.")
+    parser.add_argument('--out', default=EXPORT_DIR, help="каталог выгрузки")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help="выгрузить новые отзывы")
+    export_parser.add_argument('--db', default=DB_FILE, help="база с отзывами")
+    export_parser.add_argument('--format', default=EXPORT_FORMAT, choices=sorted(FORMATS))
+    export_parser.add_argument('--full', action='store_true', help="удалить прежнюю выгрузку и выгрузить всё")
+    export_parser.add_argument('--no-text', action='store_true', help="не сохранять тексты отзывов")
+    export_parser.add_argument('--chunk', type=int, default=EXPORT_CHUNK, help="отзывов в порции чтения")
+    stats_parser = commands.add_parser('stats', help="статистика по выгрузке")
+    stats_parser.add_argument('--category', action='append', help="только эти категории (можно повторять)")
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        if args.command == 'export':
+            begin = time.monotonic()
+            rows = export_reviews(args.db, args.out, args.format, not args.no_text, args.full, args.chunk)
+            log.log(SUCCESS, "Выгружено %d отзывов в %s за %.1f с", rows, args.out, time.monotonic() - begin)
+        else:
+            frame = load_export(args.out, columns=['category', 'day', 'length', 'token_count', 'has_mat'],
+                                categories=args.category)
+            totals = summary(frame)
+            print(f"Всего отзывов: {totals['total']}, с матом: {totals['with_mat']} ({totals['mat_share']:.1%}), "
+                  f"длина: средняя {totals['mean_length']:.0f}, медиана {totals['median_length']:.0f}")
+            print("\nДлина текста:")
+            print(length_histogram(frame).to_string(index=False))
+            print("\nПо категориям:")
+            print(category_distribution(frame).to_string(float_format=lambda value: f'{value:.2f}'))
+            print("\nПо дням:")
+            print(daily_counts(frame).to_string())
+    except (RuntimeError, ValueError, FileNotFoundError) as e:
+        sys.exit(str(e))
@@ -0,0 +1,273 @@
+# bench_crawl.py
+"""
+Сквозной офлайн-бенчмарк парсера на локальном тестовом сервере (fake_site.py).
+
+Замеры:
+- разбор страниц каждого типа функциями extractors.py (мс на страницу);
+- поиск ненормативной лексики MatMatcher (отзывов/с);
+- пакетная запись отзывов в БД через ReviewWriter со всеми триггерами (строк/с);
+- полный обход main.main() против fake_site.py в отдельном процессе (отзывов/с),
+  плюс средние задержки стадий по метрикам парсера.
+
+Результаты можно сохранить как эталон (--save-baseline) и сравнивать с ним при
+следующих запусках: если какой-то показатель хуже эталона больше чем на --tolerance,
+скрипт завершается с кодом 1. Эталон зависит от машины и параметров прогона, поэтому
+сравнение с эталоном, снятым при других параметрах, не выполняется.
+
+Запуск из корня проекта:
+    python benchmarks/bench_crawl.py [--objects 20] [--latency 0.01] [--error-rate 0.05]
+    python benchmarks/bench_crawl.py --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import extractors  # noqa: E402
+import fake_site  # noqa: E402
+import main  # noqa: E402
+from db_writer import ReviewWriter  # noqa: E402
+from mat_matcher import MatMatcher  # noqa: E402
+from metrics import METRICS  # noqa: E402
+
+# region Константы
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+MAT_WORDS_FILE = os.path.join(ROOT, 'mat_words.txt')
+TOLERANCE = 0.2  # Допустимое ухудшение относительно эталона (доля).
+PARSE_REPEAT = 200  # Сколько раз разбирать каждую страницу.
+MAT_TEXTS = 5000  # Сколько синтетических отзывов проверять на мат.
+DB_ROWS = 5000  # Сколько строк записывать в БД.
+SERVER_START_TIMEOUT = 10.0  # Сколько ждать запуска тестового сервера (секунд).
+# endregion
+
+
+def free_port():
+    """Свободный TCP-порт на 127.0.0.1."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def timed(function, repeat):
+    """Среднее время одного вызова function() (секунд)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+# region Микробенчмарки
+def bench_parse(backend, repeat=PARSE_REPEAT):
+    """Время разбора страницы каждого типа (мс на страницу)."""
+    reviews = fake_site.object_reviews('c0-0')
+    pages = (
+        ('index', extractors.extract_category_links, fake_site.index_page()),
+        ('category', extractors.extract_object_links, fake_site.category_page('c0', 1)),
+        ('object', extractors.extract_review_links, fake_site.object_page(reviews, 1)),
+        ('review', extractors.extract_review_text, fake_site.review_page(reviews[0])),
+    )
+    return {f'parse_{kind}_ms': timed(lambda: extract(html, backend), repeat) * 1000
+            for kind, extract, html in pages}
+
+
+def bench_mat(count=MAT_TEXTS):
+    """Скорость проверки отзывов на мат (отзывов/с)."""
+    with open(MAT_WORDS_FILE, 'r', encoding='utf-8') as f:
+        matcher = MatMatcher.from_words(set(line.strip() for line in f))
+    texts = [main.clean_text(fake_site.review_text(f'mat-{i}')) for i in range(count)]
+    elapsed = timed(lambda: [main.contains_mat(text, matcher) for text in texts], 1)
+    return {'mat_reviews_per_sec': count / elapsed}
+
+
+def bench_db(directory, count=DB_ROWS):
+    """Скорость пакетной записи отзывов в БД (строк/с) с триггерами сводных таблиц и FTS."""
+    main.DB_FILE = os.path.join(directory, 'bench_db.db')
+    main.create_db()
+    rows = []
+    for i in range(count):
+        text = main.clean_text(fake_site.review_text(f'db-{i}'))
+        rows.append({'length': len(text), 'category': f'c{i % 10}', 'object_url': f'/item/c0-{i % 100}',
+                     'review_url': f'/review/db-{i}', 'text': text, 'has_mat': False,
+                     'date_scraped': datetime.now(), 'text_digest': main.text_digest(text)})
+    writer = ReviewWriter(main.DB_FILE, main.DB_BATCH_SIZE, main.DB_FLUSH_INTERVAL).start()
+    start = time.perf_counter()
+    for i in range(0, count, 100):  # Пачками, как их отдают страницы объектов.
+        writer.put_many(rows[i:i + 100])
+    writer.close()
+    return {'db_rows_per_sec': count / (time.perf_counter() - start)}
+# endregion
+
+
+# region Сквозной прогон
+def start_site(args, port):
+    """Запускает fake_site.py в отдельном процессе и дожидается, пока он начнёт отвечать."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_site.py'), '--port', str(port),
+         '--categories', str(args.categories), '--objects', str(args.objects),
+         '--review-pages', str(args.review_pages), '--reviews-per-page', str(args.reviews_per_page),
+         '--latency', str(args.latency), '--error-rate', str(args.error_rate)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            site_hits(port)
+            return process
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("Тестовый сервер не запустился")
+            time.sleep(0.1)
+
+
+def site_hits(port):
+    """Счётчики запросов тестового сервера по типам страниц."""
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/_hits', timeout=5) as response:
+        return json.load(response)
+
+
+def histogram_delta(before, after, name):
+    """Количество и сумма значений гистограммы name, добавленных между двумя снимками метрик."""
+    empty = {'count': 0, 'sum': 0.0}
+    count = sum(h['count'] - before['histograms'].get(key, empty)['count']
+                for key, h in after['histograms'].items() if key.split('{')[0] == name)
+    total = sum(h['sum'] - before['histograms'].get(key, empty)['sum']
+                for key, h in after['histograms'].items() if key.split('{')[0] == name)
+    return count, total
+
+
+def bench_crawl(args, directory):
+    """Полный обход тестового сайта; возвращает показатели и сводку прогона."""
+    port = free_port()
+    site = start_site(args, port)
+    os.makedirs(directory)
+    shutil.copy(MAT_WORDS_FILE, directory)
+    cwd = os.getcwd()
+    os.chdir(directory)  # reviews.txt и кэш списка слов создаются в рабочем каталоге.
+    main.BASE_URL = f'http://127.0.0.1:{port}'
+    main.DB_FILE = os.path.join(directory, 'reviews.db')
+    main.HTTP_CACHE_DIR = os.path.join(directory, 'http_cache')
+    main.USE_HTTP_CACHE = args.http_cache
+    main.REQUESTS_PER_SECOND = args.rps
+    main.PARSE_WORKERS = args.parse_workers
+    main.METRICS_PORT = None
+    main.LOG_LEVEL = args.log_level
+    before = METRICS.snapshot()
+    try:
+        start = time.perf_counter()
+        asyncio.run(main.main())
+        elapsed = time.perf_counter() - start
+        hits = site_hits(port)
+    finally:
+        os.chdir(cwd)
+        site.terminate()
+        site.wait()
+    after = METRICS.snapshot()
+    saved = after['counters'].get('reviews_saved_total', 0) - before['counters'].get('reviews_saved_total', 0)
+    stages = {}
+    for name in ('fetch_seconds', 'parse_seconds', 'mat_check_seconds', 'db_write_seconds'):
+        count, total = histogram_delta(before, after, name)
+        stages[name] = total / count * 1000 if count else None
+    summary = {'saved': saved, 'expected': args.categories * args.objects * args.review_pages * args.reviews_per_page,
+               'elapsed': elapsed, 'requests': sum(hits.values()), 'errors': hits.get('errors', 0), 'stages': stages}
+    return {'crawl_reviews_per_sec': saved / elapsed}, summary
+# endregion
+
+
+# region Сравнение с эталоном
+HIGHER_IS_BETTER = {'mat_reviews_per_sec', 'db_rows_per_sec', 'crawl_reviews_per_sec'}
+
+
+def compare(results, baseline, tolerance):
+    """Список показателей, ухудшившихся относительно эталона больше чем на tolerance."""
+    regressions = []
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        change = value / reference - 1 if name in HIGHER_IS_BETTER else reference / value - 1
+        if change < -tolerance:
+            regressions.append((name, value, reference, change))
+    return regressions
+
+
+def config_of(args):
+    """Параметры прогона, от которых зависят результаты (эталон сравним только при их совпадении)."""
+    return {name: getattr(args, name) for name in ('categories', 'objects', 'review_pages', 'reviews_per_page',
+                                                   'latency', 'error_rate', 'rps', 'parse_workers', 'backend',
+                                                   'http_cache')}
+# endregion
+
+
+def run(args):
+    main.PARSER_BACKEND = args.backend
+    results = bench_parse(args.backend)
+    results.update(bench_mat())
+    directory = tempfile.mkdtemp(prefix='bench_crawl_')
+    try:
+        results.update(bench_db(directory))
+        crawl_results, summary = bench_crawl(args, os.path.join(directory, 'crawl'))
+        results.update(crawl_results)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"Обход: сохранено {summary['saved']} из {summary['expected']} отзывов за {summary['elapsed']:.2f} с, "
+          f"запросов к сайту {summary['requests']} (ошибок {summary['errors']})")
+    print("Средние задержки стадий: " + ', '.join(
+        f"{name} {value:.2f} мс" for name, value in summary['stages'].items() if value is not None))
+    for name, value in results.items():
+        print(f"{name:26} {value:12.3f}")
+    if summary['saved'] < summary['expected']:
+        print("Внимание: сохранены не все отзывы тестового сайта")
+
+    config = config_of(args)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': results}, f, ensure_ascii=False, indent=1)
+        print(f"Эталон сохранён: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("Эталона нет - сравнение пропущено (сохраните его ключом --save-baseline)")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('config') != config:
+        print("Эталон снят с другими параметрами - сравнение пропущено")
+        return 0
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for name, value, reference, change in regressions:
+        print(f"Регрессия {name}: {value:.3f} против {reference:.3f} в эталоне ({change:+.0%})")
+    if regressions:
+        return 1
+    print(f"Регрессий нет (допуск {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк парсера на локальном тестовом сервере.")
+    parser.add_argument('--categories', type=int, default=fake_site.CATEGORIES)
+    parser.add_argument('--objects', type=int, default=fake_site.OBJECTS_PER_CATEGORY, help="объектов в категории")
+    parser.add_argument('--review-pages', type=int, default=fake_site.REVIEW_PAGES, help="страниц отзывов у объекта")
+    parser.add_argument('--reviews-per-page', type=int, default=fake_site.REVIEWS_PER_PAGE)
+    parser.add_argument('--latency', type=float, default=fake_site.LATENCY, help="задержка ответа сервера (секунд)")
+    parser.add_argument('--error-rate', type=float, default=fake_site.ERROR_RATE, help="доля ответов 503/429")
+    parser.add_argument('--rps', type=float, default=None,
+                        help="ограничение запросов в секунду (по умолчанию - без ограничения)")
+    parser.add_argument('--parse-workers', type=int, default=main.PARSE_WORKERS, help="процессов для разбора HTML")
+    parser.add_argument('--backend', default=main.PARSER_BACKEND, help="бэкенд разбора: bs4, lxml или stream")
+    parser.add_argument('--http-cache', action='store_true', help="включить дисковый кэш HTTP-ответов")
+    parser.add_argument('--log-level', default='WARNING', help="уровень журнала парсера во время обхода")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="файл эталона")
+    parser.add_argument('--save-baseline', action='store_true', help="сохранить результаты как эталон")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="допустимое ухудшение (доля)")
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,87 @@
+# bench_mat.py
+"""
+Микробенчмарк поиска ненормативной лексики: исходная contains_mat против MatMatcher.
+
+Запуск из корня проекта:
+    python benchmarks/bench_mat.py [--repeat 20]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mat_matcher import MatMatcher  # noqa: E402
+
+REVIEWS_FILE = os.path.join(ROOT, 'reviews.txt')
+MAT_WORDS_FILE = os.path.join(ROOT, 'mat_words.txt')
+
+
+def contains_mat_legacy(text, mat_words):
+    """Исходная реализация из main.py: re.sub + lower + split на каждый вызов."""
+    text_lower = re.sub(r'[^\w\s]', '', text.lower())
+    return next((word for word in text_lower.split() if word in mat_words), None)
+
+
+def load_texts(path=REVIEWS_FILE):
+    """Читает тексты отзывов из reviews.txt."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.split(':', 1)[1].strip() for line in f if line.startswith('Rephrased Text:')]
+
+
+def run(repeat):
+    texts = load_texts()
+    with open(MAT_WORDS_FILE, 'r', encoding='utf-8') as f:
+        mat_words = set(line.strip() for line in f)
+
+    start = time.perf_counter()
+    matcher = MatMatcher.from_words(mat_words)
+    compile_time = time.perf_counter() - start
+    simple_matcher = MatMatcher.from_words(mat_words, compounds=False)
+    start = time.perf_counter()
+    MatMatcher.load(MAT_WORDS_FILE)
+    load_time = time.perf_counter() - start
+
+    total_chars = sum(len(text) for text in texts) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        legacy_flags = [contains_mat_legacy(text, mat_words) is not None for text in texts]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        matcher_flags = matcher.flags(texts)
+    matcher_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        simple_matcher.flags(texts)
+    simple_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        all_hits = matcher.find_many(texts)
+    find_all_time = time.perf_counter() - start
+
+    print(f"Отзывов: {len(texts)} x {repeat}, символов: {total_chars}")
+    print(f"Компиляция основ: {compile_time * 1000:.1f} мс, загрузка из кэша: {load_time * 1000:.1f} мс")
+    for name, elapsed in (('contains_mat (исходная)', legacy_time),
+                          ('MatMatcher.flags', matcher_time),
+                          ('MatMatcher без приставок', simple_time),
+                          ('MatMatcher.find_many', find_all_time)):
+        print(f"{name:26} {elapsed * 1000:9.1f} мс  {len(texts) * repeat / elapsed:10.0f} отзывов/с  "
+              f"{total_chars / elapsed / 1e6:6.2f} Мсимв/с")
+    print(f"С матом: исходная - {sum(legacy_flags)}, MatMatcher - {sum(matcher_flags)} "
+          f"(всего совпадений: {sum(len(hits) for hits in all_hits)})")
+    missed = [text for text, old, new in zip(texts, legacy_flags, matcher_flags) if old and not new]
+    if missed:
+        print(f"MatMatcher пропустил {len(missed)} отзывов, найденных исходной функцией")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска ненормативной лексики.")
+    parser.add_argument('--repeat', type=int, default=20, help="сколько раз прогнать корпус")
+    run(parser.parse_args().repeat)
@@ -0,0 +1,103 @@
+# bench_memory.py
+"""
+Проверка потолка памяти: обход одного объекта с большим количеством отзывов.
+
+Парсер обходит тестовый сайт (fake_site.py) из одной категории с одним объектом на
+--review-pages страниц. Пиковый объём памяти Python (tracemalloc) во время обхода
+сравнивается с --ceiling-mb; при превышении скрипт завершается с кодом 1.
+
+Память обхода ограничена очередями (REVIEW_QUEUE_SIZE), окном страниц объекта
+(PAGES_AHEAD) и очередью записи в БД (DB_MAX_PENDING) и не зависит от размера
+объекта. С размером корпуса растут только индексы дедупликации (около 100 байт
+на отзыв). Ключ --disk-delay замедляет запись reviews.txt, чтобы проверить
+обратное давление от медленного диска.
+
+Запуск из корня проекта:
+    python benchmarks/bench_memory.py [--review-pages 250] [--reviews-per-page 20] [--disk-delay 1 --max-pending 200]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import bench_crawl
+import main
+import reviews_file
+from metrics import METRICS
+
+# region Константы
+REVIEW_PAGES = 250  # Страниц отзывов у объекта.
+REVIEWS_PER_PAGE = 20  # Отзывов на странице объекта.
+CEILING_MB = 64.0  # Допустимый пик памяти Python во время обхода (МБ).
+DISK_DELAY = 0.0  # Искусственная задержка записи каждой пачки в reviews.txt (секунд).
+# endregion
+
+
+def slow_disk(delay):
+    """Замедляет запись пачек в reviews.txt на delay секунд (имитация медленного диска)."""
+    write_batch = reviews_file.ReviewsFileWriter.write_batch
+
+    def delayed(self, texts):
+        time.sleep(delay)
+        return write_batch(self, texts)
+
+    reviews_file.ReviewsFileWriter.write_batch = delayed
+
+
+def run(args):
+    if args.disk_delay:
+        slow_disk(args.disk_delay)
+    args.categories, args.objects, args.error_rate = 1, 1, 0.0
+    port = bench_crawl.free_port()
+    site = bench_crawl.start_site(args, port)
+    directory = tempfile.mkdtemp(prefix='bench_memory_')
+    shutil.copy(bench_crawl.MAT_WORDS_FILE, directory)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    main.BASE_URL = f'http://127.0.0.1:{port}'
+    main.DB_FILE = os.path.join(directory, 'reviews.db')
+    main.USE_HTTP_CACHE = False
+    main.REQUESTS_PER_SECOND = None
+    main.METRICS_PORT = None
+    main.LOG_LEVEL = 'WARNING'
+    main.DB_MAX_PENDING = args.max_pending
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        asyncio.run(main.main())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        os.chdir(cwd)
+        site.terminate()
+        site.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    saved = METRICS.counter('reviews_saved_total')
+    peak_mb = peak / 2 ** 20
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # В Linux - килобайты.
+    print(f"Объект: {args.review_pages} стр. x {args.reviews_per_page} отзывов, сохранено {saved} за {elapsed:.1f} с")
+    print(f"Пик памяти Python: {peak_mb:.1f} МБ (потолок {args.ceiling_mb:.0f} МБ), пик RSS процесса: "
+          f"{max_rss_mb:.1f} МБ, ожиданий записи в БД: {METRICS.counter('writer_waits_total')}")
+    if peak_mb > args.ceiling_mb:
+        print("Потолок памяти превышен")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка потолка памяти на большом объекте.")
+    parser.add_argument('--review-pages', type=int, default=REVIEW_PAGES, help="страниц отзывов у объекта")
+    parser.add_argument('--reviews-per-page', type=int, default=REVIEWS_PER_PAGE)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа сервера (секунд)")
+    parser.add_argument('--disk-delay', type=float, default=DISK_DELAY, help="задержка записи пачки в reviews.txt")
+    parser.add_argument('--max-pending', type=int, default=main.DB_MAX_PENDING,
+                        help="сколько отзывов может ждать записи в БД (DB_MAX_PENDING)")
+    parser.add_argument('--ceiling-mb', type=float, default=CEILING_MB, help="допустимый пик памяти Python (МБ)")
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,107 @@
+# bench_reclassify.py
+"""
+Бенчмарк пересчёта признака мата (reclassify.py) на синтетической базе.
+
+Во временном каталоге создаётся база текущей схемы с --rows отзывами (тексты
+тестового сайта fake_site.py, признак мата не проставлен). Замеры:
+- полный пересчёт (ни одна строка ещё не классифицирована);
+- повторный запуск с тем же списком слов (все строки пропускаются);
+- запуск после изменения списка слов (добавлено одно слово);
+- продолжение прерванного запуска (метка версии снята с половины строк).
+
+После каждого запуска сверяется сводная таблица stats_by_mat с таблицей reviews.
+
+Запуск из корня проекта:
+    python benchmarks/bench_reclassify.py [--rows 200000] [--workers 4] [--codec zlib]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_site  # noqa: E402
+import main  # noqa: E402
+import reclassify  # noqa: E402
+import text_codec  # noqa: E402
+
+# region Константы
+ROWS = 200000  # Отзывов в синтетической базе.
+MAT_WORDS_FILE = os.path.join(ROOT, 'mat_words.txt')
+EXTRA_WORD = 'чайник'  # Слово, добавляемое в список для проверки пересчёта после изменения.
+# endregion
+
+
+def build_db(db_file, rows):
+    """Создаёт базу текущей схемы с rows отзывами без признака мата."""
+    main.DB_FILE = db_file
+    main.create_db()
+    with sqlite3.connect(db_file) as conn:
+        conn.executemany(
+            'INSERT INTO reviews (length, category, object_url, review_url, text, has_mat, date_scraped, text_digest) '
+            'VALUES (?, ?, ?, ?, ?, 0, ?, ?)',
+            ((len(text), f'cat{i % 10}', f'/obj{i // 100}', f'/review/{i}', text, '2024-01-01 00:00:00',
+              i.to_bytes(8, 'big'))
+             for i, text in ((i, fake_site.review_text(i)) for i in range(rows))))
+
+
+def check_summary(db_file):
+    """Проверяет, что stats_by_mat совпадает с таблицей reviews."""
+    with sqlite3.connect(db_file) as conn:
+        actual = dict(conn.execute('SELECT has_mat, COUNT(*) FROM reviews GROUP BY 1'))
+        summary = dict(conn.execute('SELECT has_mat, count FROM stats_by_mat'))
+    return actual == summary, actual.get(1, 0)
+
+
+def timed_run(name, db_file, words_file, args):
+    start = time.perf_counter()
+    result = reclassify.reclassify(db_file, words_file, args.workers, args.chunk)
+    elapsed = time.perf_counter() - start
+    consistent, with_mat = check_summary(db_file)
+    rate = result['checked'] / elapsed if elapsed else 0.0
+    print(f"{name:28} {elapsed:8.2f} {result['checked']:10} {result['changed']:10} {rate:12.0f}   "
+          f"{with_mat:10} {'да' if consistent else 'НЕТ'}")
+    return consistent
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='bench_reclassify_')
+    db_file = os.path.join(directory, 'reviews.db')
+    words_file = os.path.join(directory, 'mat_words.txt')
+    try:
+        shutil.copy(MAT_WORDS_FILE, words_file)
+        start = time.perf_counter()
+        build_db(db_file, args.rows)
+        if args.codec:
+            text_codec.DEFAULT_CODEC = args.codec
+            text_codec.compress_reviews(db_file)
+        print(f"База: {args.rows} отзывов за {time.perf_counter() - start:.1f} с"
+              f"{', тексты сжаты (' + args.codec + ')' if args.codec else ''}")
+        print(f"{'Запуск':28} {'Время, с':>8} {'Проверено':>10} {'Изменено':>10} {'Строк/с':>12}   "
+              f"{'С матом':>10} Сводка")
+        ok = timed_run("Полный пересчёт", db_file, words_file, args)
+        ok &= timed_run("Повторный запуск", db_file, words_file, args)
+        with open(words_file, 'a', encoding='utf-8') as f:
+            f.write(f'\n{EXTRA_WORD}\n')
+        ok &= timed_run("Список слов изменён", db_file, words_file, args)
+        with sqlite3.connect(db_file) as conn:
+            conn.execute('UPDATE reviews SET mat_version = NULL WHERE id % 2 = 0')
+        ok &= timed_run("Продолжение (половина)", db_file, words_file, args)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Скорость пересчёта признака мата.")
+    parser.add_argument('--rows', type=int, default=ROWS, help="отзывов в синтетической базе")
+    parser.add_argument('--workers', type=int, default=None, help="количество процессов (по умолчанию - все ядра)")
+    parser.add_argument('--chunk', type=int, default=reclassify.CHUNK_ROWS, help="ширина диапазона rowid")
+    parser.add_argument('--codec', choices=sorted(text_codec.CODEC_IDS), default=None,
+                        help="сжать тексты перед замерами")
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,117 @@
+# bench_text_storage.py
+"""
+Бенчмарк хранения текстов: размер базы и скорость чтения без сжатия и со словарём.
+
+Работает с копией базы (по умолчанию reviews.db проекта; сама база не меняется):
+приводит её к текущей схеме, замеряет размер и задержки чтения, сжимает тексты
+(text_codec.compress_reviews) и повторяет замеры.
+
+Замеры чтения:
+- get_review() по случайным URL (мс на отзыв);
+- полный проход по текстам через review_text() (отзывов/с);
+- полнотекстовый поиск с фрагментами (мс на запрос).
+
+Запуск из корня проекта:
+    python benchmarks/bench_text_storage.py [--db reviews.db] [--codec zlib] [--reads 2000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+import statistics  # noqa: E402
+import text_codec  # noqa: E402
+
+# region Константы
+READS = 2000  # Сколько случайных отзывов читать.
+SEARCHES = ('кофе', 'работает', 'качество цена', 'доставка')  # Запросы полнотекстового поиска.
+# endregion
+
+
+def close_connection(db_file):
+    """Закрывает соединение statistics.py с базой (следующий запрос откроет новое)."""
+    conn = statistics._connections.pop(db_file, None)
+    if conn is not None:
+        conn.close()
+
+
+def db_size(db_file):
+    """Размер базы после VACUUM и переноса WAL в основной файл (байт)."""
+    with sqlite3.connect(db_file) as conn:
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return os.path.getsize(db_file)
+
+
+def measure(db_file, urls, reads):
+    """Размер и задержки чтения для текущего состояния базы."""
+    close_connection(db_file)  # Новое соединение: кэш страниц SQLite не переносится.
+    size = db_size(db_file)
+    sample = [random.choice(urls) for _ in range(reads)]
+    start = time.perf_counter()
+    for url in sample:
+        statistics.get_review(url, db_file=db_file)
+    read_ms = (time.perf_counter() - start) / reads * 1000
+
+    conn = statistics.get_connection(db_file)
+    start = time.perf_counter()
+    count = sum(1 for _ in conn.execute('SELECT review_text(text, text_z) FROM reviews'))
+    scan_rate = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for query in SEARCHES:
+        statistics.search_reviews(query, prefix=True, db_file=db_file)
+    search_ms = (time.perf_counter() - start) / len(SEARCHES) * 1000
+    return {'size': size, 'read_ms': read_ms, 'scan_rate': scan_rate, 'search_ms': search_ms}
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='bench_text_')
+    db_file = os.path.join(directory, 'reviews.db')
+    try:
+        shutil.copy(args.db, db_file)
+        main.DB_FILE = db_file
+        main.create_db()  # Текущая схема: столбец text_z, полнотекстовый индекс, сводные таблицы.
+        with sqlite3.connect(db_file) as conn:
+            urls = [row[0] for row in conn.execute('SELECT review_url FROM reviews WHERE review_url IS NOT NULL')]
+        if not urls:
+            print("В базе нет отзывов")
+            return 1
+        text_codec.DEFAULT_CODEC = args.codec
+        plain = measure(db_file, urls, args.reads)
+        close_connection(db_file)
+        start = time.perf_counter()
+        compressed_rows = text_codec.compress_reviews(db_file)
+        migrate_time = time.perf_counter() - start
+        packed = measure(db_file, urls, args.reads)
+        stats = text_codec.storage_stats(db_file)
+    finally:
+        close_connection(db_file)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"Отзывов: {len(urls)}, сжато: {compressed_rows} за {migrate_time:.2f} с, кодек: {args.codec}")
+    print(f"Тексты: {stats['text_bytes']} байт -> {stats['compressed_bytes'] + stats['plain_bytes']} байт "
+          f"(x{stats['text_bytes'] / max(stats['compressed_bytes'] + stats['plain_bytes'], 1):.2f}), "
+          f"словарь {stats['dictionary_bytes']} байт")
+    print(f"{'':24} {'без сжатия':>12} {'со словарём':>12}")
+    for name, key, fmt in (('Размер базы, КБ', 'size', '{:12.0f}'), ('get_review, мс', 'read_ms', '{:12.3f}'),
+                           ('Проход по текстам, 1/с', 'scan_rate', '{:12.0f}'), ('Поиск, мс', 'search_ms', '{:12.2f}')):
+        scale = 1024 if key == 'size' else 1
+        print(f"{name:24} {fmt.format(plain[key] / scale)} {fmt.format(packed[key] / scale)}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Размер базы и скорость чтения со сжатием текстов и без.")
+    parser.add_argument('--db', default=os.path.join(ROOT, 'reviews.db'), help="база с отзывами (копируется)")
+    parser.add_argument('--codec', default=text_codec.DEFAULT_CODEC, choices=sorted(text_codec.CODEC_IDS))
+    parser.add_argument('--reads', type=int, default=READS, help="сколько случайных отзывов читать")
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,124 @@
+# bench_weather.py
+"""
+Бенчмарк получения погоды (weather.py) на локальной странице в разметке gismeteo.
+
+Тестовый сервер (fake_site.py) отдаёт страницы /weather-<город>/ размером около
+400 КБ. Замеры:
+- исходный подход Weather_Example.py: последовательные запросы без сессии и разбор
+  всей страницы BeautifulSoup (на --legacy-cities городах, с пересчётом на один город);
+- WeatherClient.get_many по --cities городам: первый вызов (сеть) и повторный (кэш);
+- извлечение температуры из одной страницы разными бэкендами extractors.py.
+
+Показания сверяются с температурами сервера; при расхождении скрипт завершается с кодом 1.
+
+Запуск из корня проекта:
+    python benchmarks/bench_weather.py [--cities 300] [--latency 0.05] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import sys
+import time
+import urllib.request
+
+from bs4 import BeautifulSoup
+
+import bench_crawl
+import extractors
+import fake_site
+import weather
+
+try:
+    import requests
+except ImportError:  # Исходный пример использует requests; без него - urllib из стандартной библиотеки.
+    requests = None
+
+# region Константы
+CITIES = 300  # Сколько городов опрашивать.
+LEGACY_CITIES = 20  # Сколько городов опрашивать исходным способом (он медленный).
+LATENCY = 0.05  # Задержка ответа тестового сервера (секунд).
+PARSE_REPEAT = 20  # Сколько раз разбирать страницу в замере извлечения.
+# endregion
+
+
+def legacy_temperature(url):
+    """Исходный Weather_Example.py: отдельный запрос без сессии и разбор всей страницы."""
+    if requests is not None:
+        response = requests.get(url, headers=weather.HEADERS)
+        response.raise_for_status()
+        html = response.text
+    else:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=weather.HEADERS)) as response:
+            html = response.read().decode('utf-8')
+    soup = BeautifulSoup(html, 'html.parser')
+    block = soup.find('div', class_='weather-value')
+    element = block.find('temperature-value') if block else None
+    return weather.parse_temperature(element.get('value')) if element else None
+
+
+async def bulk(base_url, cities, concurrency):
+    """Два вызова get_many одним клиентом: (время первого, время повторного, показания)."""
+    async with weather.WeatherClient(base_url, rate=None, initial_concurrency=concurrency,
+                                     max_concurrency=concurrency) as client:
+        start = time.perf_counter()
+        readings = await client.get_many(cities)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        await client.get_many(cities)
+        warm = time.perf_counter() - start
+    return cold, warm, readings
+
+
+def run(args):
+    args.categories, args.objects, args.review_pages, args.reviews_per_page, args.error_rate = 1, 1, 1, 1, 0.0
+    port = bench_crawl.free_port()
+    site = bench_crawl.start_site(args, port)
+    base_url = f'http://127.0.0.1:{port}'
+    cities = [f'city-{i}' for i in range(args.cities)]
+    try:
+        start = time.perf_counter()
+        legacy = [legacy_temperature(base_url + weather.CITY_PATH.format(city=city))
+                  for city in cities[:args.legacy_cities]]
+        legacy_time = (time.perf_counter() - start) / max(args.legacy_cities, 1)
+        hits_before = bench_crawl.site_hits(port).get('weather', 0)
+        cold, warm, readings = asyncio.run(bulk(base_url, cities, args.concurrency))
+        requested = bench_crawl.site_hits(port).get('weather', 0) - hits_before
+    finally:
+        site.terminate()
+        site.wait()
+
+    expected = {city: float(fake_site.weather_temperature(city)) for city in cities}
+    wrong = [city for city, reading in readings.items() if reading['temperature'] != expected[city]]
+    wrong += [city for city, value in zip(cities, legacy) if value != expected[city]]
+
+    page = fake_site.weather_page(cities[0])
+    parse_ms = {}
+    for backend in ('stream', 'lxml', 'bs4'):
+        start = time.perf_counter()
+        for _ in range(PARSE_REPEAT):
+            extractors.extract_temperature(page, backend)
+        parse_ms[backend] = (time.perf_counter() - start) / PARSE_REPEAT * 1000
+
+    print(f"Страница: {len(page.encode('utf-8')) // 1024} КБ, задержка сервера {args.latency * 1000:.0f} мс, "
+          f"городов: {args.cities}, одновременных запросов: {args.concurrency}")
+    print(f"Исходный способ ({'requests' if requests is not None else 'urllib'} + BeautifulSoup): "
+          f"{legacy_time * 1000:.1f} мс на город, {args.cities} городов ~ {legacy_time * args.cities:.1f} с")
+    print(f"get_many, первый вызов: {cold:.2f} с ({args.cities / cold:.0f} городов/с), запросов к серверу: "
+          f"{requested}")
+    print(f"get_many, повторный вызов (кэш): {warm * 1000:.2f} мс")
+    print("Извлечение температуры, мс на страницу: "
+          + ', '.join(f"{backend} {value:.2f}" for backend, value in parse_ms.items()))
+    if wrong:
+        print(f"Неверные показания: {len(wrong)} (например, {wrong[0]})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Скорость опроса погоды по многим городам.")
+    parser.add_argument('--cities', type=int, default=CITIES, help="сколько городов опрашивать")
+    parser.add_argument('--legacy-cities', type=int, default=LEGACY_CITIES,
+                        help="сколько городов опрашивать исходным способом")
+    parser.add_argument('--latency', type=float, default=LATENCY, help="задержка ответа сервера (секунд)")
+    parser.add_argument('--concurrency', type=int, default=weather.MAX_CONCURRENCY,
+                        help="одновременных запросов к серверу")
+    sys.exit(run(parser.parse_args()))
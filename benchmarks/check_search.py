@@ -0,0 +1,109 @@
+# check_search.py
+"""
+Проверка полнотекстового поиска: "ё" и "е" в текстах и запросах взаимозаменяемы.
+
+Создаёт временную базу текущей схемы (main.create_db), добавляет отзывы с "ё" и
+"е" обычной вставкой (триггеры индекса, без функций Python) и проверяет, что
+запросы с "ё" находят тексты с "е" и наоборот - в том числе по префиксу, после
+изменения текста, после сжатия текстов (text_codec.compress_reviews), перестройки
+индекса и для отзыва, записанного сжатым через db_writer.
+
+Завершается с кодом 1, если хотя бы один запрос нашёл не те отзывы.
+
+Запуск из корня проекта:
+    python benchmarks/check_search.py
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db_writer  # noqa: E402
+import main  # noqa: E402
+import search_index  # noqa: E402
+import statistics  # noqa: E402
+import text_codec  # noqa: E402
+
+# region Константы
+TEXTS = (
+    'Купили ёлку к празднику, стоит ровно.',
+    'Елка осыпалась через неделю.',
+    'ЁЛОЧНЫЕ игрушки пришли целыми.',
+    'Кофеварка работает тихо, кофе горячий.',
+)  # Тексты отзывов в порядке id (1, 2, 3, 4).
+FILLER = 50  # Дополнительных отзывов без "ё" (для обучения словаря сжатия).
+
+# Запрос, поиск по префиксу, ожидаемые id отзывов.
+CASES = (
+    ('ёлку', False, {1}), ('елку', False, {1}),
+    ('ёлка', False, {2}), ('елка', False, {2}), ('ЁЛКА', False, {2}),
+    ('ёлочные', False, {3}), ('елочные', False, {3}),
+    ('ёлк', True, {1, 2}), ('елк', True, {1, 2}), ('елоч', True, {3}),
+)
+UPDATED_TEXT = 'Ёлка простояла до марта.'  # Новый текст отзыва 2 (проверка триггера обновления).
+WRITER_TEXT = 'Ёжик на коробке помялся.'  # Отзыв, записываемый сжатым через db_writer.
+# endregion
+
+
+def close_connection(db_file):
+    """Закрывает соединение statistics.py с базой (следующий запрос откроет новое)."""
+    conn = statistics._connections.pop(db_file, None)
+    if conn is not None:
+        conn.close()
+
+
+def check(db_file, stage, cases):
+    """Выполняет запросы и выводит расхождения. Возвращает количество неверных запросов."""
+    close_connection(db_file)
+    wrong = 0
+    for query, prefix, expected in cases:
+        found = {hit['id'] for hit in statistics.search_reviews(query, prefix=prefix, page_size=100, db_file=db_file)}
+        if found != expected:
+            wrong += 1
+            print(f"{stage}: '{query}'{'*' if prefix else ''} нашёл {sorted(found)}, ожидалось {sorted(expected)}")
+    print(f"{stage}: {len(cases) - wrong}/{len(cases)} запросов верно")
+    return wrong
+
+
+def run():
+    directory = tempfile.mkdtemp(prefix='check_search_')
+    db_file = os.path.join(directory, 'reviews.db')
+    try:
+        main.DB_FILE = db_file
+        main.create_db()
+        texts = list(TEXTS) + [f'Отзыв номер {i}: товар обычный, доставка быстрая.' for i in range(FILLER)]
+        with sqlite3.connect(db_file) as conn:  # Без register(): схема не должна требовать функций Python.
+            conn.executemany('INSERT INTO reviews (text) VALUES (?)', [(text,) for text in texts])
+        wrong = check(db_file, "Вставка", CASES)
+
+        with sqlite3.connect(db_file) as conn:
+            conn.execute('UPDATE reviews SET text = ? WHERE id = 2', (UPDATED_TEXT,))
+        wrong += check(db_file, "Обновление", CASES + (('марта', False, {2}),))
+
+        close_connection(db_file)
+        text_codec.DEFAULT_CODEC = 'zlib'  # Не зависит от пакета zstandard.
+        text_codec.compress_reviews(db_file)
+        wrong += check(db_file, "Сжатие", CASES)
+        with sqlite3.connect(db_file) as conn:
+            conn.execute(f"INSERT INTO {search_index.FTS_TABLE} ({search_index.FTS_TABLE}) VALUES ('delete-all')")
+            search_index.rebuild_search_index(conn)
+        wrong += check(db_file, "Перестройка индекса", CASES)
+
+        writer = db_writer.ReviewWriter(db_file, codec=text_codec.get_codec(db_file).load()).start()
+        writer.put_many([{'length': len(WRITER_TEXT), 'category': None, 'object_url': None, 'review_url': None,
+                          'text': WRITER_TEXT, 'has_mat': False, 'date_scraped': None, 'text_digest': None}])
+        writer.close()
+        written = {len(texts) + 1}
+        wrong += check(db_file, "Запись сжатым", (('ежик', False, written), ('ёжик', False, written)))
+    finally:
+        close_connection(db_file)
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
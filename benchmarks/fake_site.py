@@ -0,0 +1,185 @@
+# fake_site.py
+"""
+Локальный тестовый сервер, имитирующий структуру vseotzyvy.ru.
+
+Главная страница ссылается на категории, страницы категорий (?page=N) - на объекты,
+страницы объектов (?page=N) - на отзывы, страница отзыва содержит текст в том же
+<span>, что и настоящий сайт. Тексты отзывов детерминированы (зависят только от URL),
+поэтому результаты прогонов можно сравнивать между собой.
+
+Запуск (в отдельном терминале):
+    python benchmarks/fake_site.py [--port 8765] [--categories 2] [--objects 20]
+
+Парсер против сервера:
+    python main.py --base-url http://127.0.0.1:8765
+    python main.py --base-url http://127.0.0.1:8765 --workers 4
+
+Страница погоды в разметке gismeteo (для weather.py): GET /weather-<город>/.
+
+Счётчики запросов по типам страниц: GET /_hits (ответы с ошибкой - под ключом 'errors').
+"""
+import argparse
+import asyncio
+import random
+
+from aiohttp import web
+
+# region Константы
+PORT = 8765  # Порт сервера.
+CATEGORIES = 2  # Количество категорий.
+OBJECTS_PER_CATEGORY = 20  # Количество объектов в категории.
+OBJECTS_PER_PAGE = 15  # Объектов на странице категории.
+REVIEW_PAGES = 3  # Страниц отзывов у каждого объекта.
+REVIEWS_PER_PAGE = 4  # Отзывов на странице объекта.
+LATENCY = 0.01  # Задержка ответа (секунд).
+NEW_REVIEWS = 0  # Сколько новых отзывов добавлено в начало каждого третьего объекта (проверка инкрементального обхода).
+ERROR_RATE = 0.0  # Доля запросов, на которые сервер отвечает 503 или 429 (проверка повторов).
+WEATHER_PADDING = 2000  # Блоков разметки до и после температуры (страница около 400 КБ, как у gismeteo).
+
+VOCABULARY = ('кофе чайник работает отлично плохо сломался через месяц доволен покупкой цена качество бля '
+              'доставка быстро медленно звук громкий тихий дизайн красивый удобный ручка кнопка фильтр вода').split()
+# endregion
+
+
+def review_text(review_id):
+    """Детерминированный текст отзыва по его идентификатору."""
+    rnd = random.Random(review_id)
+    words = ' '.join(rnd.choice(VOCABULARY) for _ in range(rnd.randint(20, 120)))
+    return f"Отзыв {review_id}. {words}.\n\n ok"
+
+
+# region Разметка страниц (та же, что разбирают функции extractors.py)
+def html_page(body):
+    """Оборачивает содержимое в HTML-документ."""
+    return f'<html><body>{body}</body></html>'
+
+
+def index_page(categories=CATEGORIES):
+    """Главная страница: ссылки на категории."""
+    return html_page(''.join(f'<a href="/category/c{i}">Категория {i}</a>' for i in range(categories)))
+
+
+def category_page(name, page, objects=OBJECTS_PER_CATEGORY):
+    """Страница page категории name: ссылки на объекты (пустая - за концом списка)."""
+    first = (page - 1) * OBJECTS_PER_PAGE
+    return html_page(''.join(f'<a href="/item/{name}-{o}" title="Объект {o}">{o}</a>'
+                             for o in range(first, min(first + OBJECTS_PER_PAGE, objects))))
+
+
+def object_reviews(name, review_pages=REVIEW_PAGES, reviews_per_page=REVIEWS_PER_PAGE, new_reviews=NEW_REVIEWS):
+    """Идентификаторы отзывов объекта name от новых к старым."""
+    reviews = [f'{name}-{p}-{k}' for p in range(1, review_pages + 1) for k in range(reviews_per_page)]
+    if int(name.rsplit('-', 1)[1]) % 3 == 0:
+        reviews = [f'{name}-new-{k}' for k in range(new_reviews)] + reviews
+    return reviews
+
+
+def object_page(reviews, page, reviews_per_page=REVIEWS_PER_PAGE):
+    """Страница page объекта: ссылки на отзывы из списка reviews."""
+    reviews = reviews[(page - 1) * reviews_per_page:page * reviews_per_page]
+    return html_page(''.join(f'<a class="r_space" href="/review/{review}">Отзыв</a>' for review in reviews))
+
+
+def review_page(review_id):
+    """Страница отзыва с текстом в том же <span>, что и на настоящем сайте."""
+    return html_page(f'<span class="description line-height-comfort">{review_text(review_id)}</span>')
+
+
+def weather_temperature(city):
+    """Детерминированная температура города."""
+    return random.Random(city).randint(-30, 35)
+
+
+def weather_page(city, padding=WEATHER_PADDING):
+    """Страница погоды: температура в <div class="weather-value"> среди блоков другой разметки."""
+    filler = ''.join(f'<div class="widget"><span class="unit">{i}</span><a href="/news/{i}">Новость {i}</a></div>'
+                     for i in range(padding))
+    return html_page(f'{filler}<div class="weather-value"><temperature-value value="{weather_temperature(city)}" '
+                     f'from-unit="c" reactive=""></temperature-value></div>{filler}')
+# endregion
+
+
+def make_app(categories=CATEGORIES, objects=OBJECTS_PER_CATEGORY, review_pages=REVIEW_PAGES,
+             reviews_per_page=REVIEWS_PER_PAGE, latency=LATENCY, error_rate=ERROR_RATE, new_reviews=NEW_REVIEWS):
+    """
+    Создаёт приложение aiohttp с заданными размерами сайта.
+
+    Отзывы объекта идут от новых к старым. new_reviews - сколько отзывов "появилось" у каждого
+    третьего объекта после первоначального обхода: они стоят первыми и сдвигают остальные
+    отзывы на следующие страницы.
+
+    error_rate - доля запросов страниц, на которые вместо страницы отдаётся 503
+    (или 429 с заголовком Retry-After).
+    """
+    hits = {}
+    rnd = random.Random(0)
+
+    def count(kind):
+        hits[kind] = hits.get(kind, 0) + 1
+
+    @web.middleware
+    async def failures(request, handler):
+        if request.path != '/_hits' and rnd.random() < error_rate:
+            count('errors')
+            if rnd.random() < 0.5:
+                raise web.HTTPTooManyRequests(headers={'Retry-After': '1'})
+            raise web.HTTPServiceUnavailable()
+        return await handler(request)
+
+    def html(text):
+        return web.Response(text=text, content_type='text/html')
+
+    async def index(request):
+        count('index')
+        return html(index_page(categories))
+
+    async def category(request):
+        count('category')
+        page = int(request.query.get('page', 1))
+        await asyncio.sleep(latency)
+        return html(category_page(request.match_info['name'], page, objects))
+
+    async def item(request):
+        count('item')
+        page = int(request.query.get('page', 1))
+        reviews = object_reviews(request.match_info['name'], review_pages, reviews_per_page, new_reviews)
+        await asyncio.sleep(latency)
+        return html(object_page(reviews, page, reviews_per_page))
+
+    async def review(request):
+        count('review')
+        await asyncio.sleep(latency)
+        return html(review_page(request.match_info['name']))
+
+    async def weather(request):
+        count('weather')
+        await asyncio.sleep(latency)
+        return html(weather_page(request.match_info['city']))
+
+    async def stats(request):
+        return web.json_response(hits)
+
+    app = web.Application(middlewares=[failures])
+    app.router.add_get('/', index)
+    app.router.add_get('/category/{name}', category)
+    app.router.add_get('/item/{name}', item)
+    app.router.add_get('/review/{name}', review)
+    app.router.add_get('/weather-{city}/', weather)
+    app.router.add_get('/_hits', stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный тестовый сервер со структурой vseotzyvy.ru.")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--categories', type=int, default=CATEGORIES)
+    parser.add_argument('--objects', type=int, default=OBJECTS_PER_CATEGORY, help="объектов в категории")
+    parser.add_argument('--review-pages', type=int, default=REVIEW_PAGES, help="страниц отзывов у объекта")
+    parser.add_argument('--reviews-per-page', type=int, default=REVIEWS_PER_PAGE)
+    parser.add_argument('--latency', type=float, default=LATENCY, help="задержка ответа (секунд)")
+    parser.add_argument('--new-reviews', type=int, default=NEW_REVIEWS, help="новых отзывов у каждого третьего объекта")
+    parser.add_argument('--error-rate', type=float, default=ERROR_RATE, help="доля ответов 503/429")
+    args = parser.parse_args()
+    app = make_app(args.categories, args.objects, args.review_pages, args.reviews_per_page, args.latency,
+                   args.error_rate, args.new_reviews)
+    web.run_app(app, host='127.0.0.1', port=args.port)
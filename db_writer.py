@@ -0,0 +1,238 @@
+# db_writer.py
+"""
+Фоновая запись отзывов в SQLite.
+
+Писатель работает в отдельном потоке с одним долгоживущим соединением в режиме WAL.
+Отзывы копятся в очереди и записываются пачками в одной транзакции: пачка
+сбрасывается, когда набирается batch_size строк или проходит flush_interval секунд
+с момента первой незаписанной строки. Цикл событий asyncio только кладёт строки в
+очередь и никогда не ждёт диска.
+
+Вместе с отзывами в ту же транзакцию попадают дополнительные SQL-операторы
+(контрольные точки обхода), поэтому после сбоя база никогда не содержит
+контрольную точку без отзывов, которые она покрывает, и наоборот. Зафиксированные
+отзывы затем дописываются в текстовый файл (reviews_file.py), если он передан;
+строки, пропущенные как дубликаты (INSERT OR IGNORE), в файл не попадают и в
+"Сохранено" не считаются.
+Если передан TextCodec (text_codec.py), тексты записываются в БД сжатыми, а в
+текстовый файл - как есть; сжатые тексты писатель сам добавляет в полнотекстовый
+индекс (триггеры индекса видят только несжатый столбец text).
+
+Очередь ограничена max_pending строками: если диск не успевает, производители ждут
+в wait_for_room(), и память не растёт вместе с отставанием записи.
+
+Пачка, которую не удалось записать (sqlite3.OperationalError: база занята, ошибка
+ввода-вывода), записывается повторно с растущей паузой. Если повторы не помогли
+или ошибка не временная, поток записи останавливается: пачка и всё, что стоит за
+ней в очереди, не записываются (контрольные точки вместе с ними, поэтому
+следующий запуск обойдёт эти отзывы заново). Ошибка сохраняется в атрибуте
+error, и вызывается обработчик on_error - main.py по нему прерывает обход.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from logs import SUCCESS
+from metrics import METRICS, SIZE_BUCKETS
+from search_index import index_texts
+
+# region Константы
+DB_BATCH_SIZE = 500  # Сколько строк записывать одной транзакцией.
+DB_FLUSH_INTERVAL = 2.0  # Максимальная задержка записи (секунд).
+DB_MAX_PENDING = 5000  # Сколько строк может ждать записи, прежде чем производители начнут ждать.
+BUSY_TIMEOUT = 30.0  # Сколько ждать, пока другой процесс держит блокировку записи (секунд).
+DB_WRITE_RETRIES = 5  # Сколько раз повторять запись пачки после временной ошибки.
+DB_RETRY_DELAY = 0.5  # Пауза перед первым повтором (секунд); каждый следующий ждёт вдвое дольше.
+
+INSERT_REVIEW_SQL = '''
+    INSERT OR IGNORE INTO reviews (length, category, object_url, review_url, text, text_z, has_mat, mat_version,
+                                   date_scraped, text_digest)
+    VALUES (:length, :category, :object_url, :review_url, :text, :text_z, :has_mat, :mat_version, :date_scraped,
+            :text_digest)
+'''  # Строки, нарушающие уникальность review_url или text_digest, пропускаются.
+# endregion
+
+log = logging.getLogger(__name__)
+
+_STOP = object()  # Сигнал завершения для потока записи.
+
+
+def connect(db_file):
+    """Открывает соединение с базой в режиме WAL (читатели не блокируют писателя)."""
+    conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT)  # Базу могут писать несколько процессов-воркеров.
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')  # В режиме WAL надёжно и без fsync на каждую транзакцию.
+    return conn
+
+
+class ReviewWriter:
+    """Поток, записывающий отзывы в базу пачками."""
+
+    def __init__(self, db_file, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL, text_writer=None,
+                 max_pending=DB_MAX_PENDING, codec=None, on_error=None):
+        self.db_file = db_file
+        self.text_writer = text_writer  # ReviewsFileWriter для копии отзывов в reviews.txt (или None).
+        self.codec = codec  # TextCodec для сжатия текстов в БД (или None - без сжатия).
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._pending_rows = 0  # Строки, поставленные в очередь и ещё не записанные.
+        self._room = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='review-writer', daemon=True)
+        self.written = 0  # Сколько строк записано (для статистики).
+        self.error = None  # Ошибка, после которой поток записи остановился (или None).
+        self.on_error = on_error  # Вызывается из потока записи с этой ошибкой (или None).
+
+    def start(self):
+        """Запускает поток записи."""
+        self._thread.start()
+        return self
+
+    def put_many(self, reviews, statements=()):
+        """
+        Ставит отзывы в очередь на запись (не блокируется; ограничение - см. wait_for_room).
+
+        Args:
+            reviews: Список словарей с данными отзывов.
+            statements: Список пар (SQL, параметры), выполняемых в той же транзакции
+                        после вставки отзывов (в порядке постановки в очередь).
+        """
+        with self._room:
+            self._pending_rows += len(reviews)
+        self._queue.put((reviews, statements))
+
+    def pending(self):
+        """Сколько пачек ждёт записи в очереди."""
+        return self._queue.qsize()
+
+    def pending_rows(self):
+        """Сколько строк ждёт записи."""
+        return self._pending_rows
+
+    def has_room(self):
+        """Можно ли ставить новые строки без превышения max_pending."""
+        return self._pending_rows < self.max_pending
+
+    def wait_for_room(self):
+        """Блокируется, пока в очереди не освободится место (вызывать вне цикла событий)."""
+        with self._room:
+            self._room.wait_for(lambda: self._pending_rows < self.max_pending or not self._thread.is_alive())
+
+    def close(self):
+        """Записывает всё, что осталось в очереди, и останавливает поток (блокирующий вызов)."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self.text_writer is not None:
+            self.text_writer.close()
+
+    def _run(self):
+        """Цикл потока: собирает пачки и записывает их."""
+        conn = connect(self.db_file)
+        rows, statements = [], []
+        deadline = None  # Момент, к которому нужно сбросить текущую пачку.
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                reviews, item_statements = item
+                rows.extend(reviews)
+                statements.extend(item_statements)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if stopping or len(rows) >= self.batch_size or (deadline is not None and time.monotonic() >= deadline):
+                try:
+                    self._flush(conn, rows, statements)
+                except sqlite3.Error as e:  # Дальше не пишем: следующие пачки зависят от этой.
+                    self._fail(e)
+                    break
+                with self._room:
+                    self._pending_rows -= len(rows)
+                    self._room.notify_all()
+                rows, statements, deadline = [], [], None
+        conn.close()
+        with self._room:
+            self._room.notify_all()  # Поток завершён - никто не должен ждать места вечно.
+
+    def _encode(self, row):
+        """Параметры вставки строки: текст сжимается, если есть словарь и сжатие выгодно."""
+        blob = self.codec.compress(row['text']) if self.codec is not None else None
+        row = {'mat_version': None, **row}
+        if blob is None:
+            return {**row, 'text_z': None}
+        return {**row, 'text': None, 'text_z': blob}
+
+    def _fail(self, error):
+        """Запоминает ошибку, после которой поток записи останавливается, и сообщает о ней."""
+        self.error = error
+        log.error("Запись в БД остановлена: %s", error)
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def _write(self, conn, rows, params, statements):
+        """
+        Одна транзакция пачки: фиксация при успехе, откат при ошибке.
+
+        Строки вставляются по одному: rowcount показывает, какие из них вставлены, а
+        какие пропущены INSERT OR IGNORE (дубликаты), а lastrowid - id для индекса
+        сжатых текстов.
+
+        Returns:
+            Список вставленных строк (исходные словари rows).
+        """
+        inserted, indexed = [], []
+        with METRICS.timer('db_write_seconds'), conn:
+            for row, encoded in zip(rows, params):
+                cursor = conn.execute(INSERT_REVIEW_SQL, encoded)
+                if cursor.rowcount:
+                    inserted.append(row)
+                    if encoded['text'] is None:
+                        indexed.append((cursor.lastrowid, row['text']))
+            index_texts(conn, indexed)
+            for sql, values in statements:
+                conn.execute(sql, values)
+        return inserted
+
+    def _flush(self, conn, rows, statements):
+        """
+        Записывает пачку отзывов и контрольных точек одной транзакцией.
+
+        Временные ошибки (sqlite3.OperationalError) повторяются DB_WRITE_RETRIES раз с
+        растущей паузой; если запись так и не удалась, ошибка пробрасывается.
+        """
+        if not rows and not statements:
+            return
+        params = [self._encode(row) for row in rows]
+        delay = DB_RETRY_DELAY
+        for attempt in range(DB_WRITE_RETRIES + 1):
+            try:
+                inserted = self._write(conn, rows, params, statements)
+                break
+            except sqlite3.Error as e:
+                METRICS.inc('db_errors_total')
+                if not isinstance(e, sqlite3.OperationalError) or attempt == DB_WRITE_RETRIES:
+                    raise
+                log.warning("Ошибка записи в БД: %s, повтор через %.1f с", e, delay)
+                time.sleep(delay)
+                delay *= 2
+        METRICS.observe('db_batch_rows', len(rows), buckets=SIZE_BUCKETS)
+        METRICS.inc('reviews_saved_total', len(inserted))
+        if len(inserted) < len(rows):
+            log.debug("Пропущено дубликатов: %d", len(rows) - len(inserted))
+        if inserted:
+            self.written += len(inserted)
+            log.log(SUCCESS, "Сохранено %d отзывов в БД", len(inserted))
+            if self.text_writer is not None:  # В файл - только вставленные: дубликатов в нём не будет.
+                try:
+                    with METRICS.timer('file_write_seconds'):
+                        self.text_writer.write_batch([row['text'] for row in inserted])
+                except OSError as e:
+                    log.error("Ошибка записи в файл: %s", e)
@@ -0,0 +1,255 @@
+# extractors.py
+"""
+Извлечение данных из HTML-страниц сайта с взаимозаменяемыми бэкендами.
+
+Бэкенды:
+    'bs4'    - BeautifulSoup + html.parser (исходная реализация, строит полное дерево).
+    'lxml'   - lxml.html + XPath (быстрый C-парсер; нужен пакет lxml).
+    'stream' - потоковый разбор html.parser без построения дерева; текст отзыва
+               извлекается с остановкой сразу после закрытия нужного <span>,
+               температура - с начала блока погоды (см. extract_temperature).
+
+Все функции модуля - обычные функции верхнего уровня, поэтому их можно выполнять
+в ProcessPoolExecutor, не блокируя цикл событий asyncio.
+"""
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:  # lxml - необязательная зависимость.
+    lxml = None
+
+# region Константы
+REVIEW_SPAN_CLASS = 'description line-height-comfort'  # Класс <span> с текстом отзыва.
+REVIEW_LINK_CLASS = 'r_space'  # Класс ссылок на отзывы на странице объекта.
+CATEGORY_PREFIX = '/category/'  # Префикс ссылок на категории.
+WEATHER_DIV_CLASS = 'weather-value'  # Класс <div> с текущей температурой на странице gismeteo.
+TEMPERATURE_TAG = 'temperature-value'  # Элемент внутри него; температура - в атрибуте value.
+DEFAULT_BACKEND = 'stream'  # Бэкенд по умолчанию.
+# endregion
+
+
+# region Потоковый бэкенд
+class _StopParsing(Exception):
+    """Прерывает потоковый разбор, когда нужные данные уже найдены."""
+
+
+class _LinkCollector(HTMLParser):
+    """Собирает href ссылок <a>, удовлетворяющих условию, за один проход без построения дерева."""
+
+    def __init__(self, predicate):
+        super().__init__(convert_charrefs=True)
+        self.predicate = predicate
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            attrs = dict(attrs)
+            if attrs.get('href') and self.predicate(attrs):
+                self.hrefs.append(attrs['href'])
+
+
+class _ReviewTextCollector(HTMLParser):
+    """Собирает текст первого <span> с текстом отзыва и останавливается на его закрытии."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.depth = 0  # Глубина вложенных <span> внутри найденного элемента (0 - ещё не найден).
+        self.parts = []
+        self.found = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.depth:
+            if tag == 'span':
+                self.depth += 1
+        elif tag == 'span' and dict(attrs).get('class') == REVIEW_SPAN_CLASS:
+            self.depth = 1
+            self.found = True
+
+    def handle_endtag(self, tag):
+        if self.depth and tag == 'span':
+            self.depth -= 1
+            if not self.depth:
+                raise _StopParsing  # Весь текст отзыва получен - остаток страницы не разбираем.
+
+    def handle_data(self, data):
+        if self.depth:
+            data = data.strip()
+            if data:
+                self.parts.append(data)
+
+
+class _TemperatureCollector(HTMLParser):
+    """Находит первый <temperature-value> внутри <div class="weather-value"> и останавливается."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.depth = 0  # Глубина вложенных <div> внутри найденного блока (0 - ещё не найден).
+        self.value = None
+        self.found = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.depth:
+            if tag == 'div':
+                self.depth += 1
+            elif tag == TEMPERATURE_TAG:
+                self.value = dict(attrs).get('value')
+                self.found = True
+                raise _StopParsing
+        elif tag == 'div' and WEATHER_DIV_CLASS in (dict(attrs).get('class') or '').split():
+            self.depth = 1
+
+    def handle_endtag(self, tag):
+        if self.depth and tag == 'div':
+            self.depth -= 1
+
+
+def _stream_links(html, predicate):
+    """Потоковый сбор ссылок."""
+    parser = _LinkCollector(predicate)
+    parser.feed(html)
+    parser.close()
+    return parser.hrefs
+
+
+def _stream_review_text(html):
+    """Потоковое извлечение текста отзыва с ранней остановкой."""
+    parser = _ReviewTextCollector()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _StopParsing:
+        pass
+    return ''.join(parser.parts) if parser.found else None
+
+
+def _stream_temperature(html):
+    """
+    Потоковое извлечение температуры.
+
+    Разбор начинается с тега, в котором впервые встречается класс блока погоды, а не с
+    начала страницы; если там элемент не найден, страница разбирается целиком.
+    """
+    start = html.find(WEATHER_DIV_CLASS)
+    start = html.rfind('<', 0, start) if start > 0 else -1
+    for offset in ((start, 0) if start > 0 else (0,)):
+        parser = _TemperatureCollector()
+        try:
+            parser.feed(html[offset:])
+            parser.close()
+        except _StopParsing:
+            pass
+        if parser.found:
+            return parser.value
+    return None
+# endregion
+
+
+# region Бэкенд lxml
+def _lxml_tree(html):
+    """Строит дерево lxml (None для пустой страницы)."""
+    if not html.strip():
+        return None
+    return lxml.html.fromstring(html)
+
+
+def _lxml_hrefs(html, xpath):
+    """Возвращает href ссылок, найденных XPath-выражением."""
+    tree = _lxml_tree(html)
+    return tree.xpath(xpath) if tree is not None else []
+
+
+def _lxml_review_text(html):
+    """Извлекает текст отзыва через XPath."""
+    tree = _lxml_tree(html)
+    if tree is None:
+        return None
+    elements = tree.xpath(f'//span[@class="{REVIEW_SPAN_CLASS}"]')
+    if not elements:
+        return None
+    return ''.join(part.strip() for part in elements[0].itertext())
+
+
+def _lxml_temperature(html):
+    """Извлекает температуру через XPath."""
+    tree = _lxml_tree(html)
+    if tree is None:
+        return None
+    values = tree.xpath(f'//div[contains(concat(" ", normalize-space(@class), " "), " {WEATHER_DIV_CLASS} ")]'
+                        f'//{TEMPERATURE_TAG}/@value')
+    return values[0] if values else None
+# endregion
+
+
+# region Выбор бэкенда
+def resolve_backend(backend):
+    """Возвращает имя доступного бэкенда (lxml без установленного пакета заменяется на bs4)."""
+    if backend not in ('bs4', 'lxml', 'stream'):
+        raise ValueError(f"Неизвестный бэкенд извлечения: {backend}")
+    if backend == 'lxml' and lxml is None:
+        return 'bs4'
+    return backend
+# endregion
+
+
+# region Функции извлечения
+def extract_category_links(html, backend=DEFAULT_BACKEND):
+    """Возвращает относительные ссылки на категории с главной страницы."""
+    backend = resolve_backend(backend)
+    if backend == 'stream':
+        return _stream_links(html, lambda attrs: attrs['href'].startswith(CATEGORY_PREFIX))
+    if backend == 'lxml':
+        return _lxml_hrefs(html, f'//a[starts-with(@href, "{CATEGORY_PREFIX}")]/@href')
+    soup = BeautifulSoup(html, 'html.parser')
+    return [link['href'] for link in soup.find_all('a', href=True) if link['href'].startswith(CATEGORY_PREFIX)]
+
+
+def extract_object_links(html, backend=DEFAULT_BACKEND):
+    """Возвращает относительные ссылки на объекты (ссылки с атрибутом title) со страницы категории."""
+    backend = resolve_backend(backend)
+    if backend == 'stream':
+        return _stream_links(html, lambda attrs: 'title' in attrs)
+    if backend == 'lxml':
+        return _lxml_hrefs(html, '//a[@href and @title]/@href')
+    soup = BeautifulSoup(html, 'html.parser')
+    return [link['href'] for link in soup.find_all('a', href=True, title=True)]
+
+
+def extract_review_links(html, backend=DEFAULT_BACKEND):
+    """Возвращает относительные ссылки на отзывы со страницы объекта."""
+    backend = resolve_backend(backend)
+    if backend == 'stream':
+        return _stream_links(html, lambda attrs: REVIEW_LINK_CLASS in (attrs.get('class') or '').split())
+    if backend == 'lxml':
+        return _lxml_hrefs(
+            html, f'//a[@href and contains(concat(" ", normalize-space(@class), " "), " {REVIEW_LINK_CLASS} ")]/@href')
+    soup = BeautifulSoup(html, 'html.parser')
+    return [link['href'] for link in soup.find_all('a', href=True, class_=REVIEW_LINK_CLASS)]
+
+
+def extract_review_text(html, backend=DEFAULT_BACKEND):
+    """Возвращает текст отзыва (склеенные фрагменты без крайних пробелов) или None, если элемент не найден."""
+    backend = resolve_backend(backend)
+    if backend == 'stream':
+        return _stream_review_text(html)
+    if backend == 'lxml':
+        return _lxml_review_text(html)
+    soup = BeautifulSoup(html, 'html.parser')
+    element = soup.find('span', class_=REVIEW_SPAN_CLASS)
+    return element.get_text(strip=True) if element else None
+
+
+def extract_temperature(html, backend=DEFAULT_BACKEND):
+    """Возвращает значение атрибута value первого <temperature-value> в <div class="weather-value"> или None."""
+    backend = resolve_backend(backend)
+    if backend == 'stream':
+        return _stream_temperature(html)
+    if backend == 'lxml':
+        return _lxml_temperature(html)
+    soup = BeautifulSoup(html, 'html.parser')
+    block = soup.find('div', class_=WEATHER_DIV_CLASS)
+    element = block.find(TEMPERATURE_TAG) if block else None
+    return element.get('value') if element else None
+# endregion
@@ -0,0 +1,210 @@
+# http_cache.py
+"""
+Дисковый кэш HTTP-ответов парсера (ResponseCache).
+
+Ответы сохраняются при обходе (main.fetch) и перепроверяются условными запросами
+(If-None-Match / If-Modified-Since): при ответе 304 страница берётся с диска. В
+режиме --replay весь конвейер работает только по кэшу, без сети.
+
+Каталог кэша (HTTP_CACHE_DIR в main.py):
+- objects/<2 символа>/<SHA-256> - тела ответов, сжатые zlib; имя файла - дайджест
+  несжатого тела, поэтому одинаковые страницы хранятся один раз;
+- index.db - индекс SQLite (режим WAL, общий для процессов-воркеров):
+  responses - URL -> дайджест тела, ETag, Last-Modified, время загрузки и
+  последнего обращения; blobs - дайджест -> размер сжатого файла; cache_meta -
+  суммарный размер тел (total_size), обновляемый триггерами на blobs.
+
+Тело удаляется, когда на него не остаётся ссылок (страница изменилась или URL
+вытеснен). Когда суммарный размер превышает CACHE_MAX_BYTES, вытесняются URL, к
+которым дольше всего не обращались, пока размер не опустится до
+CACHE_EVICT_RATIO от лимита.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import aiohttp
+
+# region Константы
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'http_cache')  # Каталог кэша HTTP-ответов.
+CACHE_MAX_BYTES = 2 * 1024 ** 3  # Максимальный размер сжатых тел в кэше (байт).
+CACHE_EVICT_RATIO = 0.9  # До какой доли от CACHE_MAX_BYTES очищается кэш при переполнении.
+COMPRESSION_LEVEL = 6  # Уровень сжатия zlib.
+BUSY_TIMEOUT = 30.0  # Сколько ждать, пока индекс кэша пишет другой процесс-воркер (секунд).
+ACCESS_FLUSH_EVERY = 100  # Сколько обращений к кэшу копить перед записью времени последнего обращения.
+# endregion
+
+
+class CacheMissError(aiohttp.ClientError):
+    """Страницы нет в кэше, а сеть недоступна (режим --replay)."""
+
+
+class ResponseCache:
+    """
+    Контентно-адресуемое хранилище HTTP-ответов на диске.
+
+    Тела страниц сжимаются zlib и хранятся в файлах, имя которых - SHA-256 содержимого,
+    поэтому одинаковые страницы занимают место один раз. Индекс (URL -> дайджест, ETag,
+    Last-Modified, время последнего обращения) хранится в SQLite. При превышении
+    max_bytes удаляются записи, к которым дольше всего не обращались.
+
+    Суммарный размер тел хранится в строке cache_meta и обновляется триггерами на
+    blobs (индекс общий для процессов-воркеров), поэтому проверка лимита после
+    сохранения не пересчитывает размер всего кэша. Время последнего обращения при
+    чтении копится в памяти и записывается пачками по ACCESS_FLUSH_EVERY.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()  # Кэш используется из потоков asyncio.to_thread.
+        self._accessed = {}  # URL -> время обращения, ещё не записанное в индекс.
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), timeout=BUSY_TIMEOUT,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                last_access REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);
+            CREATE INDEX IF NOT EXISTS idx_responses_digest ON responses (digest);
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO cache_meta (key, value)
+                SELECT 'total_size', COALESCE(SUM(size), 0) FROM blobs;
+            CREATE TRIGGER IF NOT EXISTS trg_blobs_size_insert AFTER INSERT ON blobs BEGIN
+                UPDATE cache_meta SET value = value + NEW.size WHERE key = 'total_size';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_blobs_size_delete AFTER DELETE ON blobs BEGIN
+                UPDATE cache_meta SET value = value - OLD.size WHERE key = 'total_size';
+            END;
+        ''')
+        self._conn.commit()
+
+    def _blob_path(self, digest):
+        """Путь к файлу со сжатым телом ответа."""
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest)
+
+    def lookup(self, url):
+        """Возвращает метаданные закэшированного ответа (словарь) или None."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT digest, etag, last_modified, fetched_at FROM responses WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        return {'url': url, 'digest': row[0], 'etag': row[1], 'last_modified': row[2], 'fetched_at': row[3]}
+
+    def read(self, entry):
+        """Читает и распаковывает тело ответа, запоминая время обращения (записывается пачкой)."""
+        with open(self._blob_path(entry['digest']), 'rb') as f:
+            text = zlib.decompress(f.read()).decode('utf-8')
+        with self._lock:
+            self._accessed[entry['url']] = time.time()
+            if len(self._accessed) >= ACCESS_FLUSH_EVERY:
+                self._flush_access()
+        return text
+
+    def _flush_access(self):
+        """Записывает накопленные времена обращений одной транзакцией (вызывать под self._lock)."""
+        if not self._accessed:
+            return
+        self._conn.executemany('UPDATE responses SET last_access = ? WHERE url = ?',
+                               [(accessed, url) for url, accessed in self._accessed.items()])
+        self._conn.commit()
+        self._accessed.clear()
+
+    def store(self, url, text, etag=None, last_modified=None):
+        """Сохраняет тело ответа и его валидаторы (ETag/Last-Modified)."""
+        body = text.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):  # Одинаковые тела хранятся один раз.
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = zlib.compress(body, COMPRESSION_LEVEL)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'  # Уникален для процесса и потока.
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)  # Атомарно: читатель не увидит недописанный файл.
+            size = len(compressed)
+        else:
+            size = None
+        now = time.time()
+        with self._lock:
+            self._accessed.pop(url, None)  # Время обращения задаётся ниже.
+            previous = self._conn.execute('SELECT digest FROM responses WHERE url = ?', (url,)).fetchone()
+            if size is not None:
+                # Тело с тем же дайджестом имеет тот же размер; REPLACE не вызвал бы триггер удаления.
+                self._conn.execute('INSERT OR IGNORE INTO blobs (digest, size) VALUES (?, ?)', (digest, size))
+            self._conn.execute('''
+                INSERT OR REPLACE INTO responses (url, digest, etag, last_modified, fetched_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (url, digest, etag, last_modified, now, now))
+            if previous is not None and previous[0] != digest:  # Страница изменилась - прежнее тело могло осиротеть.
+                self._release_blob(previous[0])
+            self._conn.commit()
+        if size is not None:
+            self.evict()
+
+    def _release_blob(self, digest):
+        """
+        Удаляет тело, на которое больше не ссылается ни один URL (вызывать под self._lock).
+
+        Returns:
+            Сколько байт освобождено (0 - тело ещё используется).
+        """
+        if self._conn.execute('SELECT 1 FROM responses WHERE digest = ? LIMIT 1', (digest,)).fetchone():
+            return 0
+        size = self._conn.execute('SELECT size FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        self._conn.execute('DELETE FROM blobs WHERE digest = ?', (digest,))  # Триггер уменьшает размер.
+        try:
+            os.remove(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+        return size[0] if size else 0
+
+    def total_size(self):
+        """Суммарный размер сжатых тел в кэше (байт)."""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM cache_meta WHERE key = 'total_size'").fetchone()[0]
+
+    def evict(self):
+        """Удаляет давно не использованные ответы, пока размер кэша не станет меньше лимита."""
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * CACHE_EVICT_RATIO
+        with self._lock:
+            # Сначала тела без ссылок (например, оставшиеся от прежних версий страниц в старых кэшах).
+            orphans = self._conn.execute(
+                'SELECT digest FROM blobs WHERE digest NOT IN (SELECT digest FROM responses)').fetchall()
+            for (digest,) in orphans:
+                total -= self._release_blob(digest)
+            self._flush_access()  # Порядок вытеснения - по актуальным временам обращений.
+            rows = self._conn.execute('SELECT url, digest FROM responses ORDER BY last_access').fetchall()
+            for url, digest in rows:
+                if total <= target:
+                    break
+                self._conn.execute('DELETE FROM responses WHERE url = ?', (url,))
+                total -= self._release_blob(digest)  # Тело, используемое другим URL, остаётся.
+            self._conn.commit()
+
+    def close(self):
+        """Записывает накопленные времена обращений и закрывает индекс кэша."""
+        with self._lock:
+            self._flush_access()
+            self._conn.close()
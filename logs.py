@@ -0,0 +1,90 @@
+# logs.py
+"""
+Журнал парсера: уровни, цвета и ограничение частоты сообщений.
+
+Сообщения выводятся через стандартный logging. Цвет зависит от уровня (как в прежних
+print): ошибки и предупреждения - красным, успешные операции (уровень SUCCESS) - зелёным,
+ход работы (INFO) - синим. Сообщения об отдельных отзывах пишутся на уровне DEBUG и по
+умолчанию не выводятся.
+
+Одинаковые по шаблону сообщения (например, ошибки загрузки разных страниц) выводятся
+не чаще RATE_LIMIT_BURST раз за RATE_LIMIT_INTERVAL секунд; количество пропущенных
+сообщений добавляется к следующему выведенному.
+"""
+import logging
+import sys
+import threading
+import time
+
+# region Константы
+SUCCESS = 25  # Уровень успешных операций (между INFO и WARNING).
+LOG_LEVEL = 'INFO'  # Уровень журнала по умолчанию.
+LOG_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+RATE_LIMIT_INTERVAL = 10.0  # Окно ограничения частоты одинаковых сообщений (секунд).
+RATE_LIMIT_BURST = 20  # Сколько одинаковых сообщений выводится за окно.
+
+# ANSI escape-коды для цветного вывода.
+RED = "\033[91m"
+GREEN = "\033[92m"
+BLUE = "\033[94m"
+RESET = "\033[0m"
+# endregion
+
+logging.addLevelName(SUCCESS, 'SUCCESS')
+
+
+class RateLimitFilter(logging.Filter):
+    """Пропускает не больше burst сообщений с одним шаблоном за interval секунд."""
+
+    def __init__(self, interval=RATE_LIMIT_INTERVAL, burst=RATE_LIMIT_BURST):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._windows = {}  # (логгер, шаблон) -> [начало окна, выведено, пропущено].
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                window = self._windows[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+            suppressed += window[2]
+            window[2] = 0
+        if suppressed:
+            record.msg = f"{record.msg} (пропущено похожих сообщений: {suppressed})"
+        return True
+
+
+class ColorFormatter(logging.Formatter):
+    """Окрашивает сообщение в зависимости от уровня."""
+
+    COLORS = {logging.INFO: BLUE, SUCCESS: GREEN, logging.WARNING: RED, logging.ERROR: RED, logging.CRITICAL: RED}
+
+    def format(self, record):
+        color = self.COLORS.get(record.levelno)
+        text = super().format(record)
+        return f"{color}{text}{RESET}" if color else text
+
+
+def setup_logging(level=LOG_LEVEL, interval=RATE_LIMIT_INTERVAL, burst=RATE_LIMIT_BURST):
+    """Настраивает корневой журнал: вывод в stderr с цветами и ограничением частоты (повторный вызов безопасен)."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if getattr(handler, '_reviews_handler', False):
+            root.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stderr)
+    handler._reviews_handler = True
+    handler.setFormatter(ColorFormatter(LOG_FORMAT, datefmt='%H:%M:%S'))
+    handler.addFilter(RateLimitFilter(interval, burst))
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
@@ -1,25 +1,78 @@
+import argparse
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
+import hashlib
+import logging
 import os
-import re
 import sqlite3
-import pandas as pd
+import subprocess
+import sys
+import time
 from datetime import datetime
 
+import extractors
+from concurrent.futures import ProcessPoolExecutor
+from db_writer import BUSY_TIMEOUT, ReviewWriter
+from http_cache import CacheMissError, ResponseCache
+from logs import SUCCESS, setup_logging
+from mat_matcher import MatMatcher
+from metrics import METRICS, report_periodically, start_server
+from near_duplicates import COMMIT_EVERY, NearDuplicateIndex
+from rate_control import (INITIAL_CONCURRENCY, MAX_CONCURRENCY, MAX_RETRIES, REQUESTS_PER_SECOND, RETRY_STATUSES,
+                          RequestController)
+from reclassify import migrate_mat_version
+from reviews_file import ReviewsFileWriter, load_digests
+from search_index import create_search_index
+from summary_tables import create_summary_tables
+from text_codec import ensure_dictionary, get_codec, register
+from work_queue import MAX_ATTEMPTS, WorkQueue
+
 #region Константы и настройки
-MAX_CONCURRENCY = 5  # Максимальное количество одновременных запросов.
+# Частота и параллельность запросов и количество повторов (REQUESTS_PER_SECOND, INITIAL_CONCURRENCY,
+# MAX_CONCURRENCY, MAX_RETRIES) задаются в rate_control.py и импортируются выше.
+REQUEST_TIMEOUT = 60.0  # Общий таймаут одного запроса (секунд).
+CONNECT_TIMEOUT = 10.0  # Таймаут установки соединения (секунд).
+DNS_CACHE_TTL = 300  # Сколько хранить результат DNS-запроса (секунд).
+KEEPALIVE_TIMEOUT = 30.0  # Сколько держать неиспользуемое соединение открытым (секунд).
+OBJECT_WORKERS = 4  # Количество воркеров, обходящих страницы отзывов объектов.
+REVIEW_WORKERS = 10  # Количество воркеров, скачивающих отдельные отзывы.
+OBJECT_QUEUE_SIZE = 8  # Размер очереди объектов, ожидающих обхода.
+REVIEW_QUEUE_SIZE = 100  # Размер очереди URL отзывов, ожидающих скачивания.
+PAGES_AHEAD = 4  # Сколько страниц отзывов одного объекта может ждать сохранения одновременно.
+INCREMENTAL_BUFFER = 1000  # Сколько новых отзывов объекта копить до записи при инкрементальном обходе.
 BASE_URL = "https://vseotzyvy.ru"  # Базовый URL сайта.
-REVIEWS_FILE = 'reviews.txt'  # Файл для сохранения отзывов (текстовый).
+REVIEWS_FILE = 'reviews.txt'  # Файл для сохранения отзывов (текстовый; рядом хранится индекс reviews.txt.idx).
+REVIEWS_FSYNC_POLICY = 'interval'  # fsync текстового файла: 'never', 'batch' (каждая пачка) или 'interval'.
 MAT_WORDS_FILE = 'mat_words.txt'  # Файл со списком ненормативных слов.
-PROGRESS_FILE = 'progress.txt'  # Файл для сохранения прогресса парсинга.
+PROGRESS_FILE = 'progress.txt'  # Прогресс парсинга старых версий (переносится в контрольные точки в БД).
 DB_FILE = os.path.join(os.path.dirname(__file__), 'reviews.db')  # *Абсолютный* путь к файлу БД SQLite.
+USE_HTTP_CACHE = True  # Сохранять ответы в дисковый кэш и перепроверять их условными запросами.
+HTTP_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'http_cache')  # Каталог дискового кэша HTTP-ответов.
+DB_BATCH_SIZE = 500  # Сколько отзывов записывать в БД одной транзакцией.
+DB_FLUSH_INTERVAL = 2.0  # Максимальная задержка записи отзывов в БД (секунд).
+DB_MAX_PENDING = 5000  # Сколько отзывов может ждать записи в БД, прежде чем обход приостановится.
+COMPRESS_TEXTS = False  # Хранить тексты отзывов в БД сжатыми общим словарём (см. text_codec.py).
+WORK_POLL_INTERVAL = 1.0  # Как часто воркер проверяет очередь, если свободной работы нет (секунд).
+
+PARSER_BACKEND = 'stream'  # Бэкенд извлечения данных из HTML: 'bs4', 'lxml' или 'stream' (см. extractors.py).
+PARSE_WORKERS = os.cpu_count() or 1  # Количество процессов для разбора HTML (0 - разбирать в цикле событий).
+DETECT_NEAR_DUPLICATES = True  # Пропускать почти-дубликаты уже сохранённых отзывов (см. near_duplicates.py).
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Порог сходства Жаккара для почти-дубликатов.
+NEAR_DUPLICATE_COMMIT_INTERVAL = 1.0  # Воркер фиксирует добавления в общий LSH-индекс не реже (секунд).
+LOG_LEVEL = 'INFO'  # Уровень журнала: 'DEBUG' - в том числе каждый отзыв и объект, 'WARNING' - только ошибки.
+METRICS_PORT = 9108  # Порт HTTP-сервера метрик (/metrics, /metrics.json); None - не запускать.
+METRICS_FILE = None  # Файл для периодических JSON-снимков метрик (None - не писать).
+METRICS_INTERVAL = 10.0  # Интервал снимков метрик и строки с темпом обработки в журнале (секунд).
 
-# ANSI escape-коды для цветного вывода.
-RED = "\033[91m"
-GREEN = "\033[92m"
-BLUE = "\033[94m"
-RESET = "\033[0m"
+RESPONSE_CACHE = None  # Дисковый кэш HTTP-ответов (создаётся в main()).
+REQUEST_CONTROLLER = None  # Ограничение частоты и параллельности запросов, повторы (создаётся в main()).
+PARSE_POOL = None  # Пул процессов для разбора HTML (создаётся в main()).
+NEAR_DUPLICATES = None  # LSH-индекс почти-дубликатов (создаётся в main()).
+REVIEW_WRITER = None  # Поток пакетной записи отзывов в БД (создаётся в main()).
+WORK_QUEUE = None  # Общая очередь работы в режиме воркера (создаётся в main(worker=True)).
+REPLAY_MODE = False  # Режим --replay: страницы берутся только из кэша, без обращения к сети.
+
+log = logging.getLogger(__name__)  # Журнал парсера (настройка и цвета - в logs.py).
 #endregion
 
 #region Вспомогательные функции
@@ -29,155 +82,262 @@ def clean_text(text):
     cleaned_lines = [line for line in lines if line.strip()]  # Убираем пустые строки.
     return '\n'.join(cleaned_lines)
 
+def text_digest(text):
+    """Возвращает 16-байтовый дайджест нормализованного текста (регистр и пробелы не учитываются)."""
+    normalized = ' '.join(text.lower().split())
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+def url_digest(url):
+    """Возвращает 8-байтовый дайджест URL (для хранения множества известных URL в памяти)."""
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+
 def contains_mat(text, mat_words):
-    """Проверяет наличие ненормативной лексики в тексте."""
-    text_lower = re.sub(r'[^\w\s]', '', text.lower())  # Приводим к нижнему регистру, убираем пунктуацию.
-    return next((word for word in text_lower.split() if word in mat_words), None)  # Ищем первое совпадение.
+    """Проверяет наличие ненормативной лексики в тексте (mat_words - скомпилированный MatMatcher)."""
+    return mat_words.first(text)  # Первое найденное слово или None.
 
 async def fetch(session, url):
-    """Асинхронно скачивает страницу по URL."""
-    async with session.get(url) as response:
-        response.raise_for_status()  # Проверяем HTTP-статус (если не 200 OK, будет исключение).
-        return await response.text()  # Возвращаем текст страницы.
+    """
+    Асинхронно скачивает страницу по URL.
+
+    Запрос выполняется через REQUEST_CONTROLLER: с ограничением частоты и количества
+    одновременных запросов и с повторами после временных ошибок. Если повторы не
+    помогли, выбрасывается aiohttp.ClientError или asyncio.TimeoutError.
+
+    Если включён дисковый кэш, закэшированная страница перепроверяется условным запросом
+    (If-None-Match / If-Modified-Since) и при ответе 304 берётся с диска. В режиме --replay
+    страница берётся только из кэша; при промахе выбрасывается CacheMissError.
+    """
+    entry = None
+    if RESPONSE_CACHE is not None:
+        entry = await asyncio.to_thread(RESPONSE_CACHE.lookup, url)
+        if REPLAY_MODE:
+            if entry is None:
+                raise CacheMissError(f"Нет в кэше: {url}")
+            METRICS.inc('cache_hits_total')
+            return await asyncio.to_thread(RESPONSE_CACHE.read, entry)
+    with METRICS.timer('fetch_seconds'):  # С ожиданием слота и повторами.
+        return await _fetch_network(session, url, entry)
+
+async def _fetch_network(session, url, entry):
+    """Скачивает страницу из сети (условным запросом, если есть закэшированная версия)."""
+    headers = {}
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+    status, text, response_headers = await REQUEST_CONTROLLER.get(session, url, headers)
+    if status == 304 and entry is not None:  # Страница не изменилась - читаем с диска.
+        METRICS.inc('cache_hits_total')
+        return await asyncio.to_thread(RESPONSE_CACHE.read, entry)
+    if RESPONSE_CACHE is not None:
+        await asyncio.to_thread(RESPONSE_CACHE.store, url, text,
+                                response_headers.get('ETag'), response_headers.get('Last-Modified'))
+    return text
+
+async def fetch_listing(session, url):
+    """
+    Скачивает страницу списка (категории или объекта); None - страницы нет (404).
+
+    Другие ошибки загрузки не означают конец списка и передаются вызывающему коду.
+    """
+    try:
+        return await fetch(session, url)
+    except aiohttp.ClientResponseError as e:
+        if e.status == 404:
+            return None
+        raise
+
+async def parse_html(extract, html):
+    """Выполняет функцию извлечения из extractors.py в пуле процессов, не блокируя цикл событий."""
+    with METRICS.timer('parse_seconds', extractor=extract.__name__):  # С ожиданием свободного процесса.
+        if PARSE_POOL is None:
+            return extract(html, PARSER_BACKEND)
+        return await asyncio.get_running_loop().run_in_executor(PARSE_POOL, extract, html, PARSER_BACKEND)
 #endregion
 
 #region Функции для работы с категориями и объектами
 async def get_categories(session):
     """Получает список URL категорий с главной страницы сайта."""
     html = await fetch(session, BASE_URL)  # Скачиваем главную страницу.
-    soup = BeautifulSoup(html, 'html.parser')  # Парсим HTML.
-    categories = []
-    for link in soup.find_all('a', href=True):  # Находим все ссылки.
-        if link['href'].startswith('/category/'):  # Если ссылка ведет на категорию.
-            categories.append(BASE_URL + link['href'])  # Добавляем полный URL категории в список.
-    return categories
+    hrefs = await parse_html(extractors.extract_category_links, html)  # Ссылки, ведущие на категории.
+    return [BASE_URL + href for href in hrefs]  # Полные URL категорий.
 
 async def fetch_objects_page(session, category_url, page_number, seen_urls):
-    """Получает URL объектов (товаров/услуг) с одной страницы категории."""
+    """
+    Получает URL объектов (товаров/услуг) с одной страницы категории.
+
+    Ошибка загрузки (после всех повторов) выбрасывается: она не означает, что объекты закончились.
+    """
     url = f"{category_url}?page={page_number}"  # Формируем URL страницы категории.
-    try:
-        html = await fetch(session, url)  # Скачиваем страницу.
-    except aiohttp.ClientError as e:
-        print(f"{RED}Ошибка загрузки: {url}: {e}{RESET}")  # Выводим сообщение об ошибке.
-        return []  # Возвращаем пустой список, если не удалось скачать страницу.
+    html = await fetch_listing(session, url)  # Скачиваем страницу.
+    if html is None:  # Страницы нет - объекты закончились.
+        return []
 
-    soup = BeautifulSoup(html, 'html.parser')  # Парсим HTML.
     new_urls = []
-    for link in soup.find_all('a', href=True, title=True):  # Находим все ссылки с атрибутом title.
-        obj_url = BASE_URL + link['href']  # Формируем полный URL объекта.
+    for href in await parse_html(extractors.extract_object_links, html):  # Все ссылки с атрибутом title.
+        obj_url = BASE_URL + href  # Формируем полный URL объекта.
         if obj_url not in seen_urls:  # Если URL объекта еще не встречался.
             seen_urls.add(obj_url)  # Добавляем URL в множество просмотренных.
             new_urls.append(obj_url)  # Добавляем URL в список.
     return new_urls
 
-async def get_target_object_url(session, category_url, target_index):
-    """Получает URL целевого объекта по его индексу в категории."""
-    seen_urls = set()  # Множество для хранения уже просмотренных URL объектов.
-    page_number = (target_index // 15) + 1  # Вычисляем номер страницы (15 объектов на странице).
-    obj_position = target_index % 15  # Вычисляем позицию объекта на странице.
-    objects_fetched = (page_number - 1) * 15  # Количество объектов, просмотренных на предыдущих страницах.
+async def iter_category_objects(session, category_url, start_index=0):
+    """
+    Асинхронный итератор по объектам категории: один проход по страницам `?page=N`.
 
-    while True:
-        object_urls = await fetch_objects_page(session, category_url, page_number, seen_urls)  # Получаем URL объектов с текущей страницы.
-        if not object_urls:  # Если объектов на странице нет (или ошибка загрузки).
-            break  # Выходим из цикла.
-        if objects_fetched + len(object_urls) > target_index:  # Если целевой объект на текущей странице.
-            return object_urls[obj_position], page_number, obj_position  # Возвращаем URL, номер страницы и позицию.
-        objects_fetched += len(object_urls)  # Увеличиваем счетчик просмотренных объектов.
-        page_number += 1  # Переходим к следующей странице.
-    return None, page_number  # Возвращаем None, если объект не найден.
+    Каждая страница категории скачивается и парсится один раз, следующая страница
+    скачивается в фоне, пока обрабатываются объекты текущей. Размер страницы не
+    фиксирован: он определяется по первой странице и используется только для того,
+    чтобы при возобновлении сразу перейти к нужной странице.
+
+    Yields:
+        Кортеж (индекс объекта в категории, URL объекта, номер страницы, позиция на странице).
+    """
+    seen_urls = set()  # Множество уже просмотренных URL объектов (общее для всех страниц).
+    page_number = 1
+    object_urls = await fetch_objects_page(session, category_url, page_number, seen_urls)
+    objects_fetched = 0  # Количество объектов на предыдущих страницах.
+    if object_urls and start_index >= len(object_urls):  # Возобновление: пропускаем страницы целиком.
+        page_size = len(object_urls)
+        page_number = start_index // page_size + 1
+        objects_fetched = (page_number - 1) * page_size
+        object_urls = await fetch_objects_page(session, category_url, page_number, seen_urls)
+
+    next_page = None
+    try:
+        while object_urls:  # Пока на странице есть объекты (пустая страница - конец категории).
+            next_page = asyncio.create_task(  # Скачиваем следующую страницу в фоне.
+                fetch_objects_page(session, category_url, page_number + 1, seen_urls))
+            for position, object_url in enumerate(object_urls):
+                object_index = objects_fetched + position
+                if object_index >= start_index:
+                    yield object_index, object_url, page_number, position
+            objects_fetched += len(object_urls)
+            page_number += 1
+            object_urls = await next_page
+            next_page = None
+    finally:
+        if next_page is not None:  # Итератор закрыт досрочно - отменяем фоновую загрузку.
+            next_page.cancel()
 #endregion
 
 #region Функции для работы с отзывами
 async def get_reviews_urls(session, object_url, page):
-    """Получает URL отзывов с одной страницы объекта."""
+    """
+    Получает URL отзывов с одной страницы объекта.
+
+    Ошибка загрузки (после всех повторов) выбрасывается: она не означает, что отзывы закончились.
+    """
     url = f"{object_url}?page={page}"  # Формируем URL страницы отзывов.
-    try:
-        html = await fetch(session, url)  # Скачиваем страницу.
-    except aiohttp.ClientError as e:
-        print(f"{RED}Ошибка загрузки: {url}: {e}{RESET}")  # Выводим сообщение об ошибке.
-        return []  # Возвращаем пустой список.
+    html = await fetch_listing(session, url)  # Скачиваем страницу.
+    if html is None:  # Страницы нет - отзывы закончились.
+        return []
+
+    hrefs = await parse_html(extractors.extract_review_links, html)  # Ссылки с классом r_space.
+    return [BASE_URL + href for href in hrefs]  # Возвращаем список URL отзывов.
 
-    soup = BeautifulSoup(html, 'html.parser')  # Парсим HTML.
-    return [BASE_URL + link['href'] for link in soup.find_all('a', href=True, class_='r_space')]  # Возвращаем список URL отзывов.
+async def process_review(session, review_url, mat_words, dedup, category, object_url):
+    """
+    Обрабатывает один отзыв: скачивает и проверяет.
 
-async def process_review(session, review_url, mat_words, lock, processed_reviews, file_queue, category, object_url):
-    """Обрабатывает один отзыв: скачивает, проверяет, добавляет в очереди."""
+    dedup - индекс дедупликации из load_dedup_index(): дайджесты известных URL и текстов.
+    Временная ошибка загрузки (после всех повторов) выбрасывается, чтобы отзыв не был потерян.
+    """
     try:
         review_html = await fetch(session, review_url)  # Скачиваем страницу отзыва.
-    except aiohttp.ClientError as e:
-        print(f"{RED}Ошибка загрузки: {review_url}: {e}{RESET}")  # Выводим сообщение об ошибке.
+    except aiohttp.ClientResponseError as e:
+        if e.status in RETRY_STATUSES:  # Сайт перегружен - страница будет обойдена заново.
+            raise
+        log.warning("Ошибка загрузки: %s: %s", review_url, e)  # Отзыва нет (например, 404) - пропускаем.
+        METRICS.inc('reviews_processed_total', result='missing')
         return None  # Возвращаем None, если не удалось скачать страницу.
 
-    review_soup = BeautifulSoup(review_html, 'html.parser')  # Парсим HTML.
-    review_text_element = review_soup.find('span', class_='description line-height-comfort')  # Ищем элемент с текстом отзыва.
+    review_text = await parse_html(extractors.extract_review_text, review_html)  # Ищем текст отзыва.
 
-    if review_text_element:  # Если элемент с текстом отзыва найден.
-        cleaned_text = clean_text(review_text_element.get_text(strip=True))  # Извлекаем и очищаем текст отзыва.
-        async with lock:  # Блокируем доступ к `processed_reviews` (чтобы избежать состояния гонки).
-            if cleaned_text in processed_reviews:  # Если отзыв уже был обработан.
-                message = f"{RED}Ошибка: Отзыв уже есть. Ссылка: {review_url}{RESET}"
-                print(message)
-                return None  # Возвращаем None.
+    if review_text is not None:  # Если элемент с текстом отзыва найден.
+        cleaned_text = clean_text(review_text)  # Очищаем текст отзыва.
+        digest = text_digest(cleaned_text)
+        # Проверка и добавление выполняются без await между ними, поэтому блокировка не нужна.
+        if digest in dedup['texts']:  # Если отзыв уже был обработан.
+            log.debug("Отзыв уже есть. Ссылка: %s", review_url)
+            METRICS.inc('reviews_processed_total', result='duplicate')
+            return None  # Возвращаем None.
+        dedup['texts'].add(digest)  # Добавляем дайджест текста в множество обработанных.
+        if NEAR_DUPLICATES is not None:  # Ищем похожий отзыв в LSH-индексе (SQLite и numpy - вне цикла событий).
+            match = await asyncio.to_thread(NEAR_DUPLICATES.find_or_add, digest, cleaned_text)
+            if match:
+                log.debug("Почти-дубликат (сходство %.2f). Ссылка: %s", match[1], review_url)
+                METRICS.inc('reviews_processed_total', result='near_duplicate')
+                return None
+        with METRICS.timer('mat_check_seconds'):
             mat_word = contains_mat(cleaned_text, mat_words)  # Проверяем наличие ненормативной лексики.
-            if mat_word:  # Если найден мат.
-                message = f"{RED}Ошибка: Найден мат: {mat_word}. Ссылка: {review_url}{RESET}"
-                print(message)
-                has_mat = True  # Устанавливаем флаг наличия мата.
-            else:  # Если мат не найден.
-                message = f"{GREEN}Отзыв добавлен: {len(cleaned_text)} симв., ссылка: {review_url}{RESET}"
-                print(message)
-                has_mat = False  # Устанавливаем флаг отсутствия мата.
-            processed_reviews.add(cleaned_text)  # Добавляем текст отзыва в множество обработанных.
-            await file_queue.put((cleaned_text, review_url))  # Добавляем текст и URL в очередь для записи в файл.
-
-            # Возвращаем словарь с данными отзыва.
-            return {
-                'length': len(cleaned_text),
-                'category': category,
-                'object_url': object_url,
-                'review_url': review_url,
-                'text': cleaned_text,
-                'has_mat': has_mat,
-                'date_scraped': datetime.now()  # Добавляем текущую дату и время.
-            }
+        if mat_word:  # Если найден мат.
+            log.debug("Найден мат: %s. Ссылка: %s", mat_word, review_url)
+            METRICS.inc('reviews_processed_total', result='mat')
+            has_mat = True  # Устанавливаем флаг наличия мата.
+        else:  # Если мат не найден.
+            log.debug("Отзыв добавлен: %d симв., ссылка: %s", len(cleaned_text), review_url)
+            METRICS.inc('reviews_processed_total', result='added')
+            has_mat = False  # Устанавливаем флаг отсутствия мата.
+
+        # Возвращаем словарь с данными отзыва.
+        return {
+            'length': len(cleaned_text),
+            'category': category,
+            'object_url': object_url,
+            'review_url': review_url,
+            'text': cleaned_text,
+            'text_digest': digest,
+            'has_mat': has_mat,
+            'mat_version': mat_words.version,  # Версия списка слов: reclassify.py пропустит строку.
+            'date_scraped': datetime.now()  # Добавляем текущую дату и время.
+        }
     else:  # Если элемент с текстом отзыва не найден.
-        message = f"{RED}Ошибка: Отзыв не найден. Ссылка: {review_url}{RESET}"
-        print(message)
+        log.warning("Текст отзыва не найден. Ссылка: %s", review_url)
+        METRICS.inc('reviews_processed_total', result='not_found')
         return None  # Возвращаем None.
 #endregion
 
 #region Функции для сохранения и загрузки данных
-async def save_to_file(file_queue, file_lock):
-    """Асинхронно записывает отзывы в текстовый файл."""
-    while True:
-        cleaned_text, _ = await file_queue.get()  # Получаем текст отзыва и URL из очереди (URL не используется).
-        async with file_lock:  # Блокируем доступ к файлу (чтобы избежать одновременной записи из разных задач).
-            try:
-                with open(REVIEWS_FILE, 'a', encoding='utf-8') as f:  # Открываем файл для добавления текста.
-                    f.write(f"Source Text: \nRephrased Text: {cleaned_text}\nLength: {len(cleaned_text)}\n\n")  # Записываем отзыв.
-            except Exception as e:
-                print(f"{RED}Ошибка записи в файл: {e}{RESET}")  # Выводим сообщение об ошибке.
-        file_queue.task_done()  # Сообщаем очереди, что задача выполнена.
-
 def reload_from_disk(file_path):
-    """Загружает множество уже обработанных отзывов из текстового файла."""
-    if os.path.exists(file_path):  # Если файл существует.
-        reviews = set()  # Создаем пустое множество для хранения отзывов.
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:  # Открываем файл для чтения.
-                for line in f:  # Читаем файл построчно.
-                    if line.startswith("Rephrased Text:"):  # Если строка начинается с "Rephrased Text:".
-                        reviews.add(line.split(":", 1)[1].strip())  # Извлекаем текст отзыва и добавляем в множество.
-        except Exception as e:
-            print(f"{RED}Ошибка чтения {file_path}: {e}.{RESET}")  # Выводим сообщение об ошибке.
-            return {"reviews": set()}  # Возвращаем пустое множество в случае ошибки.
-        return {"reviews": reviews}  # Возвращаем множество отзывов.
-    return {"reviews": set()}  # Возвращаем пустое множество, если файл не существует.
+    """
+    Загружает множество дайджестов уже обработанных отзывов из текстового файла.
+
+    Дайджесты читаются из индекса рядом с файлом; разбирается только не проиндексированный хвост.
+    """
+    try:
+        return {"reviews": load_digests(file_path, text_digest)}
+    except (OSError, ValueError) as e:
+        log.error("Ошибка чтения %s: %s.", file_path, e)  # Выводим сообщение об ошибке.
+        return {"reviews": set()}  # Возвращаем пустое множество в случае ошибки.
+
+def restore_reviews_file(file_writer):
+    """
+    Дописывает в текстовый файл отзывы, зафиксированные в БД, но не попавшие в файл.
+
+    Файл пополняется после фиксации транзакции, поэтому при сбое между этими шагами в нём
+    не хватает только последних отзывов базы - их и ищем, просматривая базу с конца.
+    """
+    known = load_digests(REVIEWS_FILE, text_digest)
+    missing = []
+    with sqlite3.connect(DB_FILE) as conn:
+        register(conn)  # Тексты могут храниться сжатыми.
+        rows = conn.execute('SELECT text_digest, review_text(text, text_z) FROM reviews ORDER BY id DESC')
+        for digest, text in rows:
+            if digest is None:  # Повторный текст из старой базы - в файл не пишется.
+                continue
+            if bytes(digest) in known:
+                break
+            missing.append(text)
+    if missing:
+        file_writer.write_batch(missing[::-1])
+        log.info("В %s дописано отзывов из БД: %d", REVIEWS_FILE, len(missing))
 
 def create_db():
     """Создает базу данных SQLite и таблицу reviews, если они не существуют."""
     with sqlite3.connect(DB_FILE) as conn:  # Подключаемся к базе данных (файл будет создан, если не существует).
+        conn.execute('PRAGMA journal_mode=WAL')  # Режим сохраняется в файле БД: читатели не блокируют запись.
         cursor = conn.cursor()  # Создаем курсор для выполнения SQL-запросов.
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS reviews (
@@ -188,145 +348,756 @@ def create_db():
                 review_url TEXT,
                 text TEXT,
                 has_mat BOOLEAN,
-                date_scraped DATETIME
+                date_scraped DATETIME,
+                text_digest BLOB
             )
         ''')  # Создаем таблицу reviews, если она не существует.
+        migrate_dedup_keys(conn)  # Добавляем ключи дедупликации в старые базы.
+        migrate_indexes(conn)  # Добавляем индексы для выборок статистики.
+        migrate_mat_version(conn)  # Версия списка слов, с которой классифицирован отзыв.
+        create_summary_tables(conn)  # Сводные таблицы статистики, обновляемые триггерами.
+        create_search_index(conn)  # Полнотекстовый индекс по текстам отзывов.
+        migrate_checkpoints(conn)  # Таблицы контрольных точек обхода.
         conn.commit()  # Сохраняем изменения в базе данных.
 
-def save_reviews_to_db(reviews_data):
-    """Сохраняет список отзывов в базу данных SQLite (пакетная вставка)."""
-    if not reviews_data:  # Если список отзывов пуст.
-        return  # Ничего не делаем.
+def migrate_dedup_keys(conn):
+    """
+    Добавляет в таблицу reviews столбец text_digest и уникальные индексы по review_url и text_digest.
+
+    Для старых баз дайджесты вычисляются по уже сохранённым текстам. Повторные строки
+    с тем же review_url удаляются (остаётся первая), у повторных текстов дайджест обнуляется;
+    количество таких строк выводится в журнал. Миграция выполняется один раз: признак её
+    завершения - уникальный индекс по text_digest (строки с обнулённым дайджестом больше
+    не выбираются).
+    """
+    indexes = {row[1] for row in conn.execute('PRAGMA index_list(reviews)')}
+    if {'idx_reviews_review_url', 'idx_reviews_text_digest'} <= indexes:
+        return
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(reviews)')]
+    if 'text_digest' not in columns:
+        conn.execute('ALTER TABLE reviews ADD COLUMN text_digest BLOB')
+    rows = conn.execute('SELECT id, text FROM reviews WHERE text_digest IS NULL AND text IS NOT NULL').fetchall()
+    if rows:
+        conn.executemany('UPDATE reviews SET text_digest = ? WHERE id = ?',
+                         [(text_digest(text), row_id) for row_id, text in rows])
+    deleted = conn.execute('''
+        DELETE FROM reviews WHERE review_url IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM reviews WHERE review_url IS NOT NULL GROUP BY review_url)
+    ''').rowcount
+    if deleted:
+        log.warning("Миграция дедупликации: удалено %d повторных строк с тем же review_url", deleted)
+    cleared = conn.execute('''
+        UPDATE reviews SET text_digest = NULL
+        WHERE text_digest IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM reviews WHERE text_digest IS NOT NULL GROUP BY text_digest)
+    ''').rowcount
+    if cleared:
+        log.warning("Миграция дедупликации: %d строк с повторным текстом оставлены без дайджеста", cleared)
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_reviews_review_url ON reviews (review_url)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_reviews_text_digest ON reviews (text_digest)')
+
+def migrate_indexes(conn):
+    """Создаёт индексы по столбцам, по которым statistics.py фильтрует и группирует отзывы (повторный вызов безопасен)."""
+    existing = {row[1] for row in conn.execute('PRAGMA index_list(reviews)')}
+    missing = [column for column in ('category', 'object_url', 'date_scraped', 'length')
+               if f'idx_reviews_{column}' not in existing]
+    for column in missing:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_reviews_{column} ON reviews ({column})')
+    if missing:  # Статистика планировщика нужна новым индексам; полный проход по таблице - только тогда.
+        conn.execute('ANALYZE reviews')
+
+def load_dedup_index():
+    """
+    Загружает индекс дедупликации: дайджесты URL и текстов уже сохранённых отзывов.
+
+    В памяти хранятся только дайджесты фиксированного размера, а не полные тексты.
+    """
+    dedup = {'urls': set(), 'texts': set()}
+    with sqlite3.connect(DB_FILE) as conn:
+        for review_url, digest in conn.execute('SELECT review_url, text_digest FROM reviews'):
+            if review_url:
+                dedup['urls'].add(url_digest(review_url))
+            if digest:
+                dedup['texts'].add(bytes(digest))
+    dedup['texts'] |= reload_from_disk(REVIEWS_FILE)["reviews"]  # Отзывы, попавшие только в текстовый файл.
+    return dedup
+
+def save_reviews_to_db(reviews_data, checkpoints=()):
+    """
+    Ставит отзывы в очередь потока записи в БД (не блокирует цикл событий).
+
+    Отзывы записываются пачками (DB_BATCH_SIZE строк или раз в DB_FLUSH_INTERVAL секунд)
+    в одной транзакции с контрольными точками checkpoints (пары SQL и параметров).
+    """
+    REVIEW_WRITER.put_many(reviews_data, checkpoints)
+
+async def wait_for_writer():
+    """Обратное давление от записи: ждёт, пока поток записи не разберёт очередь до DB_MAX_PENDING отзывов."""
+    if not REVIEW_WRITER.has_room():
+        METRICS.inc('writer_waits_total')
+        await asyncio.to_thread(REVIEW_WRITER.wait_for_room)
+#endregion
+
+#region Контрольные точки
+# Обновление контрольной точки категории: все объекты с индексом меньше next_object_index обработаны.
+CATEGORY_CHECKPOINT_SQL = '''
+    INSERT INTO crawl_categories (category_url, next_object_index, done, updated_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT (category_url) DO UPDATE SET
+        next_object_index = excluded.next_object_index, done = excluded.done, updated_at = excluded.updated_at
+'''
+# Обновление контрольной точки объекта: страницы отзывов 1..last_page обработаны и сохранены.
+OBJECT_CHECKPOINT_SQL = '''
+    INSERT INTO crawl_objects (category_url, object_url, object_index, last_page, done, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (category_url, object_url) DO UPDATE SET
+        object_index = excluded.object_index, last_page = excluded.last_page, done = excluded.done,
+        updated_at = excluded.updated_at
+'''
+# Маркер объекта: URL самого нового отзыва (первого на первой странице) при последнем обходе.
+MARKER_SQL = 'UPDATE crawl_objects SET newest_review = ?, updated_at = ? WHERE category_url = ? AND object_url = ?'
+
+def migrate_checkpoints(conn):
+    """Создаёт таблицы контрольных точек обхода (повторный вызов безопасен)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_categories (
+            category_url TEXT PRIMARY KEY,
+            next_object_index INTEGER NOT NULL DEFAULT 0,
+            done BOOLEAN NOT NULL DEFAULT 0,
+            updated_at DATETIME
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_objects (
+            category_url TEXT NOT NULL,
+            object_url TEXT NOT NULL,
+            object_index INTEGER,
+            last_page INTEGER NOT NULL DEFAULT 0,
+            done BOOLEAN NOT NULL DEFAULT 0,
+            updated_at DATETIME,
+            newest_review TEXT,
+            PRIMARY KEY (category_url, object_url)
+        )
+    ''')
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(crawl_objects)')]
+    if 'newest_review' not in columns:  # Маркер инкрементального обхода (базы старых версий).
+        conn.execute('ALTER TABLE crawl_objects ADD COLUMN newest_review TEXT')
+
+def load_checkpoints():
+    """
+    Загружает контрольные точки обхода из БД.
+
+    Returns:
+        Словарь {'categories': {URL категории: (next_object_index, done)},
+                 'objects': {(URL категории, URL объекта): (last_page, done)}}.
+        Объекты загружаются только для незавершённых категорий и только за пределами
+        уже обработанного префикса.
+    """
+    checkpoints = {'categories': {}, 'objects': {}}
+    with sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT) as conn:
+        for category_url, next_index, done in conn.execute(
+                'SELECT category_url, next_object_index, done FROM crawl_categories'):
+            checkpoints['categories'][category_url] = (next_index, bool(done))
+        for category_url, object_url, last_page, done in conn.execute('''
+            SELECT o.category_url, o.object_url, o.last_page, o.done
+            FROM crawl_objects AS o LEFT JOIN crawl_categories AS c ON c.category_url = o.category_url
+            WHERE COALESCE(c.done, 0) = 0 AND o.object_index >= COALESCE(c.next_object_index, 0)
+        '''):
+            checkpoints['objects'][(category_url, object_url)] = (last_page, bool(done))
+    return checkpoints
+
+def load_object_markers():
+    """
+    Загружает маркеры обработанных объектов для инкрементального обхода.
+
+    Returns:
+        Словарь {(URL категории, URL объекта): URL самого нового отзыва или None}; None - объект
+        обработан версией без маркеров.
+    """
+    with sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT) as conn:
+        return {(category_url, object_url): newest_review for category_url, object_url, newest_review in conn.execute(
+            'SELECT category_url, object_url, newest_review FROM crawl_objects WHERE done = 1')}
+
+def load_object_checkpoint(category_url, object_url):
+    """Возвращает последнюю сохранённую страницу отзывов объекта (0, если объект ещё не обходился)."""
+    with sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT) as conn:
+        row = conn.execute('SELECT last_page FROM crawl_objects WHERE category_url = ? AND object_url = ?',
+                           (category_url, object_url)).fetchone()
+    return row[0] if row else 0
+
+def import_legacy_progress(categories, checkpoints):
+    """
+    Переносит прогресс из progress.txt ("категория,объект", нумерация с 1) в контрольные точки.
+
+    Выполняется один раз - пока в БД нет контрольных точек. Последний объект из файла
+    обрабатывается заново, как и при возобновлении в старых версиях.
+    """
+    if checkpoints['categories'] or not os.path.exists(PROGRESS_FILE):
+        return
     try:
-        with sqlite3.connect(DB_FILE) as conn:  # Подключаемся к базе данных.
-            cursor = conn.cursor()  # Создаем курсор.
-            cursor.executemany('''
-                INSERT INTO reviews (length, category, object_url, review_url, text, has_mat, date_scraped)
-                VALUES (:length, :category, :object_url, :review_url, :text, :has_mat, :date_scraped)
-            ''', reviews_data)  # Выполняем *пакетную* вставку данных.  Используем именованные плейсхолдеры.
-            conn.commit()  # Сохраняем изменения.
-            print(f"{GREEN}Сохранено {len(reviews_data)} отзывов в БД{RESET}")  # Выводим сообщение.
-    except sqlite3.Error as e:
-        print(f"{RED}Ошибка записи в БД: {e}{RESET}")  # Выводим сообщение об ошибке.
+        with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
+            progress = f.read().strip().split(',')
+            category_index, object_index = int(progress[0]) - 1, int(progress[1]) - 1
+    except (ValueError, IndexError) as e:
+        log.error("Ошибка чтения %s: %s.", PROGRESS_FILE, e)
+        return
+    now = datetime.now()
+    statements = [(CATEGORY_CHECKPOINT_SQL, (url, 0, True, now)) for url in categories[:category_index]]
+    if 0 <= category_index < len(categories):
+        statements.append((CATEGORY_CHECKPOINT_SQL, (categories[category_index], max(object_index, 0), False, now)))
+    with sqlite3.connect(DB_FILE) as conn:
+        for sql, params in statements:
+            conn.execute(sql, params)
+    for sql, params in statements:
+        checkpoints['categories'][params[0]] = (params[1], params[2])
+    log.info("Прогресс из %s перенесён в БД.", PROGRESS_FILE)
 #endregion
 
-#region Главная функция
-async def main():
-    """Главная функция, запускающая процесс парсинга."""
-    print(f"Текущая рабочая директория: {os.getcwd()}")  # Выводим текущую рабочую директорию (для отладки).
-    create_db()  # Создаем базу данных и таблицу.
+#region Планировщик обхода
+def advance_category(progress, category_url):
+    """
+    Сдвигает обработанный префикс категории и возвращает контрольные точки для записи.
 
-    async with aiohttp.ClientSession() as session:  # Создаем сессию aiohttp.
-        categories = await get_categories(session)  # Получаем список категорий.
-        try:
-            with open(MAT_WORDS_FILE, 'r', encoding='utf-8') as f:  # Открываем файл с ненормативными словами.
-                mat_words = set(line.strip() for line in f)  # Загружаем слова в множество (для быстрого поиска).
-        except FileNotFoundError:
-            print(f"{RED}Ошибка: Файл '{MAT_WORDS_FILE}' не найден.{RESET}")  # Выводим сообщение об ошибке.
-            return  # Завершаем работу, если файл не найден.
+    Объекты завершаются не по порядку, поэтому сохраняется только непрерывный префикс:
+    индекс первого объекта, который ещё не обработан.
+    """
+    state = progress[category_url]
+    moved = False
+    while state['next_index'] in state['done']:  # Продвигаемся, пока префикс непрерывен.
+        state['done'].discard(state['next_index'])
+        state['next_index'] += 1
+        moved = True
+    finished = state['total'] is not None and state['next_index'] >= state['total']
+    if not moved and not finished:
+        return []
+    return [(CATEGORY_CHECKPOINT_SQL, (category_url, state['next_index'], finished, datetime.now()))]
 
-        processed_reviews = reload_from_disk(REVIEWS_FILE)["reviews"]  # Загружаем уже обработанные отзывы.
+def object_checkpoint(job, last_page, done=False):
+    """Контрольная точка объекта: обработаны страницы отзывов 1..last_page."""
+    return (OBJECT_CHECKPOINT_SQL,
+            (job['category_url'], job['object_url'], job['object_index'], last_page, done, datetime.now()))
 
-        # Загружаем прогресс парсинга из файла.
-        if os.path.exists(PROGRESS_FILE):
-            try:
-                with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-                    progress = f.read().strip().split(',')
-                    current_category_index = int(progress[0]) - 1  # Индекс текущей категории.
-                    current_object_index = int(progress[1]) - 1  # Индекс текущего объекта.
-            except (ValueError, IndexError) as e:
-                print(f"{RED}Ошибка чтения {PROGRESS_FILE}: {e}.{RESET}")
-                current_category_index = 0  # Начинаем с начала, если ошибка.
-                current_object_index = 0
+def marker_checkpoint(job):
+    """Запись маркера объекта: URL самого нового отзыва, увиденного при этом обходе."""
+    return MARKER_SQL, (job['newest_review'], datetime.now(), job['category_url'], job['object_url'])
+
+def flush_pages(job, progress, dedup):
+    """
+    Сохраняет готовые страницы отзывов объекта и, если объект обойден целиком, завершает его.
+
+    Страница готова, когда перебраны все её ссылки и обработаны все её отзывы. Отзывы
+    страницы записываются в одной транзакции с контрольной точкой, поэтому после сбоя
+    обход продолжается со следующей страницы без повторной работы.
+
+    Если страницу объекта или отзыв не удалось скачать (job['failed']), страница с ошибкой
+    и все следующие не сохраняются, а объект не отмечается обработанным: он будет продолжен
+    с контрольной точки при следующем запуске, а в режиме воркера сразу возвращается в общую
+    очередь работы (попытка засчитывается). Дайджесты несохранённых отзывов убираются из
+    индекса дедупликации, чтобы при повторном обходе они не считались дубликатами.
+
+    Новые отзывы уже обработанного объекта (инкрементальный обход, job['incremental'])
+    записываются одной транзакцией с его маркером после обхода всех новых страниц: иначе
+    после сбоя следующий обход остановился бы на уже сохранённых новых отзывах и пропустил
+    более старые из них. Если новых отзывов больше INCREMENTAL_BUFFER, накопленные страницы
+    записываются с незавершённой контрольной точкой (job['spilled']): после сбоя объект
+    продолжится обычным обходом с этой страницы до конца, а память не растёт с числом
+    новых отзывов.
+    """
+    pages = job['pages']
+    while job['next_page'] in pages and pages[job['next_page']]['pending'] == 0 \
+            and not pages[job['next_page']]['failed']:
+        page = pages.pop(job['next_page'])
+        if job['incremental'] and not job['spilled']:
+            job['delta'].append(page)
+            if sum(len(delta_page['results']) for delta_page in job['delta']) >= INCREMENTAL_BUFFER:
+                job['spilled'] = True
+                save_reviews_to_db([result for delta_page in job['delta'] for result in delta_page['results']],
+                                   [object_checkpoint(job, job['next_page'])])
+                job['delta'] = []
         else:
-            current_category_index = 0  # Начинаем с первой категории.
-            current_object_index = 0  # Начинаем с первого объекта.
-
-        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)  # Создаем семафор для ограничения количества одновременных запросов.
-        file_queue = asyncio.Queue()  # Создаем очередь для асинхронной записи отзывов в файл.
-        file_lock = asyncio.Lock()  # Создаем блокировку для синхронизации доступа к файлу.
-        lock = asyncio.Lock()  # Создаем блокировку для синхронизации доступа к `processed_reviews`.
-
-        file_saver_task = asyncio.create_task(save_to_file(file_queue, file_lock))  # Запускаем задачу записи в файл.
-
-        #region Цикл по категориям и объектам
-        for current_category_index in range(current_category_index, len(categories)):  # Перебираем категории.
-            category_url = categories[current_category_index]  # URL текущей категории.
-            category_name = category_url.split('/')[-1]  # Извлекаем имя категории из URL.
-            print(f"{BLUE}Категория {current_category_index + 1}/{len(categories)}: {category_name}{RESET}")
-
-            # Восстанавливаем индекс объекта для текущей категории (если нужно).
-            if os.path.exists(PROGRESS_FILE):
-                try:
-                    with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-                        progress = f.read().strip().split(',')
-                        # Если текущая категория совпадает с сохраненной, используем сохраненный индекс объекта.
-                        if current_category_index == int(progress[0]) - 1:
-                            current_object_index_loop = int(progress[1]) - 1
-                        else:  # Иначе начинаем с начала.
-                            current_object_index_loop = 0
-                except (ValueError, IndexError) as e:
-                    print(f"{RED}Ошибка чтения {PROGRESS_FILE}: {e}.{RESET}")
-                    current_object_index_loop = 0  # Начинаем с начала при ошибке.
-            else:
-                current_object_index_loop = 0
+            save_reviews_to_db(page['results'], [object_checkpoint(job, job['next_page'])])
+        job['next_page'] += 1
+        job['saved'].set()  # Освободилось место для следующей страницы (см. PAGES_AHEAD).
+    if not job['listing_done'] or job['finished'] or any(page['pending'] for page in pages.values()):
+        return
+    if job['failed']:
+        job['finished'] = True
+        for page in job['delta'] + list(pages.values()):
+            dedup['urls'].difference_update(page['urls'])
+            dedup['texts'].difference_update(result['text_digest'] for result in page['results'])
+        job['delta'] = []
+        pages.clear()
+        log.warning("Объект %s обойден не полностью (стр. %d).", job['object_url'], job['next_page'])
+        METRICS.inc('objects_total', result='failed')
+        if job['work_item'] is not None:
+            save_reviews_to_db([], [WORK_QUEUE.abandon_statement(job['work_item'])])
+    elif not pages:  # Все страницы обойдены и сохранены.
+        job['finished'] = True
+        if job['incremental'] and not job['spilled']:  # Контрольная точка объекта уже отмечает его обработанным.
+            results, checkpoints = [result for page in job['delta'] for result in page['results']], []
+            if results:
+                log.log(SUCCESS, "Новых отзывов у объекта %s: %d", job['object_url'], len(results))
+        else:
+            results, checkpoints = [], [object_checkpoint(job, job['next_page'] - 1, True)]
+        METRICS.inc('objects_total', result='done')
+        if job['newest_review'] is not None and job['newest_review'] != job['marker']:
+            checkpoints.append(marker_checkpoint(job))
+        if job['work_item'] is not None:  # Режим воркера: объект - элемент общей очереди работы.
+            checkpoints.append(WORK_QUEUE.complete_statement(job['work_item']))
+        else:
+            progress[job['category_url']]['done'].add(job['object_index'])
+            checkpoints += advance_category(progress, job['category_url'])
+        save_reviews_to_db(results, checkpoints)
+
+def new_job(category_url, object_index, object_url, last_page=0, work_item=None, marker=False):
+    """
+    Создаёт задание на обход объекта, начиная со страницы отзывов last_page + 1.
+
+    marker - маркер уже обработанного объекта для инкрементального обхода (URL самого нового
+    отзыва или None, если маркер не сохранён); False - обычный обход.
+    """
+    return {
+        'category_url': category_url,
+        'object_index': object_index,
+        'category': category_url.split('/')[-1],  # Имя категории из URL.
+        'object_url': object_url,
+        'next_page': last_page + 1,  # Первая несохранённая страница отзывов.
+        'pages': {},  # Страницы в обработке: номер -> {'pending', 'results', 'urls', 'failed'}.
+        'listing_done': False,  # Все ли страницы отзывов объекта уже обойдены.
+        'failed': False,  # Не удалось скачать страницу или отзыв - объект обойден не полностью.
+        'finished': False,
+        'work_item': work_item,  # id элемента общей очереди работы (в режиме воркера).
+        'incremental': marker is not False,  # Ищем только новые отзывы уже обработанного объекта.
+        'marker': marker or None,  # URL самого нового отзыва при прошлом обходе.
+        'newest_review': None,  # URL самого нового отзыва сейчас (первая ссылка первой страницы).
+        'delta': [],  # Обойденные страницы с новыми отзывами (инкрементальный обход).
+        'spilled': False,  # Новые отзывы не поместились в INCREMENTAL_BUFFER и записываются постранично.
+        'saved': asyncio.Event(),  # Устанавливается при сохранении страницы или ошибке (см. PAGES_AHEAD).
+    }
 
-            while True:  # Цикл по объектам в текущей категории.
-                target_obj_url, page, obj_position = await get_target_object_url(session, category_url, current_object_index_loop)  # Получаем URL целевого объекта.
-                if not target_obj_url:  # Если объектов больше нет.
-                    print(f"{BLUE}Категория '{category_name}': Больше объектов нет.{RESET}")
-                    break  # Переходим к следующей категории.
+def finish_review(job, page, progress, dedup):
+    """Уменьшает счётчик незавершённых отзывов страницы и сохраняет готовые страницы."""
+    job['pages'][page]['pending'] -= 1
+    flush_pages(job, progress, dedup)
+    if job['failed']:
+        job['saved'].set()  # Обход страниц остановится - не заставляем его ждать.
 
+async def produce_objects(session, categories, checkpoints, object_queue, progress, markers=None):
+    """
+    Стадия 1-2: перебирает категории и кладёт незавершённые объекты в ограниченную очередь.
+
+    markers - маркеры обработанных объектов (load_object_markers) для инкрементального обхода:
+    тогда все категории обходятся с начала, чтобы найти новые объекты, а обработанные
+    объекты ставятся в очередь для поиска новых отзывов.
+    """
+    for category_index, category_url in enumerate(categories):  # Перебираем категории.
+        category_name = category_url.split('/')[-1]  # Извлекаем имя категории из URL.
+        if markers is None:
+            start_index, category_done = checkpoints['categories'].get(category_url, (0, False))
+        else:
+            start_index, category_done = 0, False
+        if category_done:
+            log.info("Категория %d/%d: %s уже обработана.", category_index + 1, len(categories), category_name)
+            continue
+        log.info("Категория %d/%d: %s", category_index + 1, len(categories), category_name)
+
+        state = progress[category_url] = {'next_index': start_index, 'done': set(), 'total': None}
+        total = start_index  # Количество объектов категории (известно после обхода всех страниц).
+        objects = iter_category_objects(session, category_url, start_index)
+        try:
+            async for object_index, target_obj_url, page, obj_position in objects:  # Цикл по объектам категории.
+                total = object_index + 1
+                key = (category_url, target_obj_url)
                 object_name = target_obj_url.split('/')[-1]  # Извлекаем имя объекта из URL.
-                print(f"{BLUE}Объект {current_object_index_loop + 1} (стр. {page}, поз. {obj_position + 1}): {object_name}{RESET}")
+                if markers is not None and key in markers:  # Обработанный объект - ищем только новые отзывы.
+                    log.debug("Объект %d (проверка новых отзывов): %s", object_index + 1, object_name)
+                    await object_queue.put(new_job(category_url, object_index, target_obj_url, marker=markers[key]))
+                    continue
+                last_page, object_done = checkpoints['objects'].get(key, (0, False))
+                if object_done:  # Объект обработан в прошлом запуске (вне непрерывного префикса).
+                    state['done'].add(object_index)
+                    continue
+                log.debug("Объект %d (стр. %d, поз. %d): %s", object_index + 1, page, obj_position + 1, object_name)
+                job = new_job(category_url, object_index, target_obj_url, last_page)
+                await object_queue.put(job)  # Блокируется, если очередь заполнена (обратное давление).
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Категория не отмечается обработанной: при следующем запуске обход продолжится.
+            log.warning("Ошибка обхода категории '%s': %s", category_name, e)
+            continue
+        state['total'] = total
+        save_reviews_to_db([], advance_category(progress, category_url))
+        log.info("Категория '%s': Больше объектов нет.", category_name)
 
-                review_page = 1  # Номер страницы отзывов.
-                consecutive_errors = 0  # Счетчик последовательных ошибок.
-                reviews_for_object = []  # Список для хранения отзывов по текущему объекту.
+async def expand_category(session, item):
+    """Режим воркера: обходит страницы категории и добавляет её объекты в общую очередь работы."""
+    category_url = item['url']
+    log.info("Категория: %s", category_url.split('/')[-1])
+    page_objects, current_page = [], None
+    async for object_index, object_url, page, _ in iter_category_objects(session, category_url, 0):
+        if page != current_page and page_objects:  # Объекты добавляются постранично - их сразу разбирают воркеры.
+            await asyncio.to_thread(WORK_QUEUE.add_objects, category_url, page_objects)
+            page_objects = []
+        current_page = page
+        page_objects.append((object_index, object_url))
+    if page_objects:
+        await asyncio.to_thread(WORK_QUEUE.add_objects, category_url, page_objects)
+    await asyncio.to_thread(WORK_QUEUE.complete, item['id'])
 
-                while True:  # Цикл по страницам отзывов текущего объекта.
-                    async with semaphore:  # Ограничиваем количество одновременных запросов.
-                        review_urls = await get_reviews_urls(session, target_obj_url, review_page)  # Получаем URL отзывов с текущей страницы.
-                        if not review_urls:  # Если отзывов больше нет (или ошибка).
-                            break  # Переходим к следующему объекту.
+async def produce_leased_objects(session, object_queue):
+    """
+    Стадия 1-2 в режиме воркера: берёт в аренду элементы общей очереди работы.
 
-                        tasks = []
-                        for review_url in review_urls:  # Перебираем URL отзывов.
-                            # Создаем задачу для обработки отзыва.  Передаем category_name и target_obj_url.
-                            task = process_review(session, review_url, mat_words, lock, processed_reviews, file_queue, category_name, target_obj_url)
-                            tasks.append(task)
+    Категории разворачиваются в объекты, объекты передаются в ограниченную очередь.
+    Воркер завершается, когда в очереди не осталось ни свободной, ни арендованной работы.
+    """
+    while True:
+        items = await asyncio.to_thread(WORK_QUEUE.claim)
+        if not items:
+            if not await asyncio.to_thread(WORK_QUEUE.has_outstanding):
+                break
+            await asyncio.sleep(WORK_POLL_INTERVAL)  # Работу держат другие воркеры (или наши объекты ещё в обработке).
+            continue
+        item = items[0]
+        if item['kind'] == 'category':
+            try:
+                await expand_category(session, item)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Найденные объекты уже в очереди; категория вернётся в очередь и будет обойдена заново.
+                log.warning("Ошибка обхода категории %s: %s", item['url'], e)
+                await asyncio.to_thread(WORK_QUEUE.abandon, item['id'])
+            continue
+        last_page = await asyncio.to_thread(load_object_checkpoint, item['category_url'], item['url'])
+        log.debug("Объект %d (попытка %d): %s", item['object_index'] + 1, item['attempts'], item['url'].split('/')[-1])
+        job = new_job(item['category_url'], item['object_index'], item['url'], last_page, item['id'])
+        await object_queue.put(job)  # Блокируется, если очередь заполнена (обратное давление).
 
-                        results = await asyncio.gather(*tasks)  # Запускаем задачи асинхронно и ждем завершения.
+async def renew_leases():
+    """Режим воркера: периодически продлевает аренду элементов, пока они в работе."""
+    while True:
+        await asyncio.sleep(WORK_QUEUE.lease_seconds / 3)
+        await asyncio.to_thread(WORK_QUEUE.heartbeat)
 
-                        for result in results:  # Перебираем результаты обработки отзывов.
-                            if result:  # Если отзыв успешно обработан (process_review вернула не None).
-                                reviews_for_object.append(result)  # Добавляем данные отзыва в список.
+async def commit_near_duplicates():
+    """
+    Режим воркера: периодически фиксирует добавления в общий LSH-индекс.
 
-                        if not review_urls: # Если не получили отзывы со страницы
-                            consecutive_errors += 1 # Увеличиваем счетчик ошибок
-                        else: # Иначе
-                            consecutive_errors = 0 # Сбрасываем счетчик
+    Добавления фиксируются пачками по COMMIT_EVERY, а незафиксированная пачка держит
+    блокировку записи индекса. Другие воркеры ждут её (near_duplicates.BUSY_TIMEOUT)
+    не дольше NEAR_DUPLICATE_COMMIT_INTERVAL, даже если новых отзывов долго нет.
+    """
+    while True:
+        await asyncio.sleep(NEAR_DUPLICATE_COMMIT_INTERVAL)
+        await asyncio.to_thread(NEAR_DUPLICATES.commit)
 
-                        if consecutive_errors >= 10:  # Если было 10 последовательных ошибок.
-                            print(f"{RED}Слишком много ошибок.{RESET}")
-                            break  # Переходим к следующему объекту.
-                        review_page += 1  # Переходим к следующей странице отзывов.
+async def review_pages_worker(session, object_queue, review_queue, dedup, progress):
+    """
+    Стадия 3: обходит страницы отзывов объекта и кладёт URL отзывов в очередь.
 
-                save_reviews_to_db(reviews_for_object)  # Сохраняем все отзывы по текущему объекту в базу данных.
-                current_object_index_loop += 1  # Переходим к следующему объекту в текущей категории.
+    При инкрементальном обходе (отзывы на сайте идут от новых к старым) объект с прежним
+    маркером пропускается после первой страницы, а обход страниц останавливается на
+    странице, где встретился уже сохранённый отзыв.
 
-                # Сохраняем прогресс (номер категории и объекта).
-                with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-                    f.write(f"{current_category_index + 1},{current_object_index_loop}")
+    Следующая страница обходится, только если несохранённых страниц объекта меньше
+    PAGES_AHEAD: иначе медленный отзыв на ранней странице заставил бы держать в памяти
+    результаты всех следующих страниц.
+    """
+    while True:
+        job = await object_queue.get()
+        listing_page = None  # Страница, ссылки которой перебираются сейчас.
+        try:
+            review_page = job['next_page']  # Продолжаем с первой несохранённой страницы.
+            while not job['failed']:  # Цикл по страницам отзывов объекта (до первой ошибки).
+                while review_page - job['next_page'] >= PAGES_AHEAD and not job['failed']:
+                    job['saved'].clear()
+                    await job['saved'].wait()
+                if job['failed']:
+                    break
+                review_urls = await get_reviews_urls(session, job['object_url'], review_page)
+                if not review_urls:  # Если отзывов больше нет.
+                    break
+                if review_page == 1:
+                    job['newest_review'] = review_urls[0]
+                    if job['incremental'] and review_urls[0] == job['marker']:  # Новых отзывов нет.
+                        break
+                listing_page = review_page
+                reached_known = False  # Встретился ли на странице уже сохранённый отзыв.
+                # pending = 1, пока перебираются ссылки; urls - дайджесты URL, поставленных в очередь.
+                job['pages'][review_page] = {'pending': 1, 'results': [], 'urls': [], 'failed': False}
+                for review_url in review_urls:
+                    digest = url_digest(review_url)
+                    if digest in dedup['urls']:  # Отзыв уже сохранён (или уже в очереди) - не скачиваем.
+                        reached_known = True
+                        continue
+                    dedup['urls'].add(digest)
+                    job['pages'][review_page]['urls'].append(digest)
+                    job['pages'][review_page]['pending'] += 1
+                    await review_queue.put((job, review_page, review_url))
+                listing_page = None
+                finish_review(job, review_page, progress, dedup)  # Все ссылки страницы перебраны.
+                if job['incremental'] and reached_known:  # Дальше только уже сохранённые отзывы.
+                    break
+                review_page += 1  # Переходим к следующей странице отзывов.
+        except Exception as e:
+            job['failed'] = True  # Остальные страницы не обойдены - объект не завершается.
+            log.warning("Ошибка обхода объекта %s: %s", job['object_url'], e)
+        finally:
+            job['listing_done'] = True
+            if listing_page is not None:
+                finish_review(job, listing_page, progress, dedup)
+            else:
+                flush_pages(job, progress, dedup)  # Объект мог быть уже готов (например, без новых отзывов).
+            object_queue.task_done()
 
+async def review_worker(session, review_queue, mat_words, dedup, progress):
+    """Стадия 4: скачивает и обрабатывает отдельные отзывы."""
+    while True:
+        job, page, review_url = await review_queue.get()
+        try:
+            await wait_for_writer()  # Запись в БД отстаёт - не копим результаты в памяти.
+            result = await process_review(session, review_url, mat_words, dedup,
+                                          job['category'], job['object_url'])
+            if result:  # Если отзыв успешно обработан.
+                job['pages'][page]['results'].append(result)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:  # Повторы не помогли - страница не сохраняется.
+            job['pages'][page]['failed'] = job['failed'] = True
+            log.warning("Ошибка загрузки отзыва %s: %s", review_url, e)
+        except Exception as e:
+            log.error("Ошибка обработки отзыва %s: %s", review_url, e)
+        finally:
+            finish_review(job, page, progress, dedup)
+            review_queue.task_done()
+#endregion
+
+#region Главная функция
+async def crawl(replay=False, worker=False, incremental=False):
+    """
+    Обходит сайт: запускает стадии конвейера и дожидается их завершения.
+
+    Returns:
+        1, если обход не начат (нет списка ненормативных слов), иначе None.
+    """
+    # Один пул соединений на весь обход: keep-alive и кэш DNS экономят установку соединений.
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY, ttl_dns_cache=DNS_CACHE_TTL,
+                                     keepalive_timeout=KEEPALIVE_TIMEOUT)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, sock_connect=CONNECT_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:  # Создаем сессию aiohttp.
+        categories = await get_categories(session)  # Получаем список категорий.
+        try:
+            mat_words = MatMatcher.load(MAT_WORDS_FILE)  # Компилируем список слов (или берём из кэша на диске).
+        except FileNotFoundError as e:
+            if e.filename != MAT_WORDS_FILE:  # Не сам список слов (например, файл кэша) - это другая ошибка.
+                raise
+            log.error("Файл '%s' не найден.", MAT_WORDS_FILE)  # Выводим сообщение об ошибке.
+            return 1  # Завершаем работу с ошибкой, если файл не найден.
+
+        dedup = load_dedup_index()  # Загружаем дайджесты уже обработанных отзывов.
+        markers = None  # Маркеры обработанных объектов (только для инкрементального обхода).
+        if worker:
+            checkpoints = None  # Прогресс хранится в общей очереди работы.
+            await asyncio.to_thread(WORK_QUEUE.seed, categories)
+        elif replay:
+            checkpoints = {'categories': {}, 'objects': {}}  # Повторный разбор всегда с начала.
+        elif incremental:
+            checkpoints = load_checkpoints()  # Незавершённые объекты продолжаются с контрольных точек.
+            markers = load_object_markers()
+        else:
+            checkpoints = load_checkpoints()  # Загружаем контрольные точки обхода.
+            import_legacy_progress(categories, checkpoints)
+
+        object_queue = asyncio.Queue(maxsize=OBJECT_QUEUE_SIZE)  # Ограниченная очередь объектов.
+        review_queue = asyncio.Queue(maxsize=REVIEW_QUEUE_SIZE)  # Ограниченная очередь URL отзывов.
+        METRICS.gauge('queue_depth', object_queue.qsize, queue='objects')
+        METRICS.gauge('queue_depth', review_queue.qsize, queue='reviews')
+        progress = {}  # Обработанные префиксы категорий: URL категории -> состояние.
 
-            current_object_index = 0  # Сбрасываем индекс объекта (для следующей категории).
-        #endregion
+        workers = [asyncio.create_task(review_pages_worker(session, object_queue, review_queue, dedup, progress))
+                   for _ in range(OBJECT_WORKERS)]
+        workers += [asyncio.create_task(review_worker(session, review_queue, mat_words, dedup, progress))
+                    for _ in range(REVIEW_WORKERS)]
+        if worker:
+            workers.append(asyncio.create_task(renew_leases()))
+            if NEAR_DUPLICATES is not None:
+                workers.append(asyncio.create_task(commit_near_duplicates()))
 
-        await file_queue.join()  # Дожидаемся завершения всех задач в очереди на запись в файл.
-        file_saver_task.cancel()  # Останавливаем задачу записи в файл.
+        try:
+            if worker:
+                await produce_leased_objects(session, object_queue)
+            else:
+                await produce_objects(session, categories, checkpoints, object_queue, progress, markers)
+
+            await object_queue.join()  # Дожидаемся обхода страниц всех объектов.
+            await review_queue.join()  # Дожидаемся обработки всех отзывов.
+        finally:
+            for worker in workers:
+                worker.cancel()
+            METRICS.remove_gauge('queue_depth', queue='objects')
+            METRICS.remove_gauge('queue_depth', queue='reviews')
+
+async def main(replay=False, worker=False, incremental=False):
+    """
+    Главная функция, запускающая процесс парсинга.
+
+    Args:
+        replay: Прогнать весь конвейер только по дисковому кэшу HTTP-ответов, без сети
+                (обход начинается с начала, сохранённый прогресс не используется).
+        worker: Работать как один из процессов-воркеров общей очереди работы (см. work_queue.py).
+        incremental: Инкрементальный обход: обработанные объекты проверяются только на новые
+                     отзывы (по маркеру и до первого уже сохранённого отзыва).
+    """
+    global RESPONSE_CACHE, REPLAY_MODE, PARSE_POOL, NEAR_DUPLICATES, REVIEW_WRITER, WORK_QUEUE, REQUEST_CONTROLLER
+    setup_logging(LOG_LEVEL)
+    log.debug("Текущая рабочая директория: %s", os.getcwd())  # Для отладки.
+    create_db()  # Создаем базу данных и таблицу.
+    REPLAY_MODE = replay
+    REQUEST_CONTROLLER = RequestController(REQUESTS_PER_SECOND, initial=INITIAL_CONCURRENCY,
+                                           maximum=MAX_CONCURRENCY, max_retries=MAX_RETRIES)
+    METRICS.gauge('http_in_flight', REQUEST_CONTROLLER.in_flight)
+    METRICS.gauge('http_concurrency_limit', REQUEST_CONTROLLER.total_limit)
+    if USE_HTTP_CACHE or replay:
+        RESPONSE_CACHE = ResponseCache(HTTP_CACHE_DIR)  # Открываем дисковый кэш HTTP-ответов.
+    if PARSE_WORKERS:
+        PARSE_POOL = ProcessPoolExecutor(max_workers=PARSE_WORKERS)  # Разбор HTML вне цикла событий.
+    if DETECT_NEAR_DUPLICATES:
+        lsh_file = os.path.join(os.path.dirname(DB_FILE), 'reviews_lsh.db')  # Индекс хранится рядом с БД.
+        # Воркеры пишут индекс одновременно: пачки фиксируются и по времени (commit_near_duplicates).
+        NEAR_DUPLICATES = NearDuplicateIndex(lsh_file, NEAR_DUPLICATE_THRESHOLD, commit_every=COMMIT_EVERY)
+    # Отзывы попадают в reviews.txt после фиксации в БД: файл и база не расходятся после сбоя.
+    file_writer = ReviewsFileWriter(REVIEWS_FILE, text_digest, REVIEWS_FSYNC_POLICY)
+    if worker:
+        WORK_QUEUE = WorkQueue(DB_FILE)  # Файл восстанавливает запускающий процесс (launch_workers).
+    else:
+        restore_reviews_file(file_writer)
+    codec = None
+    if COMPRESS_TEXTS:
+        # Словарь обучает запускающий процесс; воркер только читает словари базы.
+        codec = get_codec(DB_FILE).load() if worker else ensure_dictionary(DB_FILE)
+        if codec is None or codec.current() is None:
+            log.info("Словарь сжатия ещё не обучен: тексты сохраняются без сжатия "
+                     "(сжать их позже: python text_codec.py compress).")
+    REVIEW_WRITER = ReviewWriter(DB_FILE, DB_BATCH_SIZE, DB_FLUSH_INTERVAL, file_writer, DB_MAX_PENDING,
+                                 codec).start()
+    METRICS.gauge('queue_depth', REVIEW_WRITER.pending, queue='writer')
+    metrics_server = await start_server(METRICS_PORT) if METRICS_PORT else None
+    reporter = asyncio.create_task(report_periodically(METRICS_INTERVAL, METRICS_FILE))  # Темп обработки в журнал.
+    started = time.monotonic()
+    crawl_task = asyncio.ensure_future(crawl(replay, worker, incremental))
+    loop = asyncio.get_running_loop()
+    # Пачку не удалось записать и после повторов - обход прерывается, а не продолжается без сохранения.
+    REVIEW_WRITER.on_error = lambda error: loop.call_soon_threadsafe(crawl_task.cancel)
+    exit_code = 0
+    try:
+        exit_code = await crawl_task or 0
+    except asyncio.CancelledError:
+        if REVIEW_WRITER.error is None:  # Прерывание извне, а не ошибка записи.
+            raise
+    finally:
+        await asyncio.to_thread(REVIEW_WRITER.close)  # Дописываем накопленные отзывы в БД и в файл.
+        write_error = REVIEW_WRITER.error
+        reporter.cancel()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        log.log(SUCCESS, "Готово за %.1f с: сохранено отзывов %d, запросов %d.", time.monotonic() - started,
+                METRICS.counter('reviews_saved_total'), REQUEST_CONTROLLER.requests)
+        REVIEW_WRITER = None
+        REQUEST_CONTROLLER = None
+        METRICS.remove_gauge('queue_depth', queue='writer')
+        METRICS.remove_gauge('http_in_flight')
+        METRICS.remove_gauge('http_concurrency_limit')
+        if WORK_QUEUE is not None:
+            failed = WORK_QUEUE.failed_items()
+            if failed:  # Каждый элемент записан в журнал, когда его попытки исчерпались.
+                log.error("Элементов очереди работы, не обработанных за %d попыток: %d", MAX_ATTEMPTS, len(failed))
+                exit_code = 1
+            WORK_QUEUE.release()  # Незавершённые элементы сразу становятся доступны другим воркерам.
+            WORK_QUEUE.close()
+            WORK_QUEUE = None
+        if RESPONSE_CACHE is not None:
+            RESPONSE_CACHE.close()
+            RESPONSE_CACHE = None
+        if PARSE_POOL is not None:
+            PARSE_POOL.shutdown()
+            PARSE_POOL = None
+        if NEAR_DUPLICATES is not None:
+            NEAR_DUPLICATES.close()
+            NEAR_DUPLICATES = None
+    if write_error is not None:
+        raise write_error  # Код завершения процесса (и воркера) - ошибка.
+    return exit_code
+
+def launch_workers(count, worker_args):
+    """
+    Запускает count процессов-воркеров (python main.py --worker ...) и дожидается их завершения.
+
+    Миграции базы, восстановление reviews.txt и сборка кэша списка слов выполняются
+    один раз, до запуска воркеров.
 
+    Returns:
+        Наибольший код завершения воркеров; 1, если в очереди остались элементы со
+        статусом 'failed' или не найден список слов.
+    """
+    setup_logging(LOG_LEVEL)
+    try:
+        MatMatcher.load(MAT_WORDS_FILE)  # Воркеры возьмут готовый кэш и не будут собирать его одновременно.
+    except FileNotFoundError as e:
+        if e.filename != MAT_WORDS_FILE:
+            raise
+        log.error("Файл '%s' не найден.", MAT_WORDS_FILE)
+        return 1
+    create_db()
+    file_writer = ReviewsFileWriter(REVIEWS_FILE, text_digest, REVIEWS_FSYNC_POLICY)
+    restore_reviews_file(file_writer)
+    file_writer.close()
+    if COMPRESS_TEXTS:
+        ensure_dictionary(DB_FILE)  # Один словарь на все воркеры.
+    parse_workers = max(1, (os.cpu_count() or 1) // count)  # Ядра делятся между пулами разбора воркеров.
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--parse-workers', str(parse_workers)]
+    # Каждый воркер отдаёт метрики на своём порту: METRICS_PORT + 1, + 2, ...; порт передаётся всегда,
+    # иначе при METRICS_PORT = 0 воркер взял бы порт по умолчанию и запустил сервер метрик.
+    processes = [subprocess.Popen(command + worker_args +
+                                  ['--metrics-port', str(METRICS_PORT + i + 1) if METRICS_PORT else '0'])
+                 for i in range(count)]
+    log.info("Запущено воркеров: %d", count)
+    try:
+        codes = [process.wait() for process in processes]
+    except KeyboardInterrupt:  # Ctrl+C получают и воркеры - дожидаемся, пока они освободят аренду.
+        codes = [process.wait() for process in processes]
+    work_queue = WorkQueue(DB_FILE)
+    try:
+        work_queue.fail_exhausted()  # Элементы, брошенные упавшими воркерами на последней попытке.
+        failed = work_queue.failed_items()
+    finally:
+        work_queue.close()
+    if failed:
+        log.error("Элементов очереди работы, не обработанных за %d попыток: %d (status = 'failed' в work_items)",
+                  MAX_ATTEMPTS, len(failed))
+        codes.append(1)
+    return max(codes)
 #endregion
 
 if __name__ == "__main__":
-    asyncio.run(main())  # Запускаем главную функцию.
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Парсер отзывов с сайта vseotzyvy.ru.")
+    parser.add_argument('--replay', action='store_true', help="прогнать конвейер только по дисковому кэшу, без сети")
+    parser.add_argument('--base-url', default=BASE_URL, help="базовый URL сайта (например, локальный тестовый сервер)")
+    parser.add_argument('--workers', type=int, default=0, help="запустить N процессов-воркеров общей очереди работы")
+    parser.add_argument('--worker', action='store_true', help="работать как один процесс-воркер общей очереди")
+    parser.add_argument('--parse-workers', type=int, default=PARSE_WORKERS, help="процессов для разбора HTML")
+    parser.add_argument('--incremental', action='store_true',
+                        help="обойти только новые объекты и новые отзывы уже обработанных объектов")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help="порт HTTP-сервера метрик (0 - не запускать)")
+    parser.add_argument('--log-level', default=LOG_LEVEL, help="уровень журнала: DEBUG, INFO, WARNING, ERROR")
+    parser.add_argument('--compress-texts', action='store_true', default=COMPRESS_TEXTS,
+                        help="хранить тексты отзывов в БД сжатыми (см. text_codec.py)")
+    args = parser.parse_args()
+    if args.incremental and (args.replay or args.workers or args.worker):
+        parser.error("--incremental работает только в одном процессе и без --replay")
+    BASE_URL = args.base_url.rstrip('/')
+    PARSE_WORKERS = args.parse_workers
+    METRICS_PORT = args.metrics_port
+    LOG_LEVEL = args.log_level
+    COMPRESS_TEXTS = args.compress_texts
+    if args.workers:
+        sys.exit(launch_workers(args.workers, ['--base-url', BASE_URL, '--log-level', LOG_LEVEL] +
+                                (['--replay'] if args.replay else []) +
+                                (['--compress-texts'] if COMPRESS_TEXTS else [])))
+    # Запускаем главную функцию; код завершения сообщает launch_workers об ошибке воркера.
+    sys.exit(asyncio.run(main(replay=args.replay, worker=args.worker, incremental=args.incremental)))
@@ -0,0 +1,229 @@
+# mat_matcher.py
+"""
+Скомпилированный поиск ненормативной лексики.
+
+Список слов из mat_words.txt сводится к основам, основы собираются в префиксное
+дерево (trie), а дерево - в одно регулярное выражение. Выражение просматривает текст
+за один проход в C-коде модуля re и останавливается только на словах, которые
+начинаются с одной из основ; окончание такого слова затем проверяется по словарю.
+Текст не разбивается на список токенов. Скомпилированные основы сохраняются на диск
+рядом со списком слов и пересобираются только при его изменении.
+
+Правила совпадения (регистр не учитывается, ё = е, пунктуация внутри слов
+пропускается, как в исходной contains_mat):
+    * короткие слова (не длиннее SHORT_WORD_LEN) - только целое слово;
+    * остальные слова - основа плюс окончание той же части речи
+      ("ахуенный" -> "ахуенного", "ахуенная", но не "мандарин" от "манда");
+    * длинные основы (от COMPOUND_MIN_LEN) - ещё и с глагольными приставками
+      ("пиздить" -> "отпиздили").
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+
+# region Константы
+MAT_WORDS_FILE = os.path.join(os.path.dirname(__file__), 'mat_words.txt')  # Список ненормативных слов.
+MATCHER_VERSION = 1  # Версия формата кэша (увеличивать при изменении правил компиляции).
+SHORT_WORD_LEN = 4  # Слова не длиннее этого совпадают только целиком.
+MIN_STEM_LEN = 4  # Минимальная длина основы после отбрасывания окончания.
+COMPOUND_MIN_LEN = 6  # Основы от этой длины совпадают и с приставками.
+
+VERB_ENDINGS = ['ться', 'тся', 'ть', 'ешь', 'ишь', 'ете', 'ите', 'ет', 'ит', 'ут', 'ют', 'ят', 'ем', 'им',
+                'ла', 'ли', 'ло', 'л', 'лся', 'лась', 'лись', 'йте', 'й', 'ся', 'сь']
+NOUN_ENDINGS = ['ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие',
+                'ой', 'ей', 'ий', 'ый', 'ую', 'юю', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев',
+                'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь']
+VERB_PREFIXES = ['раз', 'рас', 'за', 'на', 'по', 'при', 'от', 'вы', 'до', 'об', 'о', 'у', 'с', 'недо', 'пере',
+                 'под', 'про', 'из', 'ис', 'вз', 'вс', 'съ', 'въ']
+
+# Пунктуация удаляется перед поиском (как re.sub(r'[^\w\s]', '', ...) в исходной функции), ё заменяется на е.
+_PUNCTUATION_RE = re.compile(r'[^\w\s]+')
+# endregion
+
+
+# region Компиляция
+def normalize(text):
+    """Нижний регистр, ё заменена на е, пунктуация удалена (как в исходной contains_mat)."""
+    text = text.lower()
+    if 'ё' in text:
+        text = text.replace('ё', 'е')
+    return _PUNCTUATION_RE.sub('', text)
+
+
+def stem(word):
+    """
+    Отбрасывает окончание слова.
+
+    Returns:
+        Кортеж (основа, часть речи): 'verb' для глаголов, 'noun' для остальных слов.
+    """
+    if word.endswith(('ть', 'ться', 'тся')):
+        endings, kind = VERB_ENDINGS, 'verb'
+    else:
+        endings, kind = NOUN_ENDINGS, 'noun'
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LEN:
+            return word[:-len(ending)], kind
+    return word, kind
+
+
+def compile_stems(words):
+    """
+    Сводит список слов к словарю основ.
+
+    Returns:
+        Словарь {основа: вид}, где вид - 'exact' (только целое слово), 'verb' или 'noun'.
+    """
+    stems = {}
+    for word in words:
+        word = normalize(word.strip())
+        if not word:
+            continue
+        if len(word) <= SHORT_WORD_LEN:
+            stems.setdefault(word, 'exact')
+        else:
+            base, kind = stem(word)
+            stems[base] = kind  # Основа с окончаниями шире, чем совпадение целым словом.
+    return stems
+
+
+def trie_regex(words):
+    """Собирает слова в префиксное дерево и возвращает эквивалентное регулярное выражение."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}  # Метка конца слова.
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:  # Слово может закончиться в этом узле.
+            body = '(?:' + body + ')?'
+        return body
+
+    return emit(trie) if words else '(?!)'  # (?!) - пустой список, ничего не совпадает.
+
+
+def build_pattern(stems, compounds=True):
+    """Строит выражение, находящее слова, которые начинаются с основы (или с приставки и основы)."""
+    pattern = trie_regex(sorted(stems))
+    if compounds:
+        pattern = '(?:' + trie_regex(VERB_PREFIXES) + ')?' + pattern
+    return r'\b' + pattern + r'\w*'
+# endregion
+
+
+# region Поиск
+_ENDINGS = {'verb': frozenset(VERB_ENDINGS) | {''}, 'noun': frozenset(NOUN_ENDINGS) | {''}}
+
+
+class MatMatcher:
+    """Поиск ненормативной лексики по скомпилированному выражению."""
+
+    def __init__(self, stems, compounds=True, version=None):
+        self.stems = stems
+        self.compounds = compounds
+        self.version = version  # Версия правил и хэш списка слов (см. load); None - список задан в коде.
+        self._regex = re.compile(build_pattern(stems, compounds))
+
+    def __reduce__(self):
+        return MatMatcher, (self.stems, self.compounds, self.version)  # Для передачи в пул процессов.
+
+    @classmethod
+    def from_words(cls, words, compounds=True):
+        """Компилирует поиск по списку слов."""
+        return cls(compile_stems(words), compounds)
+
+    @classmethod
+    def load(cls, words_file=MAT_WORDS_FILE, cache_file=None, compounds=True):
+        """
+        Загружает основы из дискового кэша или строит их по words_file.
+
+        Кэш привязан к SHA-256 содержимого списка слов и к MATCHER_VERSION,
+        поэтому изменение mat_words.txt приводит к пересборке. Те же значения образуют
+        version - метку, с которой отзыв классифицирован (reviews.mat_version).
+        """
+        if cache_file is None:
+            cache_file = os.path.splitext(words_file)[0] + '.matcher.json'
+        with open(words_file, 'rb') as f:
+            source = f.read()
+        source_hash = hashlib.sha256(source).hexdigest()
+        version = f"{MATCHER_VERSION}{'' if compounds else 's'}:{source_hash[:16]}"
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached['version'] == MATCHER_VERSION and cached['source_hash'] == source_hash:
+                return cls(cached['stems'], compounds, version)
+        except (OSError, ValueError, KeyError):
+            pass  # Кэша нет или он повреждён - собираем заново.
+
+        stems = compile_stems(source.decode('utf-8').splitlines())
+        tmp_file = f'{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp'  # Уникален для процесса и потока.
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': MATCHER_VERSION, 'source_hash': source_hash, 'stems': stems}, f, ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
+        return cls(stems, compounds, version)
+
+    def _check_word(self, word):
+        """Проверяет слово-кандидата: основа + допустимое окончание (с приставкой - только длинные основы)."""
+        if self.stems.get(word) == 'exact':
+            return True
+        candidates = [(word, False)]
+        if self.compounds:
+            candidates += [(word[len(prefix):], True) for prefix in VERB_PREFIXES if word.startswith(prefix)]
+        for candidate, compound in candidates:
+            for i in range(len(candidate), MIN_STEM_LEN - 1, -1):
+                kind = self.stems.get(candidate[:i])
+                if kind in _ENDINGS and candidate[i:] in _ENDINGS[kind] and (not compound or i >= COMPOUND_MIN_LEN):
+                    return True
+        return False
+
+    def _iter_matches(self, prepared):
+        """Перебирает подтверждённые совпадения в нормализованном тексте."""
+        for match in self._regex.finditer(prepared):
+            if self._check_word(match.group()):
+                yield match
+
+    def find_all(self, text):
+        """
+        Находит все слова текста с ненормативной лексикой.
+
+        Returns:
+            Список кортежей (начало, конец, слово): границы слова в исходном тексте
+            и само слово в том виде, в каком оно встретилось в тексте.
+        """
+        prepared = normalize(text)
+        spans = [match.span() for match in self._iter_matches(prepared)]
+        if not spans:
+            return []
+        if len(prepared) == len(text):  # Ничего не удалено - позиции совпадают с исходными.
+            positions = range(len(text))
+        else:  # Восстанавливаем позиции исходного текста (только для текстов с совпадениями).
+            positions = [i for i, ch in enumerate(text) if normalize(ch)]
+            if len(positions) != len(prepared):  # Редкие символы меняют длину при lower().
+                return [(start, end, prepared[start:end]) for start, end in spans]
+        hits = []
+        for start, end in spans:
+            begin, finish = positions[start], positions[end - 1] + 1
+            hits.append((begin, finish, text[begin:finish]))
+        return hits
+
+    def first(self, text):
+        """Возвращает первое слово с ненормативной лексикой (нормализованное) или None."""
+        match = next(self._iter_matches(normalize(text)), None)
+        return match.group() if match else None
+
+    def find_many(self, texts):
+        """Пакетный поиск: список совпадений для каждого текста."""
+        return [self.find_all(text) for text in texts]
+
+    def flags(self, texts):
+        """Пакетная проверка: для каждого текста - есть ли в нём ненормативная лексика."""
+        return [self.first(text) is not None for text in texts]
+# endregion
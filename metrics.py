@@ -0,0 +1,247 @@
+# metrics.py
+"""
+Метрики парсера: счётчики, гистограммы задержек и измеряемые значения (gauge).
+
+Метрики обновляются в горячих местах конвейера (скачивание, разбор, проверка на
+мат, запись в БД и в файл) и стоят одного словарного обращения под блокировкой,
+поэтому их можно собирать всегда. Снаружи они доступны:
+- по HTTP в текстовом формате Prometheus (GET /metrics) и в JSON (GET /metrics.json),
+  см. start_server();
+- периодическим JSON-снимком в файл и короткой строкой в журнале, см. report_periodically().
+
+Метрика задаётся именем и необязательными метками: METRICS.inc('http_responses_total', status=200).
+"""
+import asyncio
+import bisect
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+from aiohttp import web
+
+# region Константы
+# Границы корзин гистограмм задержек (секунд), как у клиентов Prometheus.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)  # Границы корзин для размеров пачек.
+PREFIX = 'parser_'  # Префикс имён метрик в формате Prometheus.
+REPORT_INTERVAL = 10.0  # Интервал периодического снимка (секунд).
+# endregion
+
+log = logging.getLogger(__name__)
+
+
+def _key(name, labels):
+    """Ключ метрики: имя и отсортированные метки."""
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: количество, сумма и распределение значений."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - больше верхней границы.
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины, в которую он попадает)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Реестр метрик (потокобезопасен: поток записи в БД обновляет метрики вместе с циклом событий)."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}  # Ключ -> функция, возвращающая текущее значение.
+
+    def inc(self, name, value=1, **labels):
+        """Увеличивает счётчик."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Добавляет значение в гистограмму."""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Измеряет длительность блока и добавляет её в гистограмму name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def gauge(self, name, function, **labels):
+        """Регистрирует измеряемое значение: function() вызывается при каждом снимке."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = function
+
+    def remove_gauge(self, name, **labels):
+        """Убирает измеряемое значение (например, когда очередь больше не существует)."""
+        with self._lock:
+            self._gauges.pop(_key(name, labels), None)
+
+    def counter(self, name, **labels):
+        """Текущее значение счётчика."""
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def _read_gauges(self):
+        values = {}
+        for key, function in list(self._gauges.items()):
+            try:
+                values[key] = function()
+            except Exception:  # Источник значения уже закрыт - пропускаем.
+                continue
+        return values
+
+    def snapshot(self):
+        """Снимок всех метрик в виде словаря (для JSON)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                          for key, h in self._histograms.items()}
+            gauges = self._read_gauges()
+
+        def name(key):
+            labels = ','.join(f'{label}={value}' for label, value in key[1])
+            return f'{key[0]}{{{labels}}}' if labels else key[0]
+
+        return {
+            'time': time.time(),
+            'uptime': time.time() - self.started,
+            'counters': {name(key): value for key, value in counters.items()},
+            'gauges': {name(key): value for key, value in gauges.items()},
+            'histograms': {name(key): {'count': count, 'sum': total, 'avg': total / count if count else None,
+                                       'p50': p50, 'p95': p95, 'p99': p99}
+                           for key, (count, total, p50, p95, p99) in histograms.items()},
+        }
+
+    def render_prometheus(self):
+        """Все метрики в текстовом формате Prometheus."""
+        def labels(pairs, extra=()):
+            pairs = list(pairs) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{str(v)}"' for k, v in pairs) + '}'
+
+        lines, typed = [], set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+        with self._lock:
+            for (name, pairs), value in sorted(self._counters.items()):
+                declare(name, 'counter')
+                lines.append(f'{PREFIX}{name}{labels(pairs)} {value}')
+            for (name, pairs), value in sorted(self._read_gauges().items()):
+                declare(name, 'gauge')
+                lines.append(f'{PREFIX}{name}{labels(pairs)} {value}')
+            for (name, pairs), histogram in sorted(self._histograms.items()):
+                declare(name, 'histogram')
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{PREFIX}{name}_bucket{labels(pairs, [("le", bound)])} {cumulative}')
+                lines.append(f'{PREFIX}{name}_bucket{labels(pairs, [("le", "+Inf")])} {histogram.count}')
+                lines.append(f'{PREFIX}{name}_sum{labels(pairs)} {histogram.sum}')
+                lines.append(f'{PREFIX}{name}_count{labels(pairs)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()  # Общий реестр процесса.
+
+
+# region Экспорт
+async def start_server(port, host='127.0.0.1', metrics=METRICS):
+    """
+    Запускает HTTP-сервер метрик (GET /metrics - Prometheus, GET /metrics.json - JSON).
+
+    Returns:
+        web.AppRunner (остановка - await runner.cleanup()) или None, если порт занят
+        (например, другим процессом-воркером).
+    """
+    async def prometheus(request):
+        return web.Response(text=metrics.render_prometheus(), content_type='text/plain')
+
+    async def snapshot(request):
+        return web.json_response(metrics.snapshot())
+
+    app = web.Application()
+    app.router.add_get('/metrics', prometheus)
+    app.router.add_get('/metrics.json', snapshot)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        log.warning("Сервер метрик не запущен (порт %s): %s", port, e)
+        await runner.cleanup()
+        return None
+    log.info("Метрики: http://%s:%s/metrics", host, port)
+    return runner
+
+
+def write_snapshot(path, snapshot):
+    """Атомарно записывает JSON-снимок метрик в файл."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+async def report_periodically(interval=REPORT_INTERVAL, path=None, metrics=METRICS):
+    """
+    Каждые interval секунд пишет в журнал строку с темпом обработки и, если задан path, JSON-снимок.
+
+    Скорости (в секунду) считаются по приросту счётчиков за интервал и добавляются в снимок
+    под ключом 'rates'.
+    """
+    previous = metrics.snapshot()
+    while True:
+        await asyncio.sleep(interval)
+        current = metrics.snapshot()
+        elapsed = current['time'] - previous['time']
+        current['rates'] = {name: (value - previous['counters'].get(name, 0)) / elapsed
+                            for name, value in current['counters'].items()}
+        previous = current
+        rates, gauges = current['rates'], current['gauges']
+        log.info("Отзывов сохранено: %d (%.1f/с), запросов: %.1f/с, в работе: %s, очереди: объекты %s, отзывы %s",
+                 current['counters'].get('reviews_saved_total', 0), rates.get('reviews_saved_total', 0.0),
+                 sum(rate for name, rate in rates.items() if name.startswith('http_responses_total')),
+                 gauges.get('http_in_flight', 0), gauges.get('queue_depth{queue=objects}', 0),
+                 gauges.get('queue_depth{queue=reviews}', 0))
+        if path:
+            await asyncio.to_thread(write_snapshot, path, current)
+# endregion
@@ -0,0 +1,272 @@
+# near_duplicates.py
+"""
+Поиск почти-дубликатов отзывов: MinHash-сигнатуры + LSH-индекс.
+
+Отзыв разбивается на символьные шинглы (после нормализации регистра, пунктуации и
+пробелов), по ним строится MinHash-сигнатура. Сигнатура делится на полосы (bands);
+отзывы, совпавшие хотя бы в одной полосе, становятся кандидатами, и для них
+сходство Жаккара оценивается по доле совпавших позиций сигнатуры. Так запрос
+"есть ли в базе отзыв с похожестью не ниже θ" не требует перебора всех отзывов.
+
+Индекс хранится в SQLite-файле рядом с reviews.db и пополняется по мере парсинга.
+
+Пакетный режим (кластеризация уже собранной таблицы reviews на всех ядрах):
+    python near_duplicates.py cluster [--threshold 0.8]
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from text_codec import create_text_storage
+
+# region Константы
+DB_FILE = os.path.join(os.path.dirname(__file__), 'reviews.db')  # База с отзывами.
+LSH_FILE = os.path.join(os.path.dirname(__file__), 'reviews_lsh.db')  # Файл LSH-индекса (рядом с reviews.db).
+SHINGLE_SIZE = 5  # Длина символьного шингла.
+NUM_PERM = 128  # Длина MinHash-сигнатуры.
+BANDS = 16  # Количество полос LSH (NUM_PERM должно делиться на BANDS).
+THRESHOLD = 0.8  # Порог сходства Жаккара, начиная с которого отзывы считаются почти-дубликатами.
+CHUNK_SIZE = 2000  # Размер пачки отзывов в пакетном режиме.
+COMMIT_EVERY = 200  # Как часто фиксировать добавления в индекс при парсинге.
+BUSY_TIMEOUT = 30.0  # Сколько ждать, пока индекс пишет другой процесс-воркер (секунд).
+
+_PRIME = (1 << 31) - 1  # Модуль хеш-функций (a * x + b) mod p; произведение помещается в uint64.
+_rng = np.random.RandomState(20250224)  # Фиксированное зерно: сигнатуры воспроизводимы между запусками.
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+RED = "\033[91m"
+GREEN = "\033[92m"
+BLUE = "\033[94m"
+RESET = "\033[0m"
+# endregion
+
+
+# region Сигнатуры
+def normalize(text):
+    """Приводит текст к нижнему регистру, убирает пунктуацию и схлопывает пробелы."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def shingles(text):
+    """Возвращает множество хешей символьных шинглов нормализованного текста."""
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode('utf-8')) & _PRIME}
+    return {zlib.crc32(text[i:i + SHINGLE_SIZE].encode('utf-8')) & _PRIME
+            for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """Вычисляет MinHash-сигнатуру текста (массив uint32 длины NUM_PERM)."""
+    hashes = np.fromiter(shingles(text), dtype=np.uint64)
+    values = (np.outer(hashes, _PERM_A) + _PERM_B) % _PRIME  # Матрица (шинглы x перестановки).
+    return values.min(axis=0).astype(np.uint32)
+
+
+def similarity(sig_a, sig_b):
+    """Оценка сходства Жаккара по двум сигнатурам."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def band_keys(sig):
+    """Возвращает ключи полос LSH (по одному 63-битному ключу на полосу)."""
+    rows = NUM_PERM // BANDS
+    return [int.from_bytes(hashlib.blake2b(sig[i * rows:(i + 1) * rows].tobytes(), digest_size=8).digest(),
+                           'little') >> 1
+            for i in range(BANDS)]
+# endregion
+
+
+# region LSH-индекс
+class NearDuplicateIndex:
+    """
+    Инкрементальный LSH-индекс почти-дубликатов, хранящийся в SQLite.
+
+    Ключ элемента - дайджест текста отзыва (столбец reviews.text_digest).
+
+    find_or_add, commit и close можно вызывать из разных потоков (asyncio.to_thread):
+    поиск и добавление выполняются под блокировкой, поэтому два похожих отзыва,
+    проверяемых одновременно, не попадут в индекс оба.
+    """
+
+    def __init__(self, path=LSH_FILE, threshold=THRESHOLD, commit_every=COMMIT_EVERY):
+        self.threshold = threshold
+        self.commit_every = commit_every
+        self._lock = threading.RLock()  # add() фиксирует изменения, уже удерживая блокировку.
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS signatures (
+                item BLOB PRIMARY KEY,
+                sig BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                item BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, bucket);
+        ''')
+        self._pending = 0  # Количество незафиксированных добавлений.
+
+    def query(self, sig, exclude=None):
+        """
+        Ищет в индексе элементы, похожие на сигнатуру не меньше threshold.
+
+        Returns:
+            Список кортежей (ключ элемента, оценка сходства), по убыванию сходства.
+        """
+        candidates = set()
+        for band, bucket in enumerate(band_keys(sig)):
+            candidates.update(row[0] for row in self._conn.execute(
+                'SELECT item FROM buckets WHERE band = ? AND bucket = ?', (band, bucket)))
+        candidates.discard(exclude)
+        matches = []
+        for item in candidates:
+            row = self._conn.execute('SELECT sig FROM signatures WHERE item = ?', (item,)).fetchone()
+            if row is None:
+                continue
+            score = similarity(sig, np.frombuffer(row[0], dtype=np.uint32))
+            if score >= self.threshold:
+                matches.append((bytes(item), score))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add(self, item, sig):
+        """Добавляет элемент в индекс (фиксация - пачками по commit_every)."""
+        cursor = self._conn.execute('INSERT OR IGNORE INTO signatures (item, sig) VALUES (?, ?)', (item, sig.tobytes()))
+        if cursor.rowcount:  # Элемент новый - добавляем его в полосы.
+            self._conn.executemany('INSERT INTO buckets (band, bucket, item) VALUES (?, ?, ?)',
+                                   [(band, bucket, item) for band, bucket in enumerate(band_keys(sig))])
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def find_or_add(self, item, text):
+        """Возвращает лучший почти-дубликат текста или None (тогда текст добавляется в индекс)."""
+        sig = signature(text)  # Сигнатура не зависит от индекса - считается без блокировки.
+        with self._lock:
+            matches = self.query(sig, exclude=item)  # Сам элемент мог попасть в индекс в прерванном запуске.
+            if matches:
+                return matches[0]
+            self.add(item, sig)
+        return None
+
+    def save_clusters(self, clusters):
+        """Сохраняет кластеры (списки id отзывов) в таблицу near_duplicate_clusters."""
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS near_duplicate_clusters (
+                review_id INTEGER PRIMARY KEY,
+                cluster_id INTEGER NOT NULL
+            )
+        ''')
+        self._conn.execute('DELETE FROM near_duplicate_clusters')
+        self._conn.executemany('INSERT INTO near_duplicate_clusters (review_id, cluster_id) VALUES (?, ?)',
+                               [(row_id, members[0]) for members in clusters for row_id in members])
+        self.commit()
+
+    def clear(self):
+        """Удаляет все элементы индекса."""
+        self._conn.execute('DELETE FROM buckets')
+        self._conn.execute('DELETE FROM signatures')
+        self._conn.commit()
+
+    def commit(self):
+        """Фиксирует накопленные добавления."""
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        """Фиксирует изменения и закрывает индекс."""
+        with self._lock:
+            self.commit()
+            self._conn.close()
+# endregion
+
+
+# region Пакетная кластеризация
+def _chunk_signatures(rows):
+    """Считает сигнатуры для пачки (id, дайджест, текст); выполняется в процессе пула."""
+    return [(row_id, digest, signature(text)) for row_id, digest, text in rows]
+
+
+def _iter_review_chunks(db_file):
+    """Читает таблицу reviews пачками в порядке rowid."""
+    with sqlite3.connect(db_file) as conn:
+        create_text_storage(conn)  # Тексты могут храниться сжатыми (text_codec.py).
+        last_id = 0
+        while True:
+            rows = conn.execute('''
+                SELECT id, text_digest, review_text(text, text_z) FROM reviews
+                WHERE id > ? AND (text IS NOT NULL OR text_z IS NOT NULL) AND text_digest IS NOT NULL
+                ORDER BY id LIMIT ?
+            ''', (last_id, CHUNK_SIZE)).fetchall()
+            if not rows:
+                return
+            yield [(row_id, bytes(digest), text) for row_id, digest, text in rows]
+            last_id = rows[-1][0]
+
+
+def cluster_reviews(db_file=DB_FILE, lsh_file=LSH_FILE, threshold=THRESHOLD, workers=None):
+    """
+    Перестраивает LSH-индекс по таблице reviews и группирует почти-дубликаты в кластеры.
+
+    Сигнатуры считаются в пуле процессов (по умолчанию - по числу ядер). Результат
+    записывается в таблицу near_duplicate_clusters файла индекса: для каждого отзыва,
+    у которого есть почти-дубликаты, - id кластера (минимальный id отзыва в кластере).
+
+    Returns:
+        Список кластеров (списков id отзывов) размером больше одного.
+    """
+    index = NearDuplicateIndex(lsh_file, threshold)
+    index.clear()
+    parent = {}  # Система непересекающихся множеств по id отзывов.
+    id_by_item = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in pool.map(_chunk_signatures, _iter_review_chunks(db_file)):
+            for row_id, digest, sig in chunk:
+                parent[row_id] = row_id
+                id_by_item[digest] = row_id
+                for item, _ in index.query(sig, exclude=digest):
+                    root_a, root_b = find(row_id), find(id_by_item[item])
+                    if root_a != root_b:
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+                index.add(digest, sig)
+    index.commit()
+
+    clusters = {}
+    for row_id in parent:
+        clusters.setdefault(find(row_id), []).append(row_id)
+    clusters = sorted(sorted(members) for members in clusters.values() if len(members) > 1)
+    index.save_clusters(clusters)
+    index.close()
+    return clusters
+# endregion
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поиск почти-дубликатов отзывов (MinHash LSH).")
+    parser.add_argument('command', choices=['cluster'], help="cluster - перестроить индекс и сгруппировать дубликаты")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="порог сходства Жаккара")
+    parser.add_argument('--workers', type=int, default=None, help="количество процессов (по умолчанию - все ядра)")
+    args = parser.parse_args()
+
+    found = cluster_reviews(threshold=args.threshold, workers=args.workers)
+    print(f"{BLUE}Найдено кластеров почти-дубликатов: {len(found)}, "
+          f"отзывов в них: {sum(len(members) for members in found)}{RESET}")
@@ -0,0 +1,240 @@
+# rate_control.py
+"""
+Адаптивное управление HTTP-запросами: частота, параллельность, повторы.
+
+Для каждого хоста заводятся:
+- корзина токенов (TokenBucket) - средняя частота запросов не выше rate в секунду,
+  допускаются всплески до burst запросов;
+- адаптивный лимит одновременных запросов (AIMDLimiter): после каждого быстрого
+  успешного ответа лимит растёт примерно на единицу за "окно" из limit запросов
+  (аддитивное увеличение), а при ответах 429/5xx, таймаутах, обрывах соединения и
+  ответах медленнее latency_target - уменьшается вдвое (мультипликативное
+  уменьшение, не чаще раза в cooldown секунд).
+
+Так парсер сам находит наибольшую скорость, которую выдерживает сайт, вместо
+подобранной вручную константы.
+
+Запросы с ответом 429/5xx и сетевыми ошибками повторяются до max_retries раз с
+экспоненциальной задержкой и случайным разбросом (full jitter); заголовок
+Retry-After соблюдается и приостанавливает все запросы к хосту.
+"""
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from metrics import METRICS
+
+# region Константы
+REQUESTS_PER_SECOND = 50.0  # Средняя частота запросов к одному хосту (None - без ограничения).
+BURST = 10  # Сколько запросов можно отправить подряд без ожидания.
+INITIAL_CONCURRENCY = 5  # Начальный лимит одновременных запросов к хосту.
+MIN_CONCURRENCY = 1  # Нижняя граница адаптивного лимита.
+MAX_CONCURRENCY = 32  # Верхняя граница адаптивного лимита.
+LATENCY_TARGET = 5.0  # Ответ медленнее этого считается признаком перегрузки (секунд).
+DECREASE_FACTOR = 0.5  # Во сколько раз уменьшается лимит при перегрузке.
+DECREASE_COOLDOWN = 2.0  # Лимит уменьшается не чаще раза за этот интервал (секунд).
+MAX_RETRIES = 4  # Сколько раз повторять запрос после ошибки.
+BACKOFF_BASE = 0.5  # Базовая задержка перед повтором (секунд); удваивается с каждой попыткой.
+BACKOFF_MAX = 30.0  # Наибольшая задержка перед повтором (секунд).
+RETRY_AFTER_MAX = 300.0  # Наибольшее ожидание по заголовку Retry-After (секунд).
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})  # Ответы, после которых запрос повторяется.
+# endregion
+
+log = logging.getLogger(__name__)
+
+
+def parse_retry_after(value):
+    """Возвращает задержку из заголовка Retry-After (секунды или HTTP-дата) или None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Экспоненциальная задержка со случайным разбросом от 0 до base * 2**attempt (не больше cap)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Корзина токенов: не больше rate запросов в секунду в среднем, всплески до burst."""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0  # До этого момента запросы не отправляются (Retry-After).
+
+    async def acquire(self):
+        """Дожидается токена (и окончания паузы, если она назначена)."""
+        while True:
+            now = time.monotonic()
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = self.paused_until - now
+            if wait <= 0:
+                if not self.rate or self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Приостанавливает выдачу токенов на seconds секунд."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AIMDLimiter:
+    """Ограничение одновременных запросов с адаптивным лимитом (аддитивное увеличение, мультипликативное уменьшение)."""
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY,
+                 latency_target=LATENCY_TARGET, cooldown=DECREASE_COOLDOWN):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """Занимает слот, когда число запросов в работе меньше текущего лимита."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        """Освобождает слот."""
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    async def on_success(self, latency):
+        """Учитывает успешный ответ: медленный ответ уменьшает лимит, быстрый - увеличивает."""
+        if latency > self.latency_target:
+            self.on_overload()
+            return
+        if self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            async with self._condition:
+                self._condition.notify_all()
+
+    def on_overload(self):
+        """Учитывает признак перегрузки сайта: уменьшает лимит (не чаще раза в cooldown секунд)."""
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+
+
+class RequestController:
+    """
+    Выполняет GET-запросы с ограничением частоты и параллельности по хостам и с повторами.
+
+    Создаётся внутри работающего цикла событий и используется только из него.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=BURST, initial=INITIAL_CONCURRENCY,
+                 minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.rate = rate
+        self.burst = burst
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_retries = max_retries
+        self.requests = 0  # Сколько запросов отправлено (с повторами).
+        self._hosts = {}  # Хост -> (TokenBucket, AIMDLimiter).
+
+    def host(self, url):
+        """Возвращает корзину токенов и лимитер хоста (создаёт их при первом обращении)."""
+        name = urlsplit(url).netloc
+        state = self._hosts.get(name)
+        if state is None:
+            state = self._hosts[name] = (TokenBucket(self.rate, self.burst),
+                                         AIMDLimiter(self.initial, self.minimum, self.maximum))
+        return state
+
+    def limits(self):
+        """Текущие лимиты одновременных запросов по хостам."""
+        return {name: limiter.limit for name, (_, limiter) in self._hosts.items()}
+
+    def total_limit(self):
+        """Сумма лимитов одновременных запросов по всем хостам."""
+        return sum(int(limiter.limit) for _, limiter in self._hosts.values())
+
+    def in_flight(self):
+        """Сколько запросов выполняется сейчас (по всем хостам)."""
+        return sum(limiter.in_flight for _, limiter in self._hosts.values())
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url):
+        """Занимает слот хоста и токен на время одного запроса."""
+        bucket, limiter = self.host(url)
+        await limiter.acquire()
+        try:
+            await bucket.acquire()
+            yield bucket, limiter
+        finally:
+            await limiter.release()
+
+    async def get(self, session, url, headers=None):
+        """
+        Выполняет GET-запрос с повторами и возвращает (статус, текст, заголовки ответа).
+
+        Ответы 429/5xx, таймауты и сетевые ошибки повторяются; после max_retries повторов
+        выбрасывается последнее исключение (ClientResponseError для HTTP-статуса).
+        Остальные ответы с кодом 4xx сразу приводят к ClientResponseError.
+        """
+        for attempt in range(self.max_retries + 1):
+            async with self.slot(url) as (bucket, limiter):
+                self.requests += 1
+                started = time.monotonic()
+                try:
+                    async with session.get(url, headers=headers) as response:
+                        METRICS.inc('http_responses_total', status=response.status)
+                        if response.status not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            text = await response.text()
+                            latency = time.monotonic() - started
+                            METRICS.observe('http_request_seconds', latency)
+                            await limiter.on_success(latency)
+                            return response.status, text, response.headers
+                        limiter.on_overload()
+                        if attempt == self.max_retries:
+                            response.raise_for_status()
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        if retry_after is not None:  # Сайт сам назвал паузу - соблюдаем её для всего хоста.
+                            delay = min(retry_after, RETRY_AFTER_MAX)
+                            bucket.pause(delay)
+                        else:
+                            delay = backoff_delay(attempt)
+                        reason = f"HTTP {response.status}"
+                except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                    METRICS.inc('http_errors_total', error=type(e).__name__)
+                    limiter.on_overload()
+                    if attempt == self.max_retries:
+                        raise
+                    delay = backoff_delay(attempt)
+                    reason = str(e) or type(e).__name__
+            METRICS.inc('http_retries_total')
+            log.warning("Повтор %d/%d через %.1f с: %s: %s", attempt + 1, self.max_retries, delay, url, reason)
+            await asyncio.sleep(delay)
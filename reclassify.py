@@ -0,0 +1,132 @@
+# reclassify.py
+"""
+Пересчёт признака мата (reviews.has_mat) после изменения mat_words.txt.
+
+Каждая строка reviews хранит mat_version - версию правил и хэш списка слов, с которыми
+она классифицирована (MatMatcher.version; при парсинге записывается сразу). Задание
+делит таблицу на диапазоны rowid по CHUNK_ROWS и обрабатывает их в пуле процессов:
+процесс сам читает тексты своего диапазона (сжатые распаковываются функцией
+review_text), классифицирует их и возвращает только строки, у которых признак
+изменился. Основной процесс записывает изменения и метку версии диапазона одной
+транзакцией на диапазон.
+
+Строки с текущей версией не читаются повторно, поэтому прерванное задание при
+следующем запуске продолжается с того места, где остановилось, а повторный запуск
+без изменения списка слов ничего не делает. Сводные таблицы статистики
+обновляются триггерами только для изменившихся строк.
+
+Запуск:
+    python reclassify.py [--workers 8] [--chunk 20000]
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from logs import SUCCESS, setup_logging
+from mat_matcher import MAT_WORDS_FILE, MatMatcher
+from text_codec import create_text_storage, register
+
+# region Константы
+DB_FILE = os.path.join(os.path.dirname(__file__), 'reviews.db')  # База с отзывами.
+CHUNK_ROWS = 20000  # Ширина диапазона rowid, обрабатываемого одной задачей пула.
+BUSY_TIMEOUT = 30.0  # Сколько ждать, пока парсер держит блокировку записи (секунд).
+REPORT_EVERY = 10  # Выводить ход работы каждые столько диапазонов.
+
+# Строки диапазона, классифицированные не текущей версией списка слов.
+_STALE = 'id >= ? AND id < ? AND (mat_version IS NULL OR mat_version != ?)'
+# endregion
+
+log = logging.getLogger(__name__)
+
+_worker = {}  # Состояние процесса пула: соединение с базой и скомпилированный поиск.
+
+
+def migrate_mat_version(conn):
+    """Добавляет в reviews столбец mat_version (повторный вызов безопасен)."""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(reviews)')]
+    if 'mat_version' not in columns:
+        conn.execute('ALTER TABLE reviews ADD COLUMN mat_version TEXT')
+
+
+# region Процесс пула
+def _init_worker(db_file, matcher):
+    """Открывает соединение только для чтения и сохраняет поиск в состоянии процесса."""
+    conn = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True, timeout=BUSY_TIMEOUT)
+    register(conn)
+    _worker.update(conn=conn, matcher=matcher)
+
+
+def _classify_range(task):
+    """
+    Классифицирует устаревшие строки диапазона [start, end).
+
+    Returns:
+        (start, end, количество проверенных строк, список (id, новый has_mat) изменившихся строк).
+    """
+    start, end, version = task
+    matcher = _worker['matcher']
+    rows = _worker['conn'].execute(f'SELECT id, review_text(text, text_z), has_mat FROM reviews WHERE {_STALE}',
+                                   (start, end, version))
+    checked, changed = 0, []
+    for row_id, text, has_mat in rows:
+        checked += 1
+        flag = text is not None and matcher.first(text) is not None
+        if flag != bool(has_mat):
+            changed.append((row_id, flag))
+    return start, end, checked, changed
+# endregion
+
+
+def reclassify(db_file=DB_FILE, words_file=MAT_WORDS_FILE, workers=None, chunk=CHUNK_ROWS):
+    """
+    Пересчитывает has_mat для строк, классифицированных другой версией списка слов.
+
+    Returns:
+        Словарь: checked - проверено строк, changed - изменено, version - текущая версия.
+    """
+    matcher = MatMatcher.load(words_file)
+    with sqlite3.connect(db_file, timeout=BUSY_TIMEOUT) as conn:
+        create_text_storage(conn)  # Старые базы: столбец text_z для review_text().
+        migrate_mat_version(conn)
+        first, last = conn.execute('SELECT MIN(id), MAX(id) FROM reviews').fetchone()
+    totals = {'checked': 0, 'changed': 0, 'version': matcher.version}
+    if first is None:
+        return totals
+    # Диапазоны фиксируются при запуске: отзывы, добавленные позже, парсер классифицирует сам.
+    tasks = [(start, start + chunk, matcher.version) for start in range(first, last + 1, chunk)]
+    started = time.monotonic()
+    conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db_file, matcher)) as pool:
+            for done, (start, end, checked, changed) in enumerate(pool.map(_classify_range, tasks), 1):
+                with conn:  # Изменения и метка версии диапазона - одна транзакция.
+                    conn.executemany('UPDATE reviews SET has_mat = ? WHERE id = ?',
+                                     [(flag, row_id) for row_id, flag in changed])
+                    conn.execute(f'UPDATE reviews SET mat_version = ? WHERE {_STALE}',
+                                 (matcher.version, start, end, matcher.version))
+                totals['checked'] += checked
+                totals['changed'] += len(changed)
+                if done % REPORT_EVERY == 0:
+                    log.info("Диапазонов: %d/%d, проверено строк: %d (%.0f/с), изменено: %d", done, len(tasks),
+                             totals['checked'], totals['checked'] / (time.monotonic() - started), totals['changed'])
+    finally:
+        conn.close()
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пересчёт признака мата после изменения mat_words.txt.")
+    parser.add_argument('--db', default=DB_FILE, help="база с отзывами")
+    parser.add_argument('--words', default=MAT_WORDS_FILE, help="список ненормативных слов")
+    parser.add_argument('--workers', type=int, default=None, help="количество процессов (по умолчанию - все ядра)")
+    parser.add_argument('--chunk', type=int, default=CHUNK_ROWS, help="ширина диапазона rowid одной задачи")
+    args = parser.parse_args()
+    setup_logging()
+    begin = time.monotonic()
+    result = reclassify(args.db, args.words, args.workers, args.chunk)
+    log.log(SUCCESS, "Версия списка слов %s: проверено %d отзывов, признак изменён у %d (%.1f с)",
+            result['version'], result['checked'], result['changed'], time.monotonic() - begin)
@@ -0,0 +1,172 @@
+# reviews_file.py
+"""
+Текстовый файл отзывов (reviews.txt) и его индекс.
+
+Отзывы дописываются в конец файла пачками через один открытый буферизованный файл.
+Рядом с файлом хранится компактный индекс (reviews.txt.idx): для каждой записи -
+смещение в байтах, длина в байтах и 16-байтовый дайджест текста. При запуске
+множество дайджестов читается из индекса, а разбирается только хвост файла,
+ещё не попавший в индекс (например, дописанный старой версией парсера).
+
+Формат индекса: заголовок INDEX_MAGIC, затем записи RECORD (смещение uint64,
+длина uint32, дайджест 16 байт), little-endian.
+"""
+import contextlib
+import os
+import re
+import struct
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка файла недоступна, пишет только один процесс.
+    fcntl = None
+
+# region Константы
+INDEX_SUFFIX = '.idx'  # Индекс хранится рядом с файлом отзывов: reviews.txt.idx.
+INDEX_MAGIC = b'RVWIDX01'  # Заголовок файла индекса (версия формата).
+RECORD = struct.Struct('<QI16s')  # Запись индекса: смещение, длина, дайджест текста.
+FSYNC_POLICY = 'interval'  # 'never' - полагаться на ОС, 'batch' - после каждой пачки, 'interval' - не чаще FSYNC_INTERVAL.
+FSYNC_INTERVAL = 5.0  # Интервал fsync для политики 'interval' (секунд).
+
+# Запись в reviews.txt (формат исходной save_to_file). Текст может содержать переводы строк.
+_RECORD_RE = re.compile(rb'Source Text: \nRephrased Text: (.*?)\nLength: (\d+)\n\n', re.DOTALL)
+# endregion
+
+
+def format_review(text):
+    """Возвращает запись отзыва в формате reviews.txt."""
+    return f"Source Text: \nRephrased Text: {text}\nLength: {len(text)}\n\n"
+
+
+# region Индекс
+def _parse_records(data, base_offset, digest):
+    """Разбирает записи reviews.txt из байтов и возвращает их упакованные записи индекса."""
+    records = []
+    for match in _RECORD_RE.finditer(data):
+        text = match.group(1).decode('utf-8', errors='replace')
+        records.append(RECORD.pack(base_offset + match.start(), match.end() - match.start(), digest(text)))
+    return records
+
+
+def _read_index(index_path):
+    """Читает записи индекса (без заголовка) или None, если индекса нет или он чужого формата."""
+    try:
+        with open(index_path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if not data.startswith(INDEX_MAGIC):
+        return None
+    data = data[len(INDEX_MAGIC):]
+    return data[:len(data) - len(data) % RECORD.size]  # Недописанная последняя запись отбрасывается.
+
+
+def sync_index(path, digest):
+    """
+    Приводит индекс в соответствие с файлом отзывов и возвращает записи индекса (байты).
+
+    Если индекс покрывает только начало файла, разбирается и индексируется хвост;
+    если индекс повреждён или файл короче индекса (файл заменён), индекс строится заново.
+
+    Args:
+        path: Путь к файлу отзывов.
+        digest: Функция, вычисляющая дайджест текста отзыва.
+    """
+    index_path = path + INDEX_SUFFIX
+    file_size = os.path.getsize(path) if os.path.exists(path) else 0
+    records = _read_index(index_path)
+    indexed_size = 0
+    if records:
+        offset, length, _ = RECORD.unpack_from(records, len(records) - RECORD.size)
+        indexed_size = offset + length
+    if records is None or indexed_size > file_size:  # Индекса нет или он не от этого файла - строим заново.
+        records, indexed_size = b'', 0
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+        os.replace(tmp_path, index_path)
+    elif len(records) + len(INDEX_MAGIC) != os.path.getsize(index_path):  # Обрезаем недописанную запись.
+        with open(index_path, 'r+b') as f:
+            f.truncate(len(INDEX_MAGIC) + len(records))
+    if file_size > indexed_size:  # Хвост файла ещё не проиндексирован.
+        with open(path, 'rb') as f:
+            f.seek(indexed_size)
+            tail = _parse_records(f.read(), indexed_size, digest)
+        with open(index_path, 'ab') as f:
+            f.write(b''.join(tail))
+        records += b''.join(tail)
+    return records
+
+
+def load_digests(path, digest):
+    """Возвращает множество дайджестов текстов всех отзывов файла (по индексу)."""
+    records = sync_index(path, digest)
+    return {records[i + 12:i + RECORD.size] for i in range(0, len(records), RECORD.size)}
+# endregion
+
+
+# region Запись
+class ReviewsFileWriter:
+    """
+    Буферизованная запись отзывов в конец файла с одновременным пополнением индекса.
+
+    Файл и индекс открываются один раз; запись выполняется пачками (write_batch).
+    Индекс дописывается после текста, поэтому он никогда не ссылается на
+    незаписанные данные; записи, не попавшие в индекс при сбое, будут
+    проиндексированы при следующем запуске (sync_index). Пачка пишется под
+    блокировкой файла (flock), поэтому в файл могут писать несколько процессов.
+    """
+
+    def __init__(self, path, digest, fsync_policy=FSYNC_POLICY, fsync_interval=FSYNC_INTERVAL):
+        if fsync_policy not in ('never', 'batch', 'interval'):
+            raise ValueError(f"Неизвестная политика fsync: {fsync_policy}")
+        self.digest = digest
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._file = open(path, 'ab')
+        with self._locked():
+            sync_index(path, digest)
+        self._index = open(path + INDEX_SUFFIX, 'ab')
+        self._last_fsync = time.monotonic()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Монопольная блокировка файла отзывов на время записи пачки (между процессами)."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def write_batch(self, texts):
+        """Дописывает пачку отзывов в файл и индекс (блокирующий вызов)."""
+        chunks = [format_review(text).encode('utf-8') for text in texts]
+        digests = [self.digest(text) for text in texts]
+        with self._locked():
+            offset = os.fstat(self._file.fileno()).st_size  # Конец файла (другие процессы могли дописать).
+            records = []
+            for chunk, text_digest in zip(chunks, digests):
+                records.append(RECORD.pack(offset, len(chunk), text_digest))
+                offset += len(chunk)
+            self._file.write(b''.join(chunks))
+            self._file.flush()
+            now = time.monotonic()
+            if self.fsync_policy == 'batch' or (
+                    self.fsync_policy == 'interval' and now - self._last_fsync >= self.fsync_interval):
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+            self._index.write(b''.join(records))
+            self._index.flush()
+
+    def close(self):
+        """Сбрасывает буферы на диск и закрывает файлы."""
+        self._file.flush()
+        if self.fsync_policy != 'never':
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._index.close()
+# endregion
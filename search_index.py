@@ -0,0 +1,158 @@
+# search_index.py
+"""
+Полнотекстовый индекс отзывов (SQLite FTS5).
+
+Виртуальная таблица reviews_fts хранит только инвертированный индекс по текстам
+отзывов (external content: сам текст берётся из reviews.text через представление
+reviews_fts_source и не дублируется) и поддерживается триггерами на таблице
+reviews. Представление и триггеры используют только столбец text и встроенные
+функции SQLite, поэтому база работает с любым клиентом (sqlite3, DB Browser и т.п.).
+
+Тексты, хранящиеся сжатыми (text_codec.py, reviews.text = NULL), триггеры
+пропускают: их добавляет в индекс писатель (db_writer.py) через index_texts(), а
+rebuild_search_index() - распаковывая их в Python. Переход текста между text и
+text_z (сжатие и распаковка существующей базы) индекс не меняет. Фрагменты текста
+для сжатых отзывов строит search_reviews() в statistics.py (text_snippet()).
+
+Токенизатор unicode61 приводит кириллицу к нижнему регистру, но "ё" для него -
+отдельная буква (remove_diacritics её не трогает). Поэтому "ё" заменяется на "е"
+и в индексируемом тексте (FOLD_SQL в представлении и триггерах, fold_text() для
+сжатых текстов), и в словах запроса: "ёлка" и "елка" находят друг друга.
+Фрагменты snippet() показывают текст уже с этой заменой. Стемминга для русского
+в SQLite нет, поэтому словоформы ищутся по префиксу (search_reviews(...,
+prefix=True)), а префиксные индексы ускоряют такие запросы.
+"""
+import re
+
+from text_codec import create_text_storage
+
+# region Константы
+FTS_TABLE = 'reviews_fts'  # Имя виртуальной таблицы.
+FTS_CONTENT = 'reviews_fts_source'  # Представление-источник текстов (reviews.text с заменой "ё").
+FTS_TOKENIZER = 'unicode61 remove_diacritics 2'  # Регистр и диакритика латиницы не учитываются.
+FOLD_SQL = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"  # Замена "ё" встроенными функциями SQLite.
+FTS_PREFIXES = '3 4 5'  # Длины префиксов, для которых строятся отдельные индексы.
+SNIPPET_MARKS = ('[', ']', '...')  # Выделение найденных слов и пропусков во фрагментах.
+
+# Триггеры синхронизации: строки со сжатым текстом (text IS NULL) пропускаются.
+_NEW_TEXT, _OLD_TEXT = FOLD_SQL.format('NEW.text'), FOLD_SQL.format('OLD.text')
+FTS_TRIGGERS = {
+    'trg_reviews_fts_insert': f'''CREATE TRIGGER trg_reviews_fts_insert AFTER INSERT ON reviews
+        WHEN NEW.text IS NOT NULL
+        BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, text) VALUES (NEW.id, {_NEW_TEXT});
+        END''',
+    'trg_reviews_fts_delete': f'''CREATE TRIGGER trg_reviews_fts_delete AFTER DELETE ON reviews
+        WHEN OLD.text IS NOT NULL
+        BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text) VALUES ('delete', OLD.id, {_OLD_TEXT});
+        END''',
+    'trg_reviews_fts_update': f'''CREATE TRIGGER trg_reviews_fts_update AFTER UPDATE OF text ON reviews
+        WHEN OLD.text IS NOT NULL AND NEW.text IS NOT NULL
+        BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text) VALUES ('delete', OLD.id, {_OLD_TEXT});
+            INSERT INTO {FTS_TABLE} (rowid, text) VALUES (NEW.id, {_NEW_TEXT});
+        END''',
+}
+# endregion
+
+
+def create_search_index(conn):
+    """
+    Создаёт таблицу FTS5 и триггеры синхронизации (повторный вызов безопасен).
+
+    Если таблицы ещё не было, индекс сразу строится по существующим отзывам. Индекс
+    с другим источником текстов пересоздаётся, триггеры прежних версий заменяются.
+    """
+    create_text_storage(conn)  # Столбец text_z (нужен для сжатых отзывов) и функция review_text.
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (FTS_TABLE,)).fetchone()
+    if row is not None and f"content='{FTS_CONTENT}'" not in row[0]:
+        conn.execute(f'DROP TABLE {FTS_TABLE}')
+        row = None
+    conn.execute(f"CREATE VIEW IF NOT EXISTS {FTS_CONTENT} AS SELECT id, {FOLD_SQL.format('text')} AS text FROM reviews")
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            text, content='{FTS_CONTENT}', content_rowid='id', tokenize='{FTS_TOKENIZER}', prefix='{FTS_PREFIXES}'
+        )
+    ''')
+    existing = dict(conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'reviews'"))
+    for name, sql in FTS_TRIGGERS.items():
+        if existing.get(name) != sql:
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+            conn.execute(sql)
+    if row is None:
+        rebuild_search_index(conn)
+
+
+def fold_text(text):
+    """Заменяет "ё" на "е" так же, как FOLD_SQL в представлении и триггерах индекса."""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def index_texts(conn, rows):
+    """Добавляет в индекс тексты сжатых отзывов: rows - пары (id, текст); триггеры такие строки пропускают."""
+    conn.executemany(f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (?, ?)',
+                     [(row_id, fold_text(text)) for row_id, text in rows])
+
+
+def rebuild_search_index(conn):
+    """Перестраивает полнотекстовый индекс по таблице reviews (сжатые тексты распаковываются в Python)."""
+    create_text_storage(conn)
+    with conn:
+        conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")  # Несжатые тексты.
+        rows = conn.execute(
+            'SELECT id, review_text(text, text_z) FROM reviews WHERE text IS NULL AND text_z IS NOT NULL').fetchall()
+        # 'rebuild' добавил сжатые строки пустыми документами: убираем их, иначе они учтутся в bm25 дважды.
+        conn.executemany(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text) VALUES ('delete', ?, NULL)",
+                         [(row_id,) for row_id, _ in rows])
+        index_texts(conn, rows)
+
+
+def build_match_query(query, prefix=False):
+    """
+    Превращает пользовательский запрос в выражение MATCH.
+
+    Каждое слово берётся в кавычки (операторы и пунктуация FTS5 в запросе не
+    интерпретируются), слова объединяются через AND. prefix=True добавляет к словам
+    "*", чтобы находить другие словоформы ("кофеварк" -> "кофеварка", "кофеварку").
+    "ё" в словах заменяется на "е", как и в индексе.
+
+    Returns:
+        Строка для MATCH или None, если в запросе нет слов.
+    """
+    words = re.findall(r'\w+', fold_text(query.lower()))
+    if not words:
+        return None
+    suffix = '*' if prefix else ''
+    return ' '.join(f'"{word}"{suffix}' for word in words)
+
+
+def text_snippet(text, query, prefix=False, tokens=16):
+    """
+    Фрагмент текста вокруг первого найденного слова запроса в разметке snippet() FTS5.
+
+    Используется для отзывов, текст которых хранится сжатым: snippet() читает текст
+    из reviews.text и для них возвращает пустую строку. Слова сравниваются без учёта
+    "ё", как в индексе, но фрагмент сохраняет исходное написание.
+    """
+    words = re.findall(r'\w+', fold_text(query.lower()))
+    found = list(re.finditer(r'\w+', text))
+
+    def matches(token):
+        token = fold_text(token.lower())
+        return any(token.startswith(word) if prefix else token == word for word in words)
+
+    first = next((i for i, token in enumerate(found) if matches(token.group())), 0)
+    start = max(0, min(first - tokens // 4, len(found) - tokens))
+    window = found[start:start + tokens]
+    if not window:
+        return ''
+    opening, closing, ellipsis = SNIPPET_MARKS
+    parts, position = [], window[0].start()
+    for token in window:
+        parts.append(text[position:token.start()])
+        parts.append(f'{opening}{token.group()}{closing}' if matches(token.group()) else token.group())
+        position = token.end()
+    return ((ellipsis if start > 0 else '') + ''.join(parts)
+            + (ellipsis if start + tokens < len(found) else text[position:]))
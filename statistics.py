@@ -1,5 +1,12 @@
 # Statistics.py
+import os
+import pathlib
 import sqlite3
+import sys
+
+from search_index import FTS_TABLE, build_match_query, create_search_index, text_snippet
+from summary_tables import SUMMARIES, create_summary_tables, rebuild_summary_tables
+from text_codec import register
 
 # region Константы
 DB_FILE = "reviews.db"  # Путь к файлу базы данных
@@ -10,9 +17,47 @@ RED = "\033[91m"
 GREEN = "\033[92m"
 BLUE = "\033[94m"
 RESET = "\033[0m"
+
+SEARCH_PAGE_SIZE = 20  # Количество результатов поиска на странице.
+SNIPPET_TOKENS = 16  # Длина фрагмента текста в результатах поиска (в словах).
 # endregion
 
 # region Вспомогательные функции
+_connections = {}  # Открытые соединения по пути к БД (переиспользуются между запросами).
+
+
+def get_connection(db_file=DB_FILE):
+    """
+    Возвращает долгоживущее соединение с базой только для чтения (открывает его при первом обращении).
+
+    Схему (сводные таблицы, полнотекстовый индекс) создают main.create_db и команда
+    rebuild; здесь она только проверяется, поэтому запросы не берут блокировку записи
+    во время обхода и работают с базой, доступной только для чтения.
+
+    Raises:
+        sqlite3.OperationalError: Базы нет или в ней нет таблиц статистики.
+    """
+    conn = _connections.get(db_file)
+    if conn is None:
+        if not os.path.exists(db_file):
+            raise sqlite3.OperationalError(f"Нет базы {db_file}: сначала соберите отзывы запуском main.py")
+        uri = pathlib.Path(db_file).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = [table for table in ('reviews', FTS_TABLE, *(table for table, _, _, _ in SUMMARIES))
+                   if table not in tables]
+        if not missing and 'text_z' not in {row[1] for row in conn.execute('PRAGMA table_info(reviews)')}:
+            missing.append('reviews.text_z')
+        if missing:
+            conn.close()
+            raise sqlite3.OperationalError(
+                f"В базе {db_file} нет {', '.join(missing)}: создайте схему запуском main.py "
+                f"или командой python statistics.py rebuild")
+        register(conn)  # Тексты могут храниться сжатыми.
+        _connections[db_file] = conn
+    return conn
+
+
 def execute_query(query, params=None, db_file=DB_FILE):
     """
     Выполняет SQL-запрос к базе данных и возвращает результат.
@@ -27,25 +72,40 @@ def execute_query(query, params=None, db_file=DB_FILE):
         Результат запроса (список кортежей) или None в случае ошибки.
     """
     try:
-        with sqlite3.connect(db_file) as conn:  # Подключаемся к БД.
-            cursor = conn.cursor()  # Создаем курсор.
-            if params:
-                cursor.execute(query, params)  # Выполняем запрос с параметрами.
-            else:
-                cursor.execute(query)  # Выполняем запрос без параметров.
-            return cursor.fetchall()  # Возвращаем результат запроса.
+        cursor = get_connection(db_file).cursor()  # Создаем курсор.
+        if params:
+            cursor.execute(query, params)  # Выполняем запрос с параметрами.
+        else:
+            cursor.execute(query)  # Выполняем запрос без параметров.
+        return cursor.fetchall()  # Возвращаем результат запроса.
     except sqlite3.Error as e:
         print(f"{RED}Ошибка при выполнении SQL-запроса: {e}{RESET}")
         return None  # Возвращаем None в случае ошибки.
 
 
+def rebuild_statistics(db_file=DB_FILE):
+    """
+    Создаёт недостающие таблицы статистики и полнотекстовый индекс (старая база) и
+    пересчитывает сводные таблицы по таблице reviews.
+    """
+    conn = sqlite3.connect(db_file)  # Отдельное соединение с правом записи.
+    try:
+        create_summary_tables(conn)
+        create_search_index(conn)
+        rebuild_summary_tables(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
 # endregion
 
 # region Функции статистики
+# Все счётчики читаются из сводных таблиц (summary_tables.py), которые обновляются триггерами.
 
 def get_total_reviews_count(db_file=DB_FILE):
     """Возвращает общее количество отзывов в базе данных."""
-    query = "SELECT COUNT(*) FROM reviews"  # SQL-запрос для подсчета всех записей.
+    query = "SELECT COALESCE(SUM(count), 0) FROM stats_by_mat"  # Не больше двух строк: с матом и без.
     result = execute_query(query, db_file=db_file)  # Выполняем запрос.
     if result:
         return result[0][0]  # Возвращаем первый элемент первого кортежа (общее количество).
@@ -64,10 +124,10 @@ def get_reviews_count_by_length(min_length, max_length=None, db_file=DB_FILE):
         Количество отзывов, удовлетворяющих условию.
     """
     if max_length is None:
-        query = "SELECT COUNT(*) FROM reviews WHERE length >= ?"  # Запрос без верхнего ограничения.
+        query = "SELECT COALESCE(SUM(count), 0) FROM stats_by_length WHERE length >= ?"  # Без верхнего ограничения.
         params = (min_length,)
     else:
-        query = "SELECT COUNT(*) FROM reviews WHERE length >= ? AND length <= ?"  # Запрос с верхним ограничением.
+        query = "SELECT COALESCE(SUM(count), 0) FROM stats_by_length WHERE length >= ? AND length <= ?"
         params = (min_length, max_length)
     result = execute_query(query, params, db_file=db_file)
     if result:
@@ -77,7 +137,7 @@ def get_reviews_count_by_length(min_length, max_length=None, db_file=DB_FILE):
 
 def get_reviews_count_with_mat(db_file=DB_FILE):
     """Возвращает количество отзывов, содержащих ненормативную лексику."""
-    query = "SELECT COUNT(*) FROM reviews WHERE has_mat = 1"  # has_mat - это BOOLEAN (0 или 1).
+    query = "SELECT count FROM stats_by_mat WHERE has_mat = 1"  # has_mat - это BOOLEAN (0 или 1).
     result = execute_query(query, db_file=db_file)
     if result:
         return result[0][0]
@@ -86,7 +146,7 @@ def get_reviews_count_with_mat(db_file=DB_FILE):
 
 def get_reviews_count_by_category(category, db_file=DB_FILE):
     """Возвращает количество отзывов в заданной категории."""
-    query = "SELECT COUNT(*) FROM reviews WHERE category = ?"  # Используем параметризованный запрос.
+    query = "SELECT count FROM stats_by_category WHERE category = ?"  # Используем параметризованный запрос.
     params = (category,)  # Параметры передаются в виде кортежа.
     result = execute_query(query, params, db_file=db_file)
     if result:
@@ -96,7 +156,7 @@ def get_reviews_count_by_category(category, db_file=DB_FILE):
 
 def get_reviews_count_by_object(object_url, db_file=DB_FILE):
     """Возвращает количество отзывов для заданного объекта (по URL)."""
-    query = "SELECT COUNT(*) FROM reviews WHERE object_url = ?"
+    query = "SELECT count FROM stats_by_object WHERE object_url = ?"
     params = (object_url,)
     result = execute_query(query, params, db_file=db_file)
     if result:
@@ -106,7 +166,7 @@ def get_reviews_count_by_object(object_url, db_file=DB_FILE):
 
 def get_reviews_count_by_date(start_date, end_date, db_file=DB_FILE):
     """
-    Возвращает количество отзывов, собранных в заданном диапазоне дат.
+    Возвращает количество отзывов, собранных в заданном диапазоне дат (обе даты включительно).
 
     Args:
         start_date: Начальная дата (строка в формате 'YYYY-MM-DD').
@@ -115,7 +175,7 @@ def get_reviews_count_by_date(start_date, end_date, db_file=DB_FILE):
     Returns:
         Количество отзывов.
     """
-    query = "SELECT COUNT(*) FROM reviews WHERE date_scraped BETWEEN ? AND ?"
+    query = "SELECT COALESCE(SUM(count), 0) FROM stats_by_day WHERE day BETWEEN ? AND ?"
     params = (start_date, end_date)  # Передаем даты как строки
     result = execute_query(query, params, db_file=db_file)
     if result:
@@ -123,32 +183,113 @@ def get_reviews_count_by_date(start_date, end_date, db_file=DB_FILE):
     return 0
 # endregion
 
+# region Чтение отзывов
+# Тексты читаются функцией review_text(): она распаковывает сжатые тексты (text_codec.py).
+REVIEW_COLUMNS = "id, category, object_url, review_url, review_text(text, text_z), length, has_mat, date_scraped"
+
+
+def _review_dict(row):
+    return {'id': row[0], 'category': row[1], 'object_url': row[2], 'review_url': row[3], 'text': row[4],
+            'length': row[5], 'has_mat': bool(row[6]), 'date_scraped': row[7]}
+
+
+def get_review(review_url, db_file=DB_FILE):
+    """Возвращает отзыв по его URL (словарь с текстом) или None."""
+    result = execute_query(f"SELECT {REVIEW_COLUMNS} FROM reviews WHERE review_url = ?", (review_url,), db_file=db_file)
+    return _review_dict(result[0]) if result else None
+
+
+def get_reviews_by_object(object_url, page=1, page_size=SEARCH_PAGE_SIZE, db_file=DB_FILE):
+    """Возвращает страницу отзывов объекта (в порядке сохранения) списком словарей с текстами."""
+    query = f"SELECT {REVIEW_COLUMNS} FROM reviews WHERE object_url = ? ORDER BY id LIMIT ? OFFSET ?"
+    result = execute_query(query, (object_url, page_size, (max(page, 1) - 1) * page_size), db_file=db_file)
+    return [_review_dict(row) for row in result or []]
+# endregion
+
+# region Полнотекстовый поиск
+
+def search_reviews(query, category=None, object_url=None, page=1, page_size=SEARCH_PAGE_SIZE, prefix=False,
+                   db_file=DB_FILE):
+    """
+    Ищет отзывы по словам (FTS5) и возвращает страницу результатов, упорядоченных по BM25.
+
+    Args:
+        query: Слова для поиска (отзыв должен содержать все слова).
+        category: Искать только в заданной категории (None - во всех).
+        object_url: Искать только в отзывах заданного объекта (None - во всех).
+        page: Номер страницы результатов (с 1).
+        page_size: Количество результатов на странице.
+        prefix: Искать слова по префиксу (другие словоформы).
+
+    Returns:
+        Список словарей (id, category, object_url, review_url, score, snippet); чем меньше score, тем
+        релевантнее отзыв. В snippet найденные слова выделены квадратными скобками.
+    """
+    match = build_match_query(query, prefix)
+    if match is None:
+        return []
+    conditions = [f"{FTS_TABLE} MATCH ?"]
+    params = [match]
+    if category is not None:
+        conditions.append("r.category = ?")
+        params.append(category)
+    if object_url is not None:
+        conditions.append("r.object_url = ?")
+        params.append(object_url)
+    params += [page_size, (max(page, 1) - 1) * page_size]
+    sql = f'''
+        SELECT r.id, r.category, r.object_url, r.review_url, bm25({FTS_TABLE}),
+               snippet({FTS_TABLE}, 0, '[', ']', '...', {SNIPPET_TOKENS}),
+               CASE WHEN r.text IS NULL THEN review_text(r.text, r.text_z) END
+        FROM {FTS_TABLE} JOIN reviews AS r ON r.id = {FTS_TABLE}.rowid
+        WHERE {' AND '.join(conditions)}
+        ORDER BY bm25({FTS_TABLE})
+        LIMIT ? OFFSET ?
+    '''
+    result = execute_query(sql, tuple(params), db_file=db_file)
+    if not result:
+        return []
+    # Для сжатых отзывов snippet() не видит текста - фрагмент строится по распакованному тексту.
+    return [{'id': row[0], 'category': row[1], 'object_url': row[2], 'review_url': row[3], 'score': row[4],
+             'snippet': row[5] or (text_snippet(row[6], query, prefix, SNIPPET_TOKENS) if row[6] else row[5])}
+            for row in result]
+# endregion
+
 # region Примеры использования (если файл запущен напрямую)
+if __name__ == "__main__":
+    if sys.argv[1:] == ['rebuild']:  # python statistics.py rebuild - пересчитать сводные таблицы.
+        rebuild_statistics()
+        print(f"{GREEN}Сводные таблицы статистики пересчитаны.{RESET}")
+        sys.exit(0)
+    if sys.argv[1:2] == ['search']:  # python statistics.py search слова запроса - полнотекстовый поиск.
+        for hit in search_reviews(' '.join(sys.argv[2:]), prefix=True):
+            print(f"{BLUE}{hit['review_url']}{RESET} ({hit['category']}): {hit['snippet']}")
+        sys.exit(0)
 
-total_reviews = get_total_reviews_count()
-print(f"{BLUE}Общее количество отзывов: {total_reviews}{RESET}")
+    total_reviews = get_total_reviews_count()
+    print(f"{BLUE}Общее количество отзывов: {total_reviews}{RESET}")
 
-reviews_100_1000 = get_reviews_count_by_length(500, 2000)
-print(f"{BLUE}Количество отзывов длиной от 100 до 1000 символов: {reviews_100_1000}{RESET}")
+    reviews_100_1000 = get_reviews_count_by_length(500, 2000)
+    print(f"{BLUE}Количество отзывов длиной от 100 до 1000 символов: {reviews_100_1000}{RESET}")
 
-reviews_100_plus = get_reviews_count_by_length(100)
-print(f"{BLUE}Количество отзывов длиной от 100 символов и более: {reviews_100_plus}{RESET}")
+    reviews_100_plus = get_reviews_count_by_length(100)
+    print(f"{BLUE}Количество отзывов длиной от 100 символов и более: {reviews_100_plus}{RESET}")
 
-reviews_with_mat = get_reviews_count_with_mat()
-print(f"{BLUE}Количество отзывов с ненормативной лексикой: {reviews_with_mat}{RESET}")
+    reviews_with_mat = get_reviews_count_with_mat()
+    print(f"{BLUE}Количество отзывов с ненормативной лексикой: {reviews_with_mat}{RESET}")
 
-some_category = "byitovaya-tehnika"  # Пример категории.
-reviews_in_category = get_reviews_count_by_category(some_category)
-print(f"{BLUE}Количество отзывов в категории '{some_category}': {reviews_in_category}{RESET}")
+    some_category = "byitovaya-tehnika"  # Пример категории.
+    reviews_in_category = get_reviews_count_by_category(some_category)
+    print(f"{BLUE}Количество отзывов в категории '{some_category}': {reviews_in_category}{RESET}")
 
-some_object_url = "https://vseotzyvy.ru/item/12345/"  # Пример URL объекта.
-reviews_for_object = get_reviews_count_by_object(some_object_url)
-print(f"{BLUE}Количество отзывов для объекта '{some_object_url}': {reviews_for_object}{RESET}")
+    some_object_url = "https://vseotzyvy.ru/item/12345/"  # Пример URL объекта.
+    reviews_for_object = get_reviews_count_by_object(some_object_url)
+    print(f"{BLUE}Количество отзывов для объекта '{some_object_url}': {reviews_for_object}{RESET}")
 
-# Пример с датами
-start_date_str = '2023-01-01'  # Начальная дата.
-end_date_str = '2026-01-01'  # Конечная дата.
-reviews_in_date_range = get_reviews_count_by_date(start_date_str, end_date_str)
-print(
-    f"{BLUE}Количество отзывов, собранных между {start_date_str} и {end_date_str}: {reviews_in_date_range}{RESET}")
-# endregion
\ No newline at end of file
+    # Пример с датами
+    start_date_str = '2023-01-01'  # Начальная дата.
+    end_date_str = '2026-01-01'  # Конечная дата.
+    reviews_in_date_range = get_reviews_count_by_date(start_date_str, end_date_str)
+    print(
+        f"{BLUE}Количество отзывов, собранных между {start_date_str} и {end_date_str}: {reviews_in_date_range}{RESET}")
+# endregion
@@ -0,0 +1,73 @@
+# summary_tables.py
+"""
+Сводные таблицы статистики отзывов.
+
+Счётчики отзывов по категориям, объектам, дням, длине текста и признаку мата
+хранятся в отдельных маленьких таблицах и поддерживаются триггерами на таблице
+reviews: любая вставка, удаление или изменение строки (в том числе пакетная запись
+из db_writer.py и миграции в main.create_db) сразу обновляет счётчики. Запросы
+statistics.py читают эти таблицы по первичному ключу и не сканируют reviews.
+
+Для баз, собранных до появления таблиц (или после ручного редактирования),
+счётчики пересчитываются командой:
+    python statistics.py rebuild
+"""
+
+# region Константы
+# Сводные таблицы: (таблица, ключевой столбец, тип ключа, выражение ключа по строке reviews).
+# Выражение записано для псевдострок NEW/OLD триггеров; {row} заменяется на NEW, OLD или reviews.
+SUMMARIES = [
+    ('stats_by_category', 'category', 'TEXT', "COALESCE({row}.category, '')"),
+    ('stats_by_object', 'object_url', 'TEXT', "COALESCE({row}.object_url, '')"),
+    ('stats_by_day', 'day', 'TEXT', "COALESCE(substr({row}.date_scraped, 1, 10), '')"),  # 'YYYY-MM-DD'.
+    ('stats_by_length', 'length', 'INTEGER', "COALESCE({row}.length, 0)"),  # Корзина шириной 1 символ (точный счёт).
+    ('stats_by_mat', 'has_mat', 'INTEGER', "COALESCE({row}.has_mat, 0)"),  # Сумма по таблице - общее число отзывов.
+]
+TRACKED_COLUMNS = 'category, object_url, date_scraped, length, has_mat'  # Столбцы, влияющие на счётчики.
+# endregion
+
+
+def _increment(table, column, expression, row):
+    """SQL, увеличивающий счётчик строки сводной таблицы."""
+    key = expression.format(row=row)
+    return (f'INSERT INTO {table} ({column}, count) VALUES ({key}, 1) '
+            f'ON CONFLICT ({column}) DO UPDATE SET count = count + 1;')
+
+
+def _decrement(table, column, expression, row):
+    """SQL, уменьшающий счётчик строки сводной таблицы (пустые строки удаляются)."""
+    key = expression.format(row=row)
+    return (f'UPDATE {table} SET count = count - 1 WHERE {column} = {key};'
+            f'DELETE FROM {table} WHERE {column} = {key} AND count <= 0;')
+
+
+def create_summary_tables(conn):
+    """
+    Создаёт сводные таблицы и триггеры (повторный вызов безопасен).
+
+    Если таблиц ещё не было, счётчики сразу заполняются по существующим отзывам.
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, column, key_type, _ in SUMMARIES:
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({column} {key_type} PRIMARY KEY, count INTEGER NOT NULL)')
+    on_insert = ''.join(_increment(table, column, expression, 'NEW') for table, column, _, expression in SUMMARIES)
+    on_delete = ''.join(_decrement(table, column, expression, 'OLD') for table, column, _, expression in SUMMARIES)
+    conn.executescript(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_insert AFTER INSERT ON reviews
+        BEGIN {on_insert} END;
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_delete AFTER DELETE ON reviews
+        BEGIN {on_delete} END;
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_stats_update AFTER UPDATE OF {TRACKED_COLUMNS} ON reviews
+        BEGIN {on_delete} {on_insert} END;
+    ''')
+    if any(table not in existing for table, _, _, _ in SUMMARIES):
+        rebuild_summary_tables(conn)
+
+
+def rebuild_summary_tables(conn):
+    """Пересчитывает все сводные таблицы по таблице reviews (одна транзакция)."""
+    with conn:
+        for table, column, _, expression in SUMMARIES:
+            key = expression.format(row='reviews')
+            conn.execute(f'DELETE FROM {table}')
+            conn.execute(f'INSERT INTO {table} ({column}, count) SELECT {key}, COUNT(*) FROM reviews GROUP BY 1')
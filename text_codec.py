@@ -0,0 +1,351 @@
+# text_codec.py
+"""
+Сжатое хранение текстов отзывов в SQLite с общим словарём, обученным на корпусе.
+
+Отдельный короткий отзыв почти не сжимается: у компрессора нет истории, на которую
+можно ссылаться. Словарь из частых фраз корпуса даёт такую историю заранее, и
+похожие русские отзывы сжимаются в несколько раз.
+
+Сжатый текст хранится в столбце reviews.text_z (reviews.text в этом случае NULL).
+Формат blob: заголовок HEADER (кодек, id словаря в таблице text_dictionaries), затем
+сжатые данные. Кодеки:
+- 'zstd' - пакет zstandard (необязательная зависимость), словарь обучается
+  zstandard.train_dictionary;
+- 'zlib' - стандартная библиотека, предустановленный словарь (до 32 КБ) из самых
+  выгодных слов и фраз корпуса. Используется, если zstandard не установлен.
+
+Словари не меняются после записи, поэтому старые тексты остаются читаемыми после
+обучения нового словаря. Функция SQL review_text(text, text_z) возвращает текст
+отзыва в любом виде хранения; её регистрирует register() (вызывается для каждого
+соединения Python, которое читает тексты). Схема базы (триггеры, представления) на
+эту функцию не ссылается, поэтому базу по-прежнему можно читать и менять любым
+клиентом SQLite. Сжатые тексты добавляет в полнотекстовый индекс сам писатель
+(db_writer.py, search_index.index_texts).
+
+Запуск:
+    python text_codec.py train       # обучить новый словарь по корпусу
+    python text_codec.py compress    # сжать несжатые тексты (миграция существующей базы)
+    python text_codec.py decompress  # вернуть все тексты в столбец text
+    python text_codec.py stats       # размер текстов в базе
+"""
+import collections
+import logging
+import sqlite3
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # Необязательная зависимость: без неё используется zlib.
+    zstandard = None
+
+# region Константы
+DB_FILE = 'reviews.db'  # Файл базы по умолчанию (для запуска из командной строки).
+DEFAULT_CODEC = 'zstd' if zstandard is not None else 'zlib'  # Кодек новых словарей.
+CODEC_IDS = {'zlib': 1, 'zstd': 2}  # Код кодека в заголовке blob.
+HEADER = struct.Struct('<BI')  # Заголовок blob: код кодека, id словаря.
+ZSTD_DICT_SIZE = 112 * 1024  # Размер словаря zstd (байт).
+ZSTD_LEVEL = 9  # Уровень сжатия zstd.
+ZLIB_DICT_SIZE = 32 * 1024  # Размер словаря zlib (больше окно deflate не использует).
+ZLIB_LEVEL = 9  # Уровень сжатия zlib.
+TRAIN_SAMPLE = 20000  # Сколько случайных отзывов брать для обучения словаря.
+TRAIN_MIN_REVIEWS = 200  # Меньше отзывов - словарь не обучается автоматически.
+MIGRATE_BATCH = 2000  # Сколько строк сжимать/распаковывать одной транзакцией.
+# endregion
+
+log = logging.getLogger(__name__)
+
+
+# region Обучение словарей
+def train_zlib_dictionary(texts, size=ZLIB_DICT_SIZE):
+    """
+    Словарь для zlib: слова и фразы из 2-3 слов, дающие наибольшую экономию.
+
+    Выгода фразы - (число повторов - 1) * длина. Самые выгодные фразы кладутся в конец
+    словаря: deflate кодирует короткие расстояния дешевле.
+    """
+    counts = collections.Counter()
+    for text in texts:
+        words = text.split()
+        for n in (1, 2, 3):
+            counts.update(' '.join(words[i:i + n]) for i in range(len(words) - n + 1))
+    chosen, total = [], 0
+    for phrase, count in sorted(counts.items(), key=lambda item: (item[1] - 1) * len(item[0]), reverse=True):
+        if count < 2:
+            break
+        data = (' ' + phrase).encode('utf-8')
+        if total + len(data) > size:
+            continue
+        chosen.append(data)
+        total += len(data)
+    return b''.join(reversed(chosen))
+
+
+def train_dictionary(texts, codec=DEFAULT_CODEC):
+    """Обучает словарь кодека codec по списку текстов и возвращает его байты."""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Для кодека zstd нужен пакет zstandard (pip install zstandard)")
+        samples = [text.encode('utf-8') for text in texts]
+        return zstandard.train_dictionary(ZSTD_DICT_SIZE, samples).as_bytes()
+    if codec == 'zlib':
+        return train_zlib_dictionary(texts)
+    raise ValueError(f"Неизвестный кодек: {codec}")
+# endregion
+
+
+class TextCodec:
+    """Словари базы и сжатие/распаковка текстов (потокобезопасен)."""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._dictionaries = {}  # id -> (кодек, байты словаря).
+        self._zstd = {}  # id -> (ZstdCompressor, ZstdDecompressor): создание с словарём дорогое.
+
+    def load(self):
+        """Перечитывает словари из базы (например, обученные другим процессом)."""
+        with sqlite3.connect(self.db_file) as conn:
+            rows = conn.execute('SELECT id, codec, data FROM text_dictionaries').fetchall()
+        with self._lock:
+            self._dictionaries.update((row_id, (codec, bytes(data))) for row_id, codec, data in rows)
+        return self
+
+    def current(self):
+        """id самого нового словаря, кодек которого доступен, или None."""
+        with self._lock:
+            usable = [row_id for row_id, (codec, _) in self._dictionaries.items()
+                      if codec == 'zlib' or zstandard is not None]
+        return max(usable, default=None)
+
+    def _dictionary(self, dictionary_id):
+        entry = self._dictionaries.get(dictionary_id)
+        if entry is None:  # Словарь обучен после загрузки - перечитываем.
+            self.load()
+            entry = self._dictionaries.get(dictionary_id)
+            if entry is None:
+                raise ValueError(f"Нет словаря {dictionary_id} в {self.db_file}")
+        return entry
+
+    def _zstd_pair(self, dictionary_id, data):
+        with self._lock:
+            pair = self._zstd.get(dictionary_id)
+            if pair is None:
+                dictionary = zstandard.ZstdCompressionDict(data)
+                pair = self._zstd[dictionary_id] = (zstandard.ZstdCompressor(ZSTD_LEVEL, dict_data=dictionary),
+                                                    zstandard.ZstdDecompressor(dict_data=dictionary))
+            return pair
+
+    def compress(self, text, dictionary_id=None):
+        """
+        Сжимает текст самым новым (или заданным) словарём.
+
+        Returns:
+            blob или None, если словаря нет или сжатие не уменьшает текст.
+        """
+        dictionary_id = dictionary_id or self.current()
+        if dictionary_id is None:
+            return None
+        codec, data = self._dictionary(dictionary_id)
+        raw = text.encode('utf-8')
+        if codec == 'zstd':
+            compressor, _ = self._zstd_pair(dictionary_id, data)
+            with self._lock:  # Объекты zstandard нельзя использовать из нескольких потоков одновременно.
+                payload = compressor.compress(raw)
+        else:
+            compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, -15, zdict=data)  # -15: без заголовка zlib.
+            payload = compressor.compress(raw) + compressor.flush()
+        blob = HEADER.pack(CODEC_IDS[codec], dictionary_id) + payload
+        return blob if len(blob) < len(raw) else None
+
+    def decompress(self, blob):
+        """Распаковывает blob из reviews.text_z."""
+        codec_id, dictionary_id = HEADER.unpack_from(blob)
+        codec, data = self._dictionary(dictionary_id)
+        if CODEC_IDS[codec] != codec_id:
+            raise ValueError(f"Кодек blob не совпадает со словарём {dictionary_id}")
+        payload = bytes(blob[HEADER.size:])
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("Текст сжат zstd: установите пакет zstandard")
+            _, decompressor = self._zstd_pair(dictionary_id, data)
+            with self._lock:
+                raw = decompressor.decompress(payload)
+        else:
+            decompressor = zlib.decompressobj(-15, zdict=data)
+            raw = decompressor.decompress(payload) + decompressor.flush()
+        return raw.decode('utf-8')
+
+
+_codecs = {}  # Путь к базе -> TextCodec (общий для всех соединений процесса).
+_codecs_lock = threading.Lock()
+
+
+def get_codec(db_file):
+    """Возвращает TextCodec базы (словари загружаются при первом обращении)."""
+    with _codecs_lock:
+        codec = _codecs.get(db_file)
+        if codec is None:
+            codec = _codecs[db_file] = TextCodec(db_file).load()
+        return codec
+
+
+def _db_path(conn):
+    """Путь к файлу основной базы соединения."""
+    return next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+
+
+# region Схема
+def register(conn):
+    """Регистрирует на соединении функцию SQL review_text(text, text_z)."""
+    db_file = _db_path(conn)
+
+    def review_text(text, blob):
+        if blob is None:
+            return text
+        return get_codec(db_file).decompress(blob)
+
+    conn.create_function('review_text', 2, review_text, deterministic=True)
+
+
+def create_text_storage(conn):
+    """
+    Добавляет столбец reviews.text_z и таблицу словарей (повторный вызов безопасен).
+
+    Регистрирует review_text на соединении. Представление reviews_text прежних версий
+    (источник индекса через функцию Python) удаляется.
+    """
+    register(conn)
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(reviews)')]
+    if 'text_z' not in columns:
+        conn.execute('ALTER TABLE reviews ADD COLUMN text_z BLOB')
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS text_dictionaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            created_at DATETIME
+        );
+        DROP VIEW IF EXISTS reviews_text;
+    ''')
+# endregion
+
+
+# region Словари и миграция
+def train(db_file, codec=DEFAULT_CODEC, sample=TRAIN_SAMPLE):
+    """Обучает новый словарь по случайной выборке отзывов и возвращает его id (None - отзывов нет)."""
+    with sqlite3.connect(db_file) as conn:
+        create_text_storage(conn)
+        texts = [row[0] for row in conn.execute(
+            'SELECT review_text(text, text_z) FROM reviews WHERE text IS NOT NULL OR text_z IS NOT NULL '
+            'ORDER BY random() LIMIT ?', (sample,))]
+        if not texts:
+            return None
+        try:
+            data = train_dictionary(texts, codec)
+        except Exception as e:  # У zstd слишком мало данных или нет пакета - обучаем словарь zlib.
+            if codec == 'zlib':
+                raise
+            log.warning("Словарь %s не обучен (%s), используется zlib", codec, e)
+            codec, data = 'zlib', train_dictionary(texts, 'zlib')
+        dictionary_id = conn.execute('INSERT INTO text_dictionaries (codec, data, created_at) VALUES (?, ?, ?)',
+                                     (codec, data, datetime.now())).lastrowid
+    get_codec(db_file).load()
+    log.info("Обучен словарь %d (%s, %d байт) по %d отзывам", dictionary_id, codec, len(data), len(texts))
+    return dictionary_id
+
+
+def ensure_dictionary(db_file, minimum=TRAIN_MIN_REVIEWS):
+    """
+    Возвращает TextCodec базы со словарём; если словаря нет, обучает его при наличии minimum отзывов.
+
+    Returns:
+        TextCodec или None, если словаря нет и отзывов для обучения мало.
+    """
+    codec = get_codec(db_file).load()
+    if codec.current() is None:
+        with sqlite3.connect(db_file) as conn:
+            count = conn.execute('SELECT COUNT(*) FROM reviews').fetchone()[0]
+        if count < minimum or train(db_file) is None:
+            return None
+    return codec
+
+
+def compress_reviews(db_file, batch=MIGRATE_BATCH):
+    """Сжимает все несжатые тексты (обучает словарь, если его нет). Возвращает количество сжатых строк."""
+    codec = ensure_dictionary(db_file, minimum=1)
+    if codec is None:
+        return 0
+    dictionary_id = codec.current()
+    compressed, last_id = 0, 0
+    with sqlite3.connect(db_file) as conn:
+        register(conn)
+        while True:
+            rows = conn.execute('SELECT id, text FROM reviews WHERE id > ? AND text IS NOT NULL ORDER BY id LIMIT ?',
+                                (last_id, batch)).fetchall()
+            if not rows:
+                break
+            updates = [(blob, row_id) for row_id, text in rows
+                       for blob in [codec.compress(text, dictionary_id)] if blob is not None]
+            with conn:  # Текст не меняется, поэтому триггер полнотекстового индекса переход в text_z пропускает.
+                conn.executemany('UPDATE reviews SET text = NULL, text_z = ? WHERE id = ?', updates)
+            compressed += len(updates)
+            last_id = rows[-1][0]
+        conn.execute('VACUUM')  # Возвращаем освободившееся место.
+    return compressed
+
+
+def decompress_reviews(db_file, batch=MIGRATE_BATCH):
+    """Возвращает все тексты в столбец text. Возвращает количество распакованных строк."""
+    codec = get_codec(db_file).load()
+    restored = 0
+    with sqlite3.connect(db_file) as conn:
+        register(conn)
+        while True:
+            rows = conn.execute('SELECT id, text_z FROM reviews WHERE text_z IS NOT NULL LIMIT ?', (batch,)).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany('UPDATE reviews SET text = ?, text_z = NULL WHERE id = ?',
+                                 [(codec.decompress(blob), row_id) for row_id, blob in rows])
+            restored += len(rows)
+        conn.execute('VACUUM')
+    return restored
+
+
+def storage_stats(db_file):
+    """Сколько отзывов хранится сжатыми и несжатыми и сколько байт занимают тексты."""
+    with sqlite3.connect(db_file) as conn:
+        create_text_storage(conn)
+        plain, plain_bytes, packed, packed_bytes, total_bytes = conn.execute('''
+            SELECT COUNT(text), COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0),
+                   COUNT(text_z), COALESCE(SUM(LENGTH(text_z)), 0),
+                   COALESCE(SUM(LENGTH(CAST(review_text(text, text_z) AS BLOB))), 0)
+            FROM reviews
+        ''').fetchone()
+        dictionaries = conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM text_dictionaries').fetchone()
+    return {'plain': plain, 'plain_bytes': plain_bytes, 'compressed': packed, 'compressed_bytes': packed_bytes,
+            'text_bytes': total_bytes, 'dictionaries': dictionaries[0], 'dictionary_bytes': dictionaries[1]}
+# endregion
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    db_file = sys.argv[2] if len(sys.argv) > 2 else DB_FILE
+    if command == 'train':
+        print(f"Словарь: {train(db_file)}")
+    elif command == 'compress':
+        print(f"Сжато отзывов: {compress_reviews(db_file)}")
+    elif command == 'decompress':
+        print(f"Распаковано отзывов: {decompress_reviews(db_file)}")
+    elif command == 'stats':
+        stats = storage_stats(db_file)
+        print(f"Несжатых: {stats['plain']} ({stats['plain_bytes']} байт), сжатых: {stats['compressed']} "
+              f"({stats['compressed_bytes']} байт), исходный объём текстов: {stats['text_bytes']} байт, "
+              f"словарей: {stats['dictionaries']} ({stats['dictionary_bytes']} байт)")
+    else:
+        sys.exit("Команды: train, compress, decompress, stats")
@@ -0,0 +1,201 @@
+# weather.py
+"""
+Асинхронное получение текущей температуры по списку городов с gismeteo.ru.
+
+Запросы выполняются так же, как в парсере отзывов (main.fetch): через общий пул
+соединений aiohttp (keep-alive, кэш DNS) и RequestController из rate_control.py -
+с ограничением частоты и адаптивным лимитом одновременных запросов к хосту и с
+повторами после 429/5xx. Температура извлекается функцией
+extractors.extract_temperature: разбирается только блок
+<div class="weather-value"> с элементом <temperature-value>, а не вся страница.
+
+Показания кэшируются для каждого города на ttl секунд: при опросе сотен городов
+раз в несколько минут повторный запрос в пределах ttl не уходит в сеть, а
+одновременные запросы одного города выполняются одним обращением к сайту.
+
+Город задаётся так же, как в адресе страницы gismeteo: 'zheleznogorsk-11995' для
+https://www.gismeteo.ru/weather-zheleznogorsk-11995/.
+
+Использование:
+    async with WeatherClient() as client:
+        readings = await client.get_many(['zheleznogorsk-11995', 'moscow-4368'])
+
+    readings = get_temperatures(['zheleznogorsk-11995'])  # Из синхронного кода.
+
+Запуск:
+    python weather.py zheleznogorsk-11995 moscow-4368 [--interval 300]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import aiohttp
+
+from extractors import DEFAULT_BACKEND, extract_temperature
+from logs import setup_logging
+from metrics import METRICS
+from rate_control import RequestController
+
+# region Константы
+BASE_URL = 'https://www.gismeteo.ru'  # Адрес сайта погоды.
+CITY_PATH = '/weather-{city}/'  # Путь страницы города.
+# Заголовки, имитирующие запрос от браузера. Это помогает избежать блокировки со стороны сайта.
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/91.0.4472.124 Safari/537.36"
+}
+CACHE_TTL = 300.0  # Сколько секунд показание города считается свежим.
+REQUESTS_PER_SECOND = 10.0  # Средняя частота запросов к сайту погоды (None - без ограничения).
+INITIAL_CONCURRENCY = 5  # Начальный лимит одновременных запросов (дальше подбирается по ответам сайта).
+MAX_CONCURRENCY = 20  # Наибольшее количество одновременных запросов.
+MAX_RETRIES = 3  # Сколько раз повторять запрос после ошибки.
+REQUEST_TIMEOUT = 30  # Таймаут запроса (секунд).
+CONNECT_TIMEOUT = 10  # Таймаут установки соединения (секунд).
+DNS_CACHE_TTL = 300  # Время жизни записей кэша DNS (секунд).
+KEEPALIVE_TIMEOUT = 60  # Сколько держать простаивающее соединение открытым (секунд).
+POLL_INTERVAL = 300.0  # Интервал опроса городов из командной строки (секунд).
+# endregion
+
+log = logging.getLogger(__name__)
+
+
+def parse_temperature(value):
+    """Переводит значение атрибута value в число (°C); None - значения нет или оно не число."""
+    if value is None:
+        return None
+    try:
+        return float(value.strip().replace('−', '-'))  # На сайте встречается знак "минус" U+2212.
+    except ValueError:
+        return None
+
+
+class WeatherClient:
+    """
+    Клиент погоды с общим пулом соединений и кэшем показаний по городам.
+
+    Используется как асинхронный контекстный менеджер внутри работающего цикла событий;
+    один клиент можно держать открытым между опросами, чтобы переиспользовать соединения
+    и кэш.
+    """
+
+    def __init__(self, base_url=BASE_URL, ttl=CACHE_TTL, rate=REQUESTS_PER_SECOND,
+                 initial_concurrency=INITIAL_CONCURRENCY, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES,
+                 backend=DEFAULT_BACKEND):
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.backend = backend
+        self._limits = {'rate': rate, 'initial': initial_concurrency, 'maximum': max_concurrency,
+                        'max_retries': max_retries}
+        self.controller = None
+        self.session = None
+        self._cache = {}  # Город -> (момент устаревания по time.monotonic(), показание).
+        self._pending = {}  # Город -> задача запроса, которая выполняется сейчас.
+
+    async def __aenter__(self):
+        self.controller = RequestController(**self._limits)
+        connector = aiohttp.TCPConnector(limit=self._limits['maximum'], ttl_dns_cache=DNS_CACHE_TTL,
+                                         keepalive_timeout=KEEPALIVE_TIMEOUT)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, sock_connect=CONNECT_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def city_url(self, city):
+        return self.base_url + CITY_PATH.format(city=city)
+
+    async def get(self, city):
+        """
+        Возвращает показание города: словарь city, temperature (°C или None), fetched_at, error.
+
+        Свежее показание берётся из кэша; неудачные запросы не кэшируются.
+        """
+        cached = self._cache.get(city)
+        if cached is not None and cached[0] > time.monotonic():
+            METRICS.inc('weather_cache_hits_total')
+            return cached[1]
+        task = self._pending.get(city)
+        if task is None:
+            task = self._pending[city] = asyncio.ensure_future(self._fetch(city))
+            task.add_done_callback(lambda _: self._pending.pop(city, None))
+        return await asyncio.shield(task)  # Отмена одного ожидающего не отменяет запрос для остальных.
+
+    async def get_many(self, cities):
+        """Возвращает показания всех городов одним вызовом: словарь город -> показание (в порядке cities)."""
+        cities = list(dict.fromkeys(cities))
+        readings = await asyncio.gather(*(self.get(city) for city in cities))
+        return dict(zip(cities, readings))
+
+    async def _fetch(self, city):
+        url = self.city_url(city)
+        reading = {'city': city, 'temperature': None, 'fetched_at': datetime.now(), 'error': None}
+        try:
+            _, html, _ = await self.controller.get(self.session, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            METRICS.inc('weather_requests_total', result='error')
+            log.warning("Не удалось получить погоду: %s: %s", url, str(e) or type(e).__name__)
+            reading['error'] = str(e) or type(e).__name__
+            return reading
+        reading['temperature'] = parse_temperature(extract_temperature(html, self.backend))
+        if reading['temperature'] is None:
+            METRICS.inc('weather_requests_total', result='not_found')
+            log.warning("Температура не найдена на странице: %s", url)
+            reading['error'] = "Элемент 'temperature-value' не найден"
+            return reading
+        METRICS.inc('weather_requests_total', result='ok')
+        self._cache[city] = (time.monotonic() + self.ttl, reading)
+        return reading
+
+
+def get_temperatures(cities, **client_options):
+    """Синхронная обёртка: показания городов (словарь город -> показание) за один вызов."""
+    async def run():
+        async with WeatherClient(**client_options) as client:
+            return await client.get_many(cities)
+    return asyncio.run(run())
+
+
+def format_reading(reading):
+    """Строка для вывода показания на экран."""
+    if reading['temperature'] is None:
+        return f"{reading['city']}: {reading['error']}"
+    return f"{reading['city']}: {reading['temperature']:g}°C"
+
+
+async def poll(cities, interval=POLL_INTERVAL, **client_options):
+    """
+    Опрашивает города каждые interval секунд и выводит температуру (до прерывания).
+
+    Города, показание которых ещё не устарело (ttl клиента), в сеть не запрашиваются;
+    если ttl не задан, он берётся меньше интервала, чтобы каждый опрос давал новые данные.
+    """
+    client_options.setdefault('ttl', min(CACHE_TTL, interval / 2))
+    async with WeatherClient(**client_options) as client:
+        while True:
+            started = time.monotonic()
+            for reading in (await client.get_many(cities)).values():
+                print(format_reading(reading))
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Текущая температура по городам с gismeteo.ru.")
+    parser.add_argument('cities', nargs='+', help="города в формате адреса gismeteo, например zheleznogorsk-11995")
+    parser.add_argument('--interval', type=float, default=None,
+                        help="опрашивать повторно каждые N секунд (по умолчанию - один раз)")
+    parser.add_argument('--ttl', type=float, default=None, help="сколько секунд показание считается свежим")
+    parser.add_argument('--base-url', default=BASE_URL, help="адрес сайта погоды")
+    args = parser.parse_args()
+    setup_logging()
+    if args.interval:
+        try:
+            options = {'ttl': args.ttl} if args.ttl is not None else {}
+            asyncio.run(poll(args.cities, args.interval, base_url=args.base_url, **options))
+        except KeyboardInterrupt:
+            pass
+    else:
+        for reading in get_temperatures(args.cities, base_url=args.base_url).values():
+            print(format_reading(reading))
@@ -0,0 +1,197 @@
+# work_queue.py
+"""
+Очередь работы с арендой (lease) для нескольких процессов парсера.
+
+Элементы очереди - категории и объекты сайта - хранятся в таблице work_items
+базы reviews.db. Процесс-воркер забирает элемент в аренду на LEASE_SECONDS,
+продлевает аренду, пока работает (heartbeat), и отмечает элемент выполненным в той
+же транзакции, что и отзывы объекта (см. complete_statement). Если воркер упал,
+аренда истекает и элемент забирает другой воркер; благодаря контрольным точкам
+страниц (crawl_objects) он продолжает с первой несохранённой страницы.
+
+Категория при обработке разворачивается в элементы-объекты. Объекты выдаются
+раньше категорий, поэтому воркеры сначала разбирают уже найденные объекты.
+
+Элемент, который MAX_ATTEMPTS раз брали в аренду и так и не завершили, получает
+статус 'failed': он больше не выдаётся, попадает в журнал (fail_exhausted) и
+учитывается в failed_items(), по которым воркер и запускающий процесс завершаются
+с ошибкой.
+
+Все воркеры работают с одним файлом SQLite, поэтому они должны запускаться на
+одной машине (SQLite на сетевых дисках блокировки не гарантирует).
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# region Константы
+LEASE_SECONDS = 60.0  # Срок аренды элемента; продлевается каждые LEASE_SECONDS / 3 секунд.
+MAX_ATTEMPTS = 5  # После стольких аренд без завершения элемент больше не выдаётся.
+BUSY_TIMEOUT = 30.0  # Сколько ждать, пока другой процесс держит блокировку записи (секунд).
+
+# Отметка о выполнении элемента (выполняется в транзакции с отзывами объекта).
+COMPLETE_SQL = "UPDATE work_items SET status = 'done', lease_owner = NULL, updated_at = ? WHERE id = ?"
+# Возврат элемента в очередь после ошибки (попытка засчитывается, см. MAX_ATTEMPTS).
+ABANDON_SQL = """
+    UPDATE work_items SET status = 'pending', lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ?
+"""
+
+_CLAIMABLE = "(status = 'pending' OR (status = 'leased' AND lease_expires < :now)) AND attempts < :max_attempts"
+# Элементы, попытки которых исчерпаны: возвращены в очередь или брошены упавшим воркером.
+_EXHAUSTED = "(status = 'pending' OR (status = 'leased' AND lease_expires < :now)) AND attempts >= :max_attempts"
+# endregion
+
+log = logging.getLogger(__name__)
+
+
+def default_owner():
+    """Имя воркера: хост и PID процесса."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """Очередь категорий и объектов с арендой элементов (потокобезопасна)."""
+
+    def __init__(self, db_file, owner=None, lease_seconds=LEASE_SECONDS):
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        self.held = set()  # id элементов, арендованных этим воркером.
+        self._lock = threading.Lock()  # Очередь используется из потоков asyncio.to_thread.
+        # isolation_level=None: каждый оператор - отдельная транзакция (без неявного BEGIN).
+        self._conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS work_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL UNIQUE,
+                category_url TEXT,
+                object_index INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items (status, kind)')
+
+    def seed(self, category_urls):
+        """Добавляет категории в очередь (уже известные пропускаются)."""
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO work_items (kind, url) VALUES ('category', ?)",
+                                   [(url,) for url in category_urls])
+
+    def add_objects(self, category_url, objects):
+        """Добавляет объекты категории: список пар (индекс объекта в категории, URL объекта)."""
+        with self._lock:
+            self._conn.executemany('''
+                INSERT OR IGNORE INTO work_items (kind, url, category_url, object_index) VALUES ('object', ?, ?, ?)
+            ''', [(url, category_url, index) for index, url in objects])
+
+    def claim(self, limit=1):
+        """
+        Берёт в аренду до limit элементов (сначала объекты, затем категории).
+
+        Returns:
+            Список словарей (id, kind, url, category_url, object_index, attempts).
+        """
+        self.fail_exhausted()
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(f'''
+                UPDATE work_items SET status = 'leased', lease_owner = :owner, lease_expires = :expires,
+                                      attempts = attempts + 1
+                WHERE id IN (SELECT id FROM work_items WHERE {_CLAIMABLE} ORDER BY kind = 'category', id LIMIT :limit)
+                RETURNING id, kind, url, category_url, object_index, attempts
+            ''', {'owner': self.owner, 'expires': now + self.lease_seconds, 'now': now,
+                  'max_attempts': MAX_ATTEMPTS, 'limit': limit}).fetchall()
+        items = [dict(zip(('id', 'kind', 'url', 'category_url', 'object_index', 'attempts'), row))
+                 for row in sorted(rows, key=lambda row: (row[1] == 'category', row[0]))]
+        self.held.update(item['id'] for item in items)
+        return items
+
+    def heartbeat(self):
+        """Продлевает аренду всех элементов, которые держит воркер."""
+        held = list(self.held)
+        if not held:
+            return
+        with self._lock:
+            self._conn.executemany('''
+                UPDATE work_items SET lease_expires = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            ''', [(time.time() + self.lease_seconds, item_id, self.owner) for item_id in held])
+
+    def complete_statement(self, item_id):
+        """Возвращает оператор (SQL, параметры), отмечающий элемент выполненным, и снимает его с продления."""
+        self.held.discard(item_id)
+        return COMPLETE_SQL, (datetime.now(), item_id)
+
+    def complete(self, item_id):
+        """Сразу отмечает элемент выполненным (для элементов без отзывов - категорий)."""
+        sql, params = self.complete_statement(item_id)
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def abandon_statement(self, item_id):
+        """Возвращает оператор (SQL, параметры), возвращающий недоделанный элемент в очередь, и снимает его с продления."""
+        self.held.discard(item_id)
+        return ABANDON_SQL, (datetime.now(), item_id)
+
+    def abandon(self, item_id):
+        """Сразу возвращает элемент в очередь после ошибки (например, не удалось обойти категорию)."""
+        sql, params = self.abandon_statement(item_id)
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def fail_exhausted(self):
+        """
+        Отмечает элементы с исчерпанными попытками как 'failed' и записывает их в журнал.
+
+        Returns:
+            Список пар (вид элемента, URL) отмеченных сейчас элементов.
+        """
+        with self._lock:
+            rows = self._conn.execute(f'''
+                UPDATE work_items SET status = 'failed', lease_owner = NULL, lease_expires = NULL, updated_at = :updated
+                WHERE {_EXHAUSTED}
+                RETURNING kind, url
+            ''', {'now': time.time(), 'max_attempts': MAX_ATTEMPTS, 'updated': datetime.now()}).fetchall()
+        for kind, url in rows:
+            log.error("Элемент не обработан за %d попыток и исключён из очереди: %s %s", MAX_ATTEMPTS, kind, url)
+        return rows
+
+    def failed_items(self):
+        """Список пар (вид элемента, URL) всех элементов со статусом 'failed'."""
+        with self._lock:
+            return self._conn.execute("SELECT kind, url FROM work_items WHERE status = 'failed' ORDER BY id").fetchall()
+
+    def has_outstanding(self):
+        """Есть ли ещё работа: элементы, доступные для аренды, или арендованные кем-то прямо сейчас."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f'''
+                SELECT 1 FROM work_items
+                WHERE ({_CLAIMABLE}) OR (status = 'leased' AND lease_expires >= :now)
+                LIMIT 1
+            ''', {'now': now, 'max_attempts': MAX_ATTEMPTS}).fetchone()
+        return row is not None
+
+    def release(self):
+        """Возвращает в очередь невыполненные элементы этого воркера (штатная остановка не считается попыткой)."""
+        held = list(self.held)
+        with self._lock:
+            self._conn.executemany('''
+                UPDATE work_items SET status = 'pending', lease_owner = NULL, lease_expires = NULL,
+                                      attempts = attempts - 1
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            ''', [(item_id, self.owner) for item_id in held])
+        self.held.clear()
+
+    def close(self):
+        """Закрывает соединение с базой."""
+        with self._lock:
+            self._conn.close()